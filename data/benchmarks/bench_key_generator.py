@@ -0,0 +1,62 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# bench_key_generator.py
+#
+"""
+Compares the time to generate keys with `KeyGenerator.generate_many` and
+with a loop over `KeyGenerator.generate`. Nothing is asserted, the best of
+the repeated runs is printed for each.
+
+Run from the project root, ex.:
+
+    $ ./data/benchmarks/bench_key_generator.py -c 5000 -l 20 -r 5
+"""
+from __future__ import print_function, unicode_literals
+
+import os
+import sys
+import argparse
+import timeit
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'inventory.settings')
+BASE_PATH = os.path.dirname(os.path.dirname(os.path.dirname(
+    os.path.abspath(__file__))))
+sys.path.append(BASE_PATH)
+
+import django; django.setup()
+
+from inventory.common.key_generator import KeyGenerator
+
+
+def run(count, length, repeat):
+    kg = KeyGenerator(length)
+    many = min(timeit.repeat(lambda: kg.generate_many(count),
+                             number=1, repeat=repeat))
+    single = min(timeit.repeat(
+        lambda: [kg.generate(regen=True) for i in range(count)],
+        number=1, repeat=repeat))
+    print("{} keys of length {}, best of {} runs:".format(
+        count, length, repeat))
+    print("    generate_many: {:.4f}s".format(many))
+    print("    generate:      {:.4f}s".format(single))
+
+    if many:
+        print("    speedup:       {:.1f}x".format(single / many))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description="Benchmark KeyGenerator.generate_many against a loop "
+        "over KeyGenerator.generate.")
+    parser.add_argument(
+        '-c', '--count', type=int, default=5000, dest='count',
+        help="The number of keys to generate, defaults to 5000.")
+    parser.add_argument(
+        '-l', '--length', type=int, default=20, dest='length',
+        help="The key length, defaults to 20.")
+    parser.add_argument(
+        '-r', '--repeat', type=int, default=3, dest='repeat',
+        help="The number of timed runs of each, defaults to 3.")
+    options = parser.parse_args()
+    run(options.count, options.length, options.repeat)
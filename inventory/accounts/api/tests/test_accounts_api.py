@@ -4,11 +4,15 @@
 #
 
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
 from django.utils.translation import ugettext
 
 from rest_framework.reverse import reverse
 from rest_framework import status
-from rest_framework.test import APITestCase
+from rest_framework.test import APITestCase, APIClient
 
 from inventory.common.api.tests.base_test import BaseTest
 
@@ -1142,3 +1146,50 @@ class TestLoginAPI(BaseAccount):
         self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN, msg)
         self.assertTrue("Authentication credentials were not provided." ==
                         ugettext(response.data.get('detail')), msg)
+
+    @override_settings(CACHES={'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+    def test_POST_login_token(self):
+        """
+        Test that the login issues an API token, that the token
+        authenticates from the cache, and that the logout revokes it.
+        """
+        #self.skipTest("Temporarily skipped")
+        cache.clear()
+        kwargs = self._setup_user_credentials()
+        data = dict(kwargs)
+        kwargs['login'] = False
+        user, client = self._create_user(**kwargs)
+        response = client.post(reverse('login'), data=data, format='json',
+                               **self._HEADERS)
+        msg = "Response: {} should be {}, content: {}".format(
+            response.status_code, status.HTTP_200_OK, response.data)
+        self.assertEqual(response.status_code, status.HTTP_200_OK, msg)
+        token = response.data.get('token')
+        self.assertTrue(token, msg)
+        # Test that the token authenticates a client without a session.
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION='Token {}'.format(token))
+        uri = reverse('user-detail', kwargs={'public_id': user.public_id})
+        client.get(uri, format='json', **self._HEADERS)
+
+        with CaptureQueriesContext(connection) as context:
+            response = client.get(uri, format='json', **self._HEADERS)
+
+        msg = "Response: {} should be {}, content: {}".format(
+            response.status_code, status.HTTP_200_OK, response.data)
+        self.assertEqual(response.status_code, status.HTTP_200_OK, msg)
+        queries = [query['sql'] for query in context.captured_queries]
+        msg = "queries: {}".format(queries)
+        self.assertFalse(any('authtoken_token' in sql for sql in queries),
+                         msg)
+        # Test that the logout revokes the token.
+        response = client.post(reverse('logout'), format='json',
+                               **self._HEADERS)
+        msg = "Response: {} should be {}, content: {}".format(
+            response.status_code, status.HTTP_200_OK, response.data)
+        self.assertEqual(response.status_code, status.HTTP_200_OK, msg)
+        response = client.get(uri, format='json', **self._HEADERS)
+        msg = "Response: {} should be {}, content: {}".format(
+            response.status_code, status.HTTP_403_FORBIDDEN, response.data)
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN, msg)
@@ -9,6 +9,7 @@ from django.contrib.auth.models import Group
 from django.contrib.auth import get_user_model, login, logout
 from django.utils.translation import ugettext_lazy as _
 
+from rest_framework.authtoken.models import Token
 from rest_framework.filters import SearchFilter
 from rest_framework.generics import (
     ListCreateAPIView, RetrieveUpdateDestroyAPIView, RetrieveUpdateAPIView,
@@ -261,8 +262,8 @@ answer_detail = AnswerDetail.as_view()
 class LoginView(GenericAPIView):
     """
     Login view. Performs a login on a POST and provides the user's full
-    name and the href to the user's endpoint. Credentials are required to
-    login.
+    name, the href to the user's endpoint, and the user's API token.
+    Credentials are required to login.
     """
     serializer_class = LoginSerializer
     permission_classes = ()
@@ -272,11 +273,13 @@ class LoginView(GenericAPIView):
         serializer.is_valid(raise_exception=True)
         user = serializer.validated_data.get('user')
         login(request, user)
+        token, created = Token.objects.get_or_create(user=user)
         result = {}
         result['fullname'] = user.get_full_name_or_username()
         result['href'] = reverse(
             'user-detail', kwargs={'public_id': user.public_id},
             request=request)
+        result['token'] = token.key
         return Response(result)
 
 login_view = LoginView.as_view()
@@ -287,8 +290,8 @@ login_view = LoginView.as_view()
 #
 class LogoutView(APIView):
     """
-    Logout view. Performs the logout on a POST. No POST data is required
-    to logout.
+    Logout view. Performs the logout on a POST and revokes the user's API
+    token. No POST data is required to logout.
     """
     permission_classes = (
         And(IsUserActive, IsAuthenticated,
@@ -298,6 +301,8 @@ class LogoutView(APIView):
         )
 
     def post(self, request, *args, **kwargs):
+        # Deleting the token removes it from the cache.
+        Token.objects.filter(user=request.user).delete()
         logout(request)
         status = HTTP_200_OK
         result = {'detail': _("Logout was successful.")}
@@ -13,7 +13,10 @@ import logging
 import hashlib
 
 from django.conf import settings
+from django.core.cache import cache
 from django.db import models
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
 from django.contrib.auth.hashers import get_hasher
 from django.contrib.auth.models import AbstractUser, BaseUserManager
 from django.core.exceptions import ValidationError
@@ -23,7 +26,9 @@ from django.utils.safestring import mark_safe
 from django.utils.translation import ugettext, ugettext_lazy as _
 from django.utils import timezone
 
-from inventory.common import generate_public_key
+from rest_framework.authtoken.models import Token
+
+from inventory.common import generate_public_key, sync_relation
 from inventory.common.model_mixins import (
     UserModelMixin, TimeModelMixin, StatusModelMixin, StatusModelManagerMixin,
     ValidateOnSaveMixin)
@@ -42,6 +47,8 @@ def create_hash(value, salt, hasher='default'):
 
 
 class UserManager(BaseUserManager):
+    TOKEN_CACHE_KEY = 'api-token-{}'
+    TOKEN_CACHE_TIMEOUT = 60 * 60
 
     def _create_user(self, username, email, password,
                      is_staff, is_superuser, **extra_fields):
@@ -83,6 +90,40 @@ class UserManager(BaseUserManager):
         return self._create_user(username, email, password, True, True,
                                  **extra_fields)
 
+    def get_token_user(self, key):
+        """
+        Returns the user that owns the API token `key` or `None` if there is
+        no such token. Only the user's primary key is cached, until the token
+        is deleted or the user is saved, the user is always read so its
+        status and roles are current.
+        """
+        cache_key = self._get_token_cache_key(key)
+        pk = cache.get(cache_key)
+        user = None
+
+        if pk is None:
+            try:
+                user = Token.objects.select_related('user').get(key=key).user
+            except Token.DoesNotExist:
+                pass
+            else:
+                cache.set(cache_key, user.pk, self.TOKEN_CACHE_TIMEOUT)
+        else:
+            user = self.filter(pk=pk).first()
+
+            if user is None:
+                self.invalidate_token(key)
+
+        return user
+
+    def invalidate_token(self, key):
+        cache.delete(self._get_token_cache_key(key))
+
+    def _get_token_cache_key(self, key):
+        # The tokens are credentials so they are not used as is in the keys.
+        return self.TOKEN_CACHE_KEY.format(
+            hashlib.sha256(key.encode('utf-8')).hexdigest())
+
 
 @python_2_unicode_compatible
 class User(AbstractUser, ValidateOnSaveMixin, models.Model):
@@ -211,19 +252,12 @@ class User(AbstractUser, ValidateOnSaveMixin, models.Model):
         This method adds and removes projects to a member.
         """
         if isinstance(projects, (list, tuple, models.QuerySet)):
-            wanted_pks = [inst.pk for inst in projects]
-            old_pks = [inst.pk for inst in self.projects.all()]
-            # Remove unwanted projects.
-            rem_pks = list(set(old_pks) - set(wanted_pks))
-            rem_prod = Project.objects.filter(pk__in=rem_pks)
-            Membership.objects.filter(
-                user=self, project__in=rem_prod).delete()
-            # Add new members.
-            add_pks = list(set(wanted_pks) - set(old_pks))
-
-            for project in [obj for obj in projects if obj.pk in add_pks]:
-                obj = Membership(user=self, project=project)
-                obj.save()
+            # The bulk writes do not send the Membership signals.
+            added, removed = sync_relation(
+                Membership, 'user', self.pk, 'project', projects)
+
+            if added or removed:
+                Membership.objects.invalidate_projects([self.pk])
 
     def get_unused_questions(self):
         used_pks = [answer.question.pk for answer in self.answers.all()]
@@ -353,3 +387,30 @@ class Answer(TimeModelMixin, UserModelMixin, ValidateOnSaveMixin,
         ordering = ('question__question',)
         verbose_name = _("Answer")
         verbose_name_plural = _("Answers")
+
+
+@receiver(post_save, sender=User)
+def invalidate_user_token(sender, **kwargs):
+    """
+    Invalidate the cached user of the user's API token, only the last login
+    changes on a login so it is skipped.
+    """
+    instance = kwargs.get('instance')
+    update_fields = kwargs.get('update_fields')
+
+    if instance and not (update_fields and
+                         set(update_fields) == set(['last_login'])):
+        for key in Token.objects.filter(user=instance).values_list(
+            'key', flat=True):
+            User.objects.invalidate_token(key)
+
+
+@receiver(post_delete, sender=Token)
+def invalidate_deleted_token(sender, **kwargs):
+    """
+    Invalidate the cached user of a revoked API token.
+    """
+    instance = kwargs.get('instance')
+
+    if instance:
+        User.objects.invalidate_token(instance.key)
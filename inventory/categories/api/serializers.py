@@ -156,7 +156,7 @@ class CategoryCloneSerializer(SerializerMixin, serializers.Serializer):
         project = validated_data.get('project')
         categories = validated_data.get('categories')
         return Category.objects.create_category_tree(
-            project, user, categories)
+            project, user, categories, bulk=True)
 
     class Meta:
         fields = ('project', 'categories',)
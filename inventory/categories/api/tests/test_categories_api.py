@@ -3,7 +3,10 @@
 # inventory/categories/api/tests/test_categories_api.py
 #
 
+from datetime import timedelta
+
 from django.contrib.auth import get_user_model
+from django.utils import timezone
 
 from rest_framework.reverse import reverse
 from rest_framework import status
@@ -748,3 +751,90 @@ class TestCategoryCloneAPI(BaseTest):
         self._test_errors(response, tests={
             'categories': "The list of categories is empty.",
             })
+
+
+class TestCategoryDeltaAPI(BaseTest):
+
+    def __init__(self, name):
+        super(TestCategoryDeltaAPI, self).__init__(name)
+
+    def setUp(self):
+        super(TestCategoryDeltaAPI, self).setUp()
+        self.in_type = self._create_inventory_type()
+        self.project = self._create_project(self.in_type, members=[self.user])
+        self.uri = reverse('category-delta')
+
+    def _get_delta(self, client, data, status_code=status.HTTP_200_OK):
+        response = client.get(self.uri, data=data, format='json',
+                              **self._HEADERS)
+        msg = "Response: {} should be {}, content: {}".format(
+            response.status_code, status_code, response.data)
+        self.assertEqual(response.status_code, status_code, msg)
+        return response
+
+    def test_GET_category_delta(self):
+        """
+        Test that the delta feed returns the categories updated and deleted
+        since the token of the previous sync.
+        """
+        #self.skipTest("Temporarily skipped")
+        names = ["Test Category {}".format(idx) for idx in range(3)]
+        categories = [self._create_category(self.project, name)
+                      for name in names]
+        # Make the categories older than the token overlap.
+        Category.objects.update(updated=timezone.now() - timedelta(days=1))
+        response = self._get_delta(self.client, {})
+        found = [item['name'] for item in response.data['results']]
+        msg = "found: {}, content: {}".format(found, response.data)
+        self.assertEqual(found, names, msg)
+        self.assertEqual(response.data['deleted'], [], msg)
+        token = response.data['token']
+        self.assertTrue(token, msg)
+        # Test that only the changes are returned.
+        categories[0].name = "Test Category Renamed"
+        categories[0].save()
+        public_id = categories[1].public_id
+        categories[1].delete()
+        data = {'updated_since': token}
+        response = self._get_delta(self.client, data)
+        found = [item['name'] for item in response.data['results']]
+        msg = "found: {}, content: {}".format(found, response.data)
+        self.assertEqual(found, ["Test Category Renamed"], msg)
+        self.assertEqual(response.data['deleted'], [public_id], msg)
+        # Test that the project parameter limits the feed.
+        data['project'] = "Bogus_Project_ID"
+        response = self._get_delta(self.client, data)
+        msg = "content: {}".format(response.data)
+        self.assertEqual(response.data['results'], [], msg)
+        self.assertEqual(response.data['deleted'], [], msg)
+
+    def test_GET_category_delta_deleted_permissions(self):
+        """
+        Test that a user does not get the deleted categories of the projects
+        they are not a member of.
+        """
+        #self.skipTest("Temporarily skipped")
+        kwargs = self._setup_user_credentials()
+        kwargs['login'] = True
+        user, client = self._create_user(**kwargs)
+        project = self._create_project(
+            self.in_type, name="Test Project 1", members=[user])
+        since = (timezone.now() - timedelta(days=1)).isoformat()
+        self._create_category(self.project, "Test Category").delete()
+        category = self._create_category(project, "Test Category 1")
+        public_id = category.public_id
+        category.delete()
+        response = self._get_delta(client, {'updated_since': since})
+        msg = "content: {}".format(response.data)
+        self.assertEqual(response.data['deleted'], [public_id], msg)
+
+    def test_GET_category_delta_invalid_updated_since(self):
+        """
+        Test that an invalid token is a 400.
+        """
+        #self.skipTest("Temporarily skipped")
+        response = self._get_delta(
+            self.client, {'updated_since': 'bogus'},
+            status.HTTP_400_BAD_REQUEST)
+        msg = "content: {}".format(response.data)
+        self.assertTrue(self._has_error(response, 'updated_since'), msg)
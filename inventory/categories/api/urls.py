@@ -5,7 +5,8 @@
 
 from django.conf.urls import include, url
 
-from .views import category_list, category_detail, category_clone
+from .views import (
+    category_list, category_detail, category_clone, category_delta)
 
 
 urlpatterns = [
@@ -14,4 +15,5 @@ urlpatterns = [
     url(r'categories/(?P<public_id>\w+)/$', category_detail,
         name="category-detail"),
     url(r'category-clone/$', category_clone, name='category-clone'),
+    url(r'category-delta/$', category_delta, name='category-delta'),
     ]
@@ -10,7 +10,8 @@ from django.utils.translation import ugettext_lazy as _
 
 from rest_framework import status
 from rest_framework.generics import (
-    ListCreateAPIView, RetrieveUpdateDestroyAPIView, GenericAPIView)
+    ListAPIView, ListCreateAPIView, RetrieveUpdateDestroyAPIView,
+    GenericAPIView)
 from rest_framework.exceptions import PermissionDenied, NotAuthenticated
 from rest_framework.mixins import DestroyModelMixin, CreateModelMixin
 from rest_framework.permissions import IsAuthenticated
@@ -20,10 +21,12 @@ from rest_condition import ConditionalPermission, C, And, Or, Not
 
 from inventory.common.api.permissions import (
     IsAdminSuperUser, IsAdministrator, IsProjectOwner, IsProjectManager,
-    IsProjectDefaultUser, IsUserActive, IsReadOnly)
+    IsProjectDefaultUser, IsAnyProjectUser, IsUserActive, IsReadOnly,
+    get_project_ids)
 from inventory.common.api.pagination import SmallResultsSetPagination
 from inventory.common.api.view_mixins import (
-    TrapDjangoValidationErrorCreateMixin, TrapDjangoValidationErrorUpdateMixin)
+    TrapDjangoValidationErrorCreateMixin, TrapDjangoValidationErrorUpdateMixin,
+    ConditionalGetMixin, DeltaFeedMixin)
 
 from ..models import Category
 
@@ -44,7 +47,7 @@ class CategoryAuthorizationMixin(object):
             self.request.user.role == UserModel.ADMINISTRATOR):
             result = Category.objects.all()
         else:
-            projects = self.request.user.projects.all()
+            projects = get_project_ids(self.request)
             result = Category.objects.select_related(
                 'project').filter(project__in=projects)
 
@@ -53,6 +56,7 @@ class CategoryAuthorizationMixin(object):
 
 class CategoryList(CategoryAuthorizationMixin,
                    TrapDjangoValidationErrorCreateMixin,
+                   ConditionalGetMixin,
                    ListCreateAPIView):
     """
     Category list endpoint.
@@ -76,6 +80,7 @@ category_list = CategoryList.as_view()
 
 class CategoryDetail(CategoryAuthorizationMixin,
                      TrapDjangoValidationErrorUpdateMixin,
+                     ConditionalGetMixin,
                      RetrieveUpdateDestroyAPIView):
     """
     Category detail endpoint.
@@ -96,6 +101,25 @@ class CategoryDetail(CategoryAuthorizationMixin,
 category_detail = CategoryDetail.as_view()
 
 
+class CategoryDelta(CategoryAuthorizationMixin,
+                    DeltaFeedMixin,
+                    ListAPIView):
+    """
+    Category delta feed endpoint, the categories changed since a sync token.
+    """
+    serializer_class = CategorySerializer
+    permission_classes = (
+        And(IsUserActive, IsAuthenticated,
+            Or(IsAdminSuperUser,
+               IsAdministrator,
+               IsAnyProjectUser
+               ),
+            ),
+        )
+
+category_delta = CategoryDelta.as_view()
+
+
 #
 # CategoryClone
 #
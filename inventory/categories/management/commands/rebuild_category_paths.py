@@ -0,0 +1,42 @@
+# -*- coding: utf-8 -*-
+#
+# inventory/categories/management/commands/rebuild_category_paths.py
+#
+"""
+Rebuild the path, id_path, and level of the categories. Run it once after
+upgrading a database that predates the id_path column.
+"""
+__docformat__ = "restructuredtext en"
+
+import logging
+
+from django.core.management.base import BaseCommand, CommandError
+
+from inventory.categories.models import Category
+from inventory.projects.models import Project
+
+log = logging.getLogger('commands.categories.rebuild-category-paths')
+
+
+class Command(BaseCommand):
+    """
+    Management command for rebuilding the category paths.
+    """
+    help = "Rebuild the category paths of all or one project."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '-p', '--project', type=str, default='', dest='project',
+            help="The public id of the project to rebuild, defaults to all.")
+
+    def handle(self, *args, **options):
+        project = None
+
+        if options.get('project'):
+            try:
+                project = Project.objects.get(public_id=options['project'])
+            except Project.DoesNotExist as e:
+                raise CommandError(str(e))
+
+        count = Category.objects.rebuild_paths(project)
+        self.stdout.write("Rebuilt {} category paths.".format(count))
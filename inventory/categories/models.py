@@ -10,10 +10,18 @@ Category model.
 __docformat__ = "restructuredtext en"
 
 import logging
+import time
 
 from collections import OrderedDict
-
-from django.db import models
+from datetime import datetime
+from dateutil.tz import tzutc
+
+from django.core.cache import cache
+from django.db import models, transaction
+from django.db.models import F, Value
+from django.db.models.functions import Concat, Substr
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
 from django.utils.encoding import python_2_unicode_compatible
 from django.core.exceptions import ValidationError
 from django.utils import six
@@ -23,18 +31,26 @@ from django.conf import settings
 from inventory.common import generate_public_key
 from inventory.common.model_mixins import (
     UserModelMixin, TimeModelMixin, ValidateOnSaveMixin)
-from inventory.projects.models import Project
+from inventory.common.signals import (
+    child_paths_updated, bulk_delete, in_bulk_delete)
+from inventory.projects.models import Project, Tombstone
 
 log = logging.getLogger('inventory.categories.models')
 
 
 class CategoryManager(models.Manager):
+    TREE_CACHE_KEY = 'category-tree-{}-{}'
+    TREE_GENERATION_KEY = 'category-tree-generation-{}'
+    TREE_CACHE_TIMEOUT = 60 * 60 * 24
 
-    def create_category_tree(self, project, user, cat_name_tree, parents=None):
+    def create_category_tree(self, project, user, cat_name_tree, parents=None,
+                             bulk=False):
         """
         Gets and/or creates designated category, creating parent categories
         as necessary. Returns a list of objects in category order or an empty
-        list if `cat_name_tree` is the wrong data type.
+        list if `cat_name_tree` is the wrong data type. If `bulk` is `True`
+        all the existing categories are found with one query and the missing
+        ones are inserted a level at a time.
         """
         tree = []
 
@@ -57,6 +73,10 @@ class CategoryManager(models.Manager):
                         "or equal to the number of roots.")
                 raise ValueError(msg)
 
+        if bulk:
+            return self._bulk_create_tree(
+                project, user, cat_name_tree, parents)
+
         for idx, item in enumerate(cat_name_tree):
             parent = parents[0] if len_parents == 1 else parents[idx]
             nodes, junk = self._recurse_names(project, user, item, parent)
@@ -64,6 +84,117 @@ class CategoryManager(models.Manager):
 
         return tree
 
+    def _bulk_create_tree(self, project, user, cat_name_tree, parents):
+        sep = self.model.DEFAULT_SEPARATOR
+        len_parents = len(parents)
+        path_map = {}
+        path_tree = []
+
+        for idx, item in enumerate(cat_name_tree):
+            parent = parents[0] if len_parents == 1 else parents[idx]
+            parent_path = None
+
+            if parent is not None:
+                parent_path = parent.path
+                path_map[parent_path] = (None, None)
+
+            nodes, junk = self._recurse_paths(item, parent_path, path_map)
+            path_tree.append(nodes)
+
+        with transaction.atomic():
+            objects = {obj.path: obj for obj in self.filter(
+                project=project, path__in=list(path_map))}
+            objects.update({parent.path: parent for parent in parents
+                            if parent is not None})
+            missing = {}
+
+            for path in path_map:
+                if path not in objects:
+                    missing.setdefault(path.count(sep), []).append(path)
+
+            for level in sorted(missing):
+                new_objs = [self._build_category(
+                    project, user, path, level, objects.get(path_map[path][0]),
+                    path_map[path][1]) for path in missing[level]]
+                self.bulk_create(new_objs)
+
+                if any(obj.pk is None for obj in new_objs):
+                    new_objs = self.filter(project=project,
+                                           path__in=missing[level])
+
+                objects.update({obj.path: obj for obj in new_objs})
+
+            if missing:
+                self.invalidate_tree_snapshot(project.pk)
+
+        return self._recurse_objects(path_tree, objects)
+
+    def _recurse_paths(self, item, parent_path, path_map):
+        """
+        Mirrors `_recurse_names` building a tree of category paths instead
+        of category objects.
+        """
+        tree = []
+        path = None
+        outer_parent_path = parent_path
+
+        if isinstance(item, (list, tuple)):
+            if len(item) > 1:
+                hold = all([isinstance(x, (list, tuple)) for x in item])
+            else:
+                hold = False
+
+            for next in item:
+                parent_path = outer_parent_path if hold else parent_path
+                nodes, parent_path = self._recurse_paths(
+                    next, parent_path, path_map)
+                tree.append(nodes)
+        else:
+            sep = self.model.DEFAULT_SEPARATOR
+
+            if sep in item:
+                raise ValidationError(
+                    {'name': _("A category name cannot contain the category "
+                               "delimiter '{}'.").format(sep)})
+
+            if parent_path is None:
+                path = item
+            else:
+                if item in parent_path.split(sep):
+                    raise ValidationError(
+                        {'name': _("A category in this tree with name [{}] "
+                                   "already exists.").format(item)})
+
+                path = sep.join((parent_path, item))
+
+            path_map.setdefault(path, (parent_path, item))
+            tree = path
+
+        return tree, path
+
+    def _recurse_objects(self, item, objects):
+        if isinstance(item, list):
+            tree = [self._recurse_objects(next, objects) for next in item]
+        else:
+            tree = objects[item]
+
+        return tree
+
+    def _build_category(self, project, user, path, level, parent, name):
+        """
+        Returns an unsaved category with all the fields that `Category.clean`
+        and `Category.save` would normally set.
+        """
+        now = datetime.now(tzutc())
+        obj = self.model(
+            public_id=generate_public_key(), project=project, parent=parent,
+            name=name, path=path, level=level, creator=user, updater=user,
+            created=now, updated=now)
+        obj.id_path = obj._get_id_path()
+        self._check_parents_project(project, obj)
+        obj.clean_fields(exclude=('project', 'parent', 'creator', 'updater',))
+        return obj
+
     def _recurse_names(self, project, user, item, parent):
         tree = []
         node = None
@@ -96,13 +227,17 @@ class CategoryManager(models.Manager):
         there are other children on the category. The result is that it
         will delete whatever was just added. This is useful for rollbacks.
         The 'node_list' should be a flat list of end level categories. A
-        list of strings is returned representing the deleted nodes.
+        list of strings is returned representing the deleted nodes. The
+        categories to delete are found with one query and deleted with one
+        statement.
         """
         paths = []
 
         if not isinstance(node_list, (models.QuerySet, list, tuple)):
             node_list = [node_list]
 
+        ids = set()
+
         for node in node_list:
             if node.project != project:
                 msg = _("Trying to delete category '{}' with invalid project, "
@@ -112,30 +247,65 @@ class CategoryManager(models.Manager):
                 log.error(ugettext(msg))
                 raise ValueError(msg)
 
-            deleted = self._recurse_delete(node)
+            ids.add(node.pk)
+            ids.update(node.ancestor_ids)
+
+        nodes = self._in_bulk_with_children_count(ids)
+        deleted_ids = set()
+
+        for node in node_list:
+            deleted = self._prune_branch(nodes.get(node.pk), nodes,
+                                         deleted_ids)
 
             if len(deleted) > 0:
                 paths.append(deleted)
 
+        if deleted_ids:
+            with transaction.atomic(), bulk_delete(self.model, deleted_ids):
+                self.filter(pk__in=deleted_ids).delete()
+                Tombstone.objects.add_many(
+                    self.model, project.pk,
+                    [nodes[pk].public_id for pk in deleted_ids])
+
         return paths
 
-    def _recurse_delete(self, node):
+    def _in_bulk_with_children_count(self, ids):
+        """
+        Returns a dict of primary keys to categories where each category is
+        annotated with `num_children`.
+        """
+        queryset = self.filter(pk__in=ids).annotate(
+            num_children=models.Count('children'))
+        return {obj.pk: obj for obj in queryset}
+
+    def _prune_branch(self, node, nodes, deleted_ids):
+        """
+        Walks up from `node` collecting the categories that will have no
+        children left once the ones below them are deleted.
+        """
         paths = []
 
-        if node.children.count() <= 0:
-            parent = node.parent
+        while (node is not None and node.pk not in deleted_ids and
+               node.num_children <= 0):
             paths.append(node.path)
-            node.delete()
+            deleted_ids.add(node.pk)
+            node = nodes.get(node.parent_id)
 
-            if parent:
-                [paths.append(path) for path in self._recurse_delete(parent)]
+            if node is not None:
+                node.num_children -= 1
 
         return paths
 
     def get_parents(self, project, category):
         """
-        Get all the parents to this category object.
+        Get all the parents to this category object. The parents are found
+        with a single query using the `id_path` ancestry index.
         """
+        self._check_parents_project(project, category)
+        ids = category.ancestor_ids
+        return self._order_parents(ids, self.in_bulk(ids))
+
+    def _check_parents_project(self, project, category):
         if category.project != project or not category.project.public:
             msg = _("Trying to access a category '{}' with an invalid "
                     "project, updater: {}, updated: {}, project: {}, invalid "
@@ -145,20 +315,139 @@ class CategoryManager(models.Manager):
             log.error(ugettext(msg))
             raise ValueError(msg)
 
-        parents = self._recurse_parents(category)
-        parents.reverse()
-        return parents
+    def _order_parents(self, ids, nodes):
+        return [nodes[pk] for pk in ids if pk in nodes]
+
+    def update_child_paths(self, category, old_path, old_id_path, old_level):
+        """
+        Rewrites the `path`, `id_path`, and `level` of all the descendants
+        of `category` after it has been renamed or moved. The old values are
+        the ones stored before the change. The descendants are validated
+        against the new parents then updated with a single statement.
+        """
+        sep = category.ID_PATH_SEPARATOR
+        old_prefix = "{}{}{}".format(old_id_path, category.pk, sep)
+        children = self.filter(id_path__startswith=old_prefix)
+        parents = self.get_parents(category.project, category)
+        names = [parent.name for parent in parents]
+        names.append(category.name)
+        duplicate = children.filter(name__in=names).values_list(
+            'name', flat=True).first()
+
+        if duplicate is not None:
+            raise ValidationError(
+                {'name': _("A category in this tree with name [{}] already "
+                           "exists.").format(duplicate)})
+
+        self.invalidate_tree_snapshot(category.project_id)
+        return children.update(
+            path=Concat(Value(category.path),
+                        Substr('path', len(old_path) + 1),
+                        output_field=models.CharField()),
+            id_path=Concat(Value(category.descendant_id_path),
+                           Substr('id_path', len(old_prefix) + 1),
+                           output_field=models.CharField()),
+            level=F('level') + (category.level - old_level),
+            updated=datetime.now(tzutc()))
+
+    def rebuild_paths(self, project=None):
+        """
+        Rebuilds the `path`, `id_path`, and `level` of all the categories, or
+        only the categories of the `project`, from their parent foreign keys.
+        Databases that predate the `id_path` column need this once, see the
+        `rebuild_category_paths` command. Returns the number of categories
+        updated.
+        """
+        categories = self.all()
 
-    def _recurse_parents(self, category):
-        parents = []
+        if project is not None:
+            categories = categories.filter(project=project)
 
-        if category.parent:
-            parents.append(category.parent)
-            parents.extend(self._recurse_parents(category.parent))
+        nodes = {row[0]: row for row in categories.values_list(
+            'pk', 'project_id', 'parent_id', 'name', 'path', 'id_path',
+            'level')}
+        sep = self.model.ID_PATH_SEPARATOR
+        project_ids = set()
+        count = 0
 
-        return parents
+        with transaction.atomic():
+            for pk, project_id, parent_id, name, path, id_path, level in (
+                    nodes.values()):
+                ids = []
+                names = [name]
 
-    def get_child_tree_from_list(self, project, node_list, with_root=True):
+                while parent_id is not None:
+                    ids.insert(0, "{}{}".format(parent_id, sep))
+                    names.insert(0, nodes[parent_id][3])
+                    parent_id = nodes[parent_id][2]
+
+                new_id_path = ''.join(ids)
+                new_path = self.model.DEFAULT_SEPARATOR.join(names)
+
+                if (new_path, new_id_path, len(ids)) != (path, id_path, level):
+                    self.filter(pk=pk).update(
+                        path=new_path, id_path=new_id_path, level=len(ids),
+                        updated=datetime.now(tzutc()))
+                    project_ids.add(project_id)
+                    count += 1
+
+            for project_id in project_ids:
+                self.invalidate_tree_snapshot(project_id)
+
+        return count
+
+    def get_tree_snapshot(self, project):
+        """
+        Returns a list of all the categories in `project` ordered by path.
+        The list is cached and versioned by the project's tree generation,
+        which is bumped whenever a category in the project changes.
+        """
+        key = self.TREE_CACHE_KEY.format(
+            project.pk, self._get_tree_generation(project.pk))
+        snapshot = cache.get(key)
+
+        if snapshot is None:
+            snapshot = list(self.filter(project=project))
+            cache.set(key, snapshot, self.TREE_CACHE_TIMEOUT)
+
+        for obj in snapshot:
+            obj.project = project
+
+        return snapshot
+
+    def invalidate_tree_snapshot(self, project_id):
+        """
+        Bumps the tree generation of the project now and again when the
+        current transaction commits, so a snapshot built from uncommitted
+        data is never reused.
+        """
+        self._bump_tree_generation(project_id)
+        transaction.on_commit(lambda: self._bump_tree_generation(project_id))
+
+    def _get_tree_generation(self, project_id):
+        key = self.TREE_GENERATION_KEY.format(project_id)
+        generation = cache.get(key)
+
+        if generation is None:
+            cache.add(key, self._new_tree_generation(), None)
+            generation = cache.get(key)
+
+        return generation
+
+    def _bump_tree_generation(self, project_id):
+        key = self.TREE_GENERATION_KEY.format(project_id)
+
+        try:
+            cache.incr(key)
+        except ValueError:
+            # The key was evicted, start from a value never used before.
+            cache.set(key, self._new_tree_generation(), None)
+
+    def _new_tree_generation(self):
+        return int(time.time() * 1000000)
+
+    def get_child_tree_from_list(self, project, node_list, with_root=True,
+                                 use_cache=False):
         """
         Given a list of Category objects, return a list of all the
         Categories plus all the Categories' children, plus the children's
@@ -166,7 +455,10 @@ class CategoryManager(models.Manager):
         are passed in `node_list`, this function will return
         [['Arts', [['Arts>Music', 'Arts>Music>Local']]],
          ['Color', [['Color>Blue','Color>Green', 'Color>Red']]]] objects.
-        Lists are compressed if they only have a single value.
+        Lists are compressed if they only have a single value. The children
+        are fetched in one query unless `use_cache` is `True`, then they are
+        taken from the project's tree snapshot, which holds every category
+        in the project. In both cases the tree is assembled in memory.
         """
         tree = []
 
@@ -180,7 +472,14 @@ class CategoryManager(models.Manager):
                         ).format(node, project)
                 raise ValueError(msg)
 
-            children = self._recurse_children(node)
+        if use_cache:
+            children_map = self._map_children(
+                self.get_tree_snapshot(project))
+        else:
+            children_map = self._get_children_map(node_list)
+
+        for node in node_list:
+            children = self._recurse_children(node, children_map)
 
             if with_root:
                 nodes = []
@@ -193,11 +492,31 @@ class CategoryManager(models.Manager):
 
         return tree
 
-    def _recurse_children(self, item):
+    def _get_children_map(self, node_list):
+        """
+        Returns a dict of parent primary keys to a list of their children
+        for all the descendants of the categories in `node_list`.
+        """
+        query = models.Q()
+
+        for node in node_list:
+            query |= models.Q(id_path__startswith=node.descendant_id_path)
+
+        return self._map_children(self.filter(query) if query else [])
+
+    def _map_children(self, categories):
+        children_map = {}
+
+        for child in categories:
+            children_map.setdefault(child.parent_id, []).append(child)
+
+        return children_map
+
+    def _recurse_children(self, item, children_map):
         tree = []
 
-        for child in item.children.all():
-            nodes = self._recurse_children(child)
+        for child in children_map.get(item.pk, []):
+            nodes = self._recurse_children(child, children_map)
             nodes.insert(0, child)
             len_nodes = len(nodes)
 
@@ -208,18 +527,37 @@ class CategoryManager(models.Manager):
 
         return tree
 
-    def get_all_root_trees(self, project, name):
+    def get_all_root_trees(self, project, name, use_cache=False):
         """
         Given a category 'name' and 'project' return a list of trees where
         each tree has the category 'name' as one of its members.
         ex. [[<color>, <color>red>, <color>green>], [<light>, <light>red>]]
-        Red is in both trees.
+        Red is in both trees. If `use_cache` is `True` the project's tree
+        snapshot, which holds every category in the project, is used instead
+        of querying the database.
         """
         result = []
-        records = self.filter(project=project, name=name)
+        nodes = None
+
+        if use_cache:
+            snapshot = self.get_tree_snapshot(project)
+            records = [obj for obj in snapshot if obj.name == name]
+            nodes = {obj.pk: obj for obj in snapshot}
+        else:
+            records = self.select_related('project').filter(
+                project=project, name=name)
 
         if len(records) > 0:
-            result[:] = [self.get_parents(project, record)
+            ids = set()
+
+            for record in records:
+                self._check_parents_project(project, record)
+                ids.update(record.ancestor_ids)
+
+            if nodes is None:
+                nodes = self.in_bulk(ids)
+
+            result[:] = [self._order_parents(record.ancestor_ids, nodes)
                          for record in records]
 
         return result
@@ -229,6 +567,7 @@ class CategoryManager(models.Manager):
 class Category(TimeModelMixin, UserModelMixin, ValidateOnSaveMixin,
                models.Model):
     DEFAULT_SEPARATOR = '>'
+    ID_PATH_SEPARATOR = '/'
 
     public_id = models.CharField(
         verbose_name=_("Public Category ID"), max_length=30, unique=True,
@@ -251,6 +590,11 @@ class Category(TimeModelMixin, UserModelMixin, ValidateOnSaveMixin,
     level = models.SmallIntegerField(
         verbose_name=_("Level"), editable=False,
         help_text=_("The location in the hierarchy of this category."))
+    id_path = models.CharField(
+        verbose_name=_("Ancestor IDs"), max_length=1000, editable=False,
+        blank=True, db_index=True,
+        help_text=_("The primary keys of all the parents of this category "
+                    "starting from the root."))
 
     objects = CategoryManager()
 
@@ -260,7 +604,9 @@ class Category(TimeModelMixin, UserModelMixin, ValidateOnSaveMixin,
             self.public_id = generate_public_key()
 
         if hasattr(self, 'project'):
-            self.path = self._get_category_path()
+            self.id_path = self._get_id_path()
+            parents = Category.objects.get_parents(self.project, self)
+            self.path = self._get_category_path(parents=parents)
             self.level = self.path.count(self.DEFAULT_SEPARATOR)
             delimiter = self.DEFAULT_SEPARATOR
 
@@ -271,11 +617,13 @@ class Category(TimeModelMixin, UserModelMixin, ValidateOnSaveMixin,
                                "delimiter '{}'.").format(delimiter)})
 
             if self.parent:
-                # Check that this category is not a parent.
-                parents = Category.objects.get_parents(
-                    self.project, self.parent)
-                parents.append(self.parent)
+                # Check that this category is not a child of itself.
+                if self.pk is not None and self.pk in self.ancestor_ids:
+                    raise ValidationError(
+                        {'parent': _("A category cannot be a child of "
+                                     "itself.")})
 
+                # Check that this category is not a parent.
                 for parent in parents:
                     if parent.name == self.name:
                         raise ValidationError(
@@ -290,10 +638,48 @@ class Category(TimeModelMixin, UserModelMixin, ValidateOnSaveMixin,
                     {'name': _("A root level category name [{}] already exists."
                                ).format(self.name)})
 
-    def _get_category_path(self, current=True):
-        parents = Category.objects.get_parents(self.project, self)
-        if current: parents.append(self)
-        return self.DEFAULT_SEPARATOR.join([parent.name for parent in parents])
+    def _get_id_path(self):
+        id_path = ''
+
+        if self.parent:
+            if self.parent.parent_id and not self.parent.id_path:
+                # The parent has not been rebuilt since the `id_path` column
+                # was added, follow the foreign keys instead.
+                node = self.parent
+
+                while node is not None:
+                    id_path = "{}{}{}".format(
+                        node.pk, self.ID_PATH_SEPARATOR, id_path)
+                    node = node.parent
+            else:
+                id_path = self.parent.descendant_id_path
+
+        return id_path
+
+    def _get_category_path(self, current=True, parents=None):
+        if parents is None:
+            parents = Category.objects.get_parents(self.project, self)
+
+        names = [parent.name for parent in parents]
+        if current: names.append(self.name)
+        return self.DEFAULT_SEPARATOR.join(names)
+
+    @property
+    def descendant_id_path(self):
+        """
+        Returns the `id_path` prefix shared by all the descendants of this
+        category.
+        """
+        return "{}{}{}".format(self.id_path, self.pk, self.ID_PATH_SEPARATOR)
+
+    @property
+    def ancestor_ids(self):
+        """
+        Returns a list of the primary keys of all the parents of this
+        category starting with the root category.
+        """
+        return [int(pk) for pk in self.id_path.split(self.ID_PATH_SEPARATOR)
+                if pk]
 
     def get_children(self):
         """
@@ -317,11 +703,28 @@ class Category(TimeModelMixin, UserModelMixin, ValidateOnSaveMixin,
     parents_producer.short_description = _("Category Parents")
 
     def save(self, *args, **kwargs):
-        super(Category, self).save(*args, **kwargs)
+        with transaction.atomic():
+            old = None
+
+            if self.pk is not None:
+                old = Category.objects.filter(pk=self.pk).values(
+                    'path', 'id_path', 'level').first()
+
+                if old and old['level'] and not old['id_path']:
+                    # The tree predates the `id_path` column, rebuild it
+                    # before the children are moved with it.
+                    Category.objects.rebuild_paths(self.project)
+                    old = Category.objects.filter(pk=self.pk).values(
+                        'path', 'id_path', 'level').first()
 
-        # Fix all children if any.
-        for child in self.children.all():
-            child.save()
+            super(Category, self).save(*args, **kwargs)
+
+            # Fix all children if any.
+            if old and (old['path'] != self.path or
+                        old['id_path'] != self.id_path):
+                Category.objects.update_child_paths(
+                    self, old['path'], old['id_path'], old['level'])
+                child_paths_updated.send(sender=Category, instance=self)
 
     def __str__(self):
         return "{}".format(self.path)
@@ -329,5 +732,32 @@ class Category(TimeModelMixin, UserModelMixin, ValidateOnSaveMixin,
     class Meta:
         unique_together = ('project', 'parent', 'name',)
         ordering = ('path',)
+        # Supports the keyset pagination on the ordering and the delta feed.
+        indexes = (models.Index(fields=['path', 'id']),
+                   models.Index(fields=['updated', 'id']),)
         verbose_name = _("Category")
         verbose_name_plural = _("Categories")
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def invalidate_category_tree(sender, **kwargs):
+    """
+    Invalidate the cached category tree of the project.
+    """
+    instance = kwargs.get('instance')
+
+    if instance:
+        Category.objects.invalidate_tree_snapshot(instance.project_id)
+
+
+@receiver(post_delete, sender=Category)
+def add_category_tombstone(sender, **kwargs):
+    """
+    Record the deleted category for the delta feed, the bulk delete paths
+    record theirs with one insert.
+    """
+    instance = kwargs.get('instance')
+
+    if instance and not in_bulk_delete(sender):
+        Tombstone.objects.add(instance, instance.project_id)
@@ -3,14 +3,18 @@
 # inventory/categories/tests/test_category_model.py
 #
 
+import io
 import logging
 import datetime
 import pytz
 
 from django.core.exceptions import ValidationError
+from django.core.management import call_command
 from django.contrib.auth import get_user_model
+from django.test import override_settings
 
 from inventory.common.tests.base_tests import BaseTest
+from inventory.projects.models import Tombstone
 
 from ..models import Category
 
@@ -105,6 +109,56 @@ class TestCategoryModel(BaseTest):
             Category.objects.create_category_tree(
                 self.project, self.user, create_list_5, parents=parents)
 
+    def test_create_category_tree_bulk(self):
+        """
+        Test that the bulk mode returns the same structure as the non-bulk
+        mode and reuses existing categories.
+        """
+        #self.skipTest("Temporarily skipped")
+        create_list = [['TestLevel-0', [['TestLevel-1', 'TestLevel-2',],
+                                        ['TestLevel-1a', 'TestLevel-2a']]]]
+        categories_0 = Category.objects.create_category_tree(
+            self.project, self.user, create_list, bulk=True)
+        msg = "{}".format(categories_0)
+        self.assertEqual(len(categories_0), 1, msg)
+        self.assertEqual(categories_0[0][0].name, 'TestLevel-0', msg)
+        self.assertEqual(categories_0[0][1][0][1].level, 2, msg)
+        self.assertEqual(categories_0[0][1][1][1].path, 'TestLevel-0>'
+                         'TestLevel-1a>TestLevel-2a', msg)
+        self.assertEqual(categories_0[0][1][1][1].parent,
+                         categories_0[0][1][1][0], msg)
+        self.assertEqual(Category.objects.filter(
+            project=self.project).count(), 5, msg)
+        # Test that the non-bulk mode finds the same categories.
+        categories_1 = Category.objects.create_category_tree(
+            self.project, self.user, create_list)
+        msg = "bulk: {}, non-bulk: {}".format(categories_0, categories_1)
+        self.assertEqual(categories_0, categories_1, msg)
+        # Test that existing categories are reused with a new child.
+        create_list = ('TestLevel-0', 'TestLevel-1', 'TestLevel-2b')
+
+        categories_2 = Category.objects.create_category_tree(
+            self.project, self.user, [create_list], bulk=True)
+
+        msg = "{}".format(categories_2)
+        self.assertEqual(categories_2[0][0], categories_0[0][0], msg)
+        self.assertEqual(categories_2[0][2].parent, categories_0[0][1][0][0],
+                         msg)
+        # Test that a delimiter in a category name raises and exception.
+        create_list = ('TestLevel-0',
+                       'Test{}Level-1.1'.format(Category.DEFAULT_SEPARATOR))
+
+        with self.assertRaises(ValidationError) as cm:
+            Category.objects.create_category_tree(
+                self.project, self.user, [create_list], bulk=True)
+
+        # Test that a name cannot be in the tree twice.
+        create_list = ('TestLevel-0', 'TestLevel-1', 'TestLevel-0')
+
+        with self.assertRaises(ValidationError) as cm:
+            Category.objects.create_category_tree(
+                self.project, self.user, [create_list], bulk=True)
+
     def test_delete_category_tree(self):
         #self.skipTest("Temporarily skipped")
         # Create three categories
@@ -114,6 +168,8 @@ class TestCategoryModel(BaseTest):
                          ]]]
         categories = Category.objects.create_category_tree(
             self.project, self.user, create_list)
+        public_ids = list(Category.objects.filter(
+            project=self.project).values_list('public_id', flat=True))
         # Try to delete a categegory in the middle of a list, should fail.
         cat = categories[0][1][0][0] # TestLevel-1
         deleted = Category.objects.delete_category_tree(self.project, cat)
@@ -139,6 +195,39 @@ class TestCategoryModel(BaseTest):
         msg = "categories: {}, category: {}, deleted: {}".format(
             categories, cat, deleted)
         self.assertTrue(len(deleted[0]) == 4, msg)
+        # Test that each deleted category has one tombstone.
+        found = sorted(Tombstone.objects.filter(
+            project=self.project).values_list('public_id', flat=True))
+        expected = sorted(public_ids)
+        msg = "found: {}, expected: {}".format(found, expected)
+        self.assertEqual(found, expected, msg)
+
+    def test_delete_category_tree_multiple_nodes(self):
+        """
+        Test that deleting multiple end level categories prunes the parents
+        only after all their children have been deleted.
+        """
+        #self.skipTest("Temporarily skipped")
+        create_list = [['TestLevel-0', [['TestLevel-1', [['TestLevel-1a',
+                                                          'TestLevel-1b']]],
+                                        ['TestLevel-2']]]]
+        categories = Category.objects.create_category_tree(
+            self.project, self.user, create_list)
+        leaf_0 = categories[0][1][0][1][0][1] # TestLevel-1b
+        leaf_1 = categories[0][1][1][0] # TestLevel-2
+        deleted = Category.objects.delete_category_tree(
+            self.project, [leaf_0, leaf_1])
+        sep = Category.DEFAULT_SEPARATOR
+        msg = "categories: {}, deleted: {}".format(categories, deleted)
+        self.assertEqual(deleted, [
+            [sep.join(('TestLevel-0', 'TestLevel-1', 'TestLevel-1a',
+                       'TestLevel-1b')),
+             sep.join(('TestLevel-0', 'TestLevel-1', 'TestLevel-1a')),
+             sep.join(('TestLevel-0', 'TestLevel-1'))],
+            [sep.join(('TestLevel-0', 'TestLevel-2')),
+             'TestLevel-0']], msg)
+        self.assertEqual(Category.objects.filter(
+            project=self.project).count(), 0, msg)
 
     def test_delete_category_tree_non_owned(self):
         #self.skipTest("Temporarily skipped")
@@ -180,6 +269,27 @@ class TestCategoryModel(BaseTest):
         with self.assertRaises(ValueError) as cm:
             parents = Category.objects.get_parents(project, cat)
 
+    def test_get_parents_single_query(self):
+        """
+        Test that `get_parents` uses one query regardless of the depth of
+        the tree.
+        """
+        #self.skipTest("Temporarily skipped")
+        create_list = [['TestLevel-0', [['TestLevel-1', 'TestLevel-2',
+                                         'TestLevel-3', 'TestLevel-4']]]]
+        categories = Category.objects.create_category_tree(
+            self.project, self.user, create_list)
+        cat = categories[0][1][0][3] # 'TestLevel-4'
+
+        with self.assertNumQueries(1):
+            parents = Category.objects.get_parents(self.project, cat)
+
+        names = [parent.name for parent in parents]
+        msg = "category: {}, parents: {}".format(cat, names)
+        self.assertEqual(names, ['TestLevel-0', 'TestLevel-1', 'TestLevel-2',
+                                 'TestLevel-3'], msg)
+        self.assertEqual(cat.ancestor_ids, [p.pk for p in parents], msg)
+
     def test_get_child_tree_from_list_with_root(self):
         """
         Result of `get_child_tree_from_list` should be:
@@ -268,6 +378,70 @@ class TestCategoryModel(BaseTest):
         with self.assertRaises(ValueError) as cm:
             Category.objects.get_child_tree_from_list(self.project, cat)
 
+    def test_get_child_tree_from_list_single_query(self):
+        """
+        Test that the whole subtree is fetched with one query.
+        """
+        #self.skipTest("Temporarily skipped")
+        create_list = [['TestLevel-0', (('TestLevel-1', 'TestLevel-2',
+                                         'TestLevel-3'),
+                                        ('TestLevel-1a', 'TestLevel-2a',
+                                         'TestLevel-3a'),)]]
+        new_categories = Category.objects.create_category_tree(
+            self.project, self.user, create_list)
+        root = new_categories[0][0]
+
+        with self.assertNumQueries(1):
+            categories = Category.objects.get_child_tree_from_list(
+                self.project, [root])
+
+        msg = "categories: {}".format(categories)
+        self.assertEqual(categories[0][0], root, msg)
+        self.assertEqual(len(categories[0][1]), 2, msg)
+        branch = categories[0][1][0]
+        self.assertEqual(branch[0].name, 'TestLevel-1', msg)
+        self.assertEqual(branch[1][0].name, 'TestLevel-2', msg)
+        self.assertEqual(branch[1][1].name, 'TestLevel-3', msg)
+
+    @override_settings(CACHES={'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+    def test_get_child_tree_from_list_cached(self):
+        """
+        Test that a warm tree snapshot costs no queries and that it is
+        invalidated when a category changes.
+        """
+        #self.skipTest("Temporarily skipped")
+        create_list = [['TestLevel-0', (('TestLevel-1', 'TestLevel-2',),
+                                        ('TestLevel-1a', 'TestLevel-2a',))]]
+        new_categories = Category.objects.create_category_tree(
+            self.project, self.user, create_list)
+        root = new_categories[0][0]
+        Category.objects.get_child_tree_from_list(
+            self.project, [root], use_cache=True)
+
+        with self.assertNumQueries(0):
+            categories = Category.objects.get_child_tree_from_list(
+                self.project, [root], use_cache=True)
+            trees = Category.objects.get_all_root_trees(
+                self.project, 'TestLevel-2', use_cache=True)
+
+        msg = "categories: {}, trees: {}".format(categories, trees)
+        self.assertEqual(len(categories[0][1]), 2, msg)
+        self.assertEqual(trees, [[root, new_categories[0][1][0][0]]], msg)
+        # Test that a new category invalidates the snapshot.
+        self._create_category(self.project, 'TestLevel-1b', parent=root)
+        categories = Category.objects.get_child_tree_from_list(
+            self.project, [root], use_cache=True)
+        msg = "categories: {}".format(categories)
+        self.assertEqual(len(categories[0][1]), 3, msg)
+        # Test that a deleted category invalidates the snapshot.
+        Category.objects.delete_category_tree(
+            self.project, new_categories[0][1][1][1])
+        categories = Category.objects.get_child_tree_from_list(
+            self.project, [root], use_cache=True)
+        msg = "categories: {}".format(categories)
+        self.assertEqual(len(categories[0][1]), 2, msg)
+
     def test_get_child_tree_from_list_different_roots(self):
         #self.skipTest("Temporarily skipped")
         # Create two category trees.
@@ -375,3 +549,129 @@ class TestCategoryModel(BaseTest):
         for cat in categories[0][1][0]:
             msg = "{} not found in {}".format(root, cat.path)
             self.assertTrue(root in cat.path, msg)
+
+    def test_fix_path_in_moved_children(self):
+        """
+        Test that children path, id_path, and level information is fixed
+        when a category is moved to a new parent.
+        """
+        #self.skipTest("Temporarily skipped")
+        create_list = [['TestLevel-0', [['TestLevel-1', 'TestLevel-2',
+                                         'TestLevel-3']]],
+                       ['TestLevel-0a', 'TestLevel-1a']]
+        categories = Category.objects.create_category_tree(
+            self.project, self.user, create_list)
+        cat = categories[0][1][0][1] # 'TestLevel-2'
+        new_parent = categories[1][1] # 'TestLevel-0a>TestLevel-1a'
+        cat.parent = new_parent
+        cat.save()
+        child = Category.objects.get(pk=categories[0][1][0][2].pk)
+        sep = Category.DEFAULT_SEPARATOR
+        path = sep.join(('TestLevel-0a', 'TestLevel-1a', 'TestLevel-2',
+                         'TestLevel-3'))
+        msg = "Found path: {}, should be: {}".format(child.path, path)
+        self.assertEqual(child.path, path, msg)
+        self.assertEqual(child.level, 3, msg)
+        self.assertEqual(child.ancestor_ids, [categories[1][0].pk,
+                                              new_parent.pk, cat.pk], msg)
+
+    def test_save_without_id_path(self):
+        """
+        Test that saving a category in a tree that predates the `id_path`
+        column keeps its ancestry and fixes its children.
+        """
+        #self.skipTest("Temporarily skipped")
+        create_list = [['TestLevel-0', [['TestLevel-1', 'TestLevel-2',
+                                         'TestLevel-3']]]]
+        categories = Category.objects.create_category_tree(
+            self.project, self.user, create_list)
+        Category.objects.filter(project=self.project).update(id_path='')
+        cat = Category.objects.get(pk=categories[0][1][0][1].pk)
+        cat.name = 'TestLevel-2a'
+        cat.save()
+        cat = Category.objects.get(pk=cat.pk)
+        child = Category.objects.get(pk=categories[0][1][0][2].pk)
+        sep = Category.DEFAULT_SEPARATOR
+        path = sep.join(('TestLevel-0', 'TestLevel-1', 'TestLevel-2a'))
+        msg = "Found path: {}, should be: {}".format(cat.path, path)
+        self.assertEqual(cat.path, path, msg)
+        self.assertEqual(cat.level, 2, msg)
+        self.assertEqual(cat.ancestor_ids, [categories[0][0].pk,
+                                            categories[0][1][0][0].pk], msg)
+        path = sep.join((path, 'TestLevel-3'))
+        msg = "Found path: {}, should be: {}".format(child.path, path)
+        self.assertEqual(child.path, path, msg)
+        self.assertEqual(child.ancestor_ids, cat.ancestor_ids + [cat.pk], msg)
+        # Test that a new child of an old parent gets the full ancestry.
+        Category.objects.filter(project=self.project).update(id_path='')
+        parent = Category.objects.get(pk=cat.pk)
+        new = self._create_category(self.project, 'TestLevel-3a',
+                                    parent=parent)
+        msg = "new: {}, ancestors: {}".format(new.path, new.ancestor_ids)
+        self.assertEqual(new.ancestor_ids, cat.ancestor_ids + [cat.pk], msg)
+        self.assertEqual(new.level, 3, msg)
+
+    def test_rebuild_category_paths(self):
+        """
+        Test that the rebuild_category_paths command fills in the `id_path`
+        of existing categories.
+        """
+        #self.skipTest("Temporarily skipped")
+        create_list = [['TestLevel-0', [['TestLevel-1', 'TestLevel-2']]]]
+        categories = Category.objects.create_category_tree(
+            self.project, self.user, create_list)
+        expected = {obj.pk: (obj.path, obj.id_path, obj.level)
+                    for obj in Category.objects.filter(project=self.project)}
+        Category.objects.filter(project=self.project).update(id_path='')
+        out = io.StringIO()
+        call_command('rebuild_category_paths', project=self.project.public_id,
+                     stdout=out)
+        found = {obj.pk: (obj.path, obj.id_path, obj.level)
+                 for obj in Category.objects.filter(project=self.project)}
+        msg = "expected: {}, found: {}, out: {}".format(
+            expected, found, out.getvalue())
+        self.assertEqual(found, expected, msg)
+        self.assertIn("Rebuilt 2 category paths.", out.getvalue(), msg)
+        parents = Category.objects.get_parents(
+            self.project, Category.objects.get(pk=categories[0][1][0][1].pk))
+        msg = "parents: {}".format(parents)
+        self.assertEqual(parents, [categories[0][0], categories[0][1][0][0]],
+                         msg)
+        # Test that a second run has nothing to do.
+        self.assertEqual(Category.objects.rebuild_paths(), 0)
+
+    def test_fix_path_in_children_duplicate_name(self):
+        """
+        Test that renaming a category to a name used by one of its children
+        raises an exception and leaves the tree unchanged.
+        """
+        #self.skipTest("Temporarily skipped")
+        create_list = [['TestLevel-0', [['TestLevel-1', 'TestLevel-2']]]]
+        categories = Category.objects.create_category_tree(
+            self.project, self.user, create_list)
+        cat = categories[0][1][0][0] # 'TestLevel-1'
+        cat.name = 'TestLevel-2'
+
+        with self.assertRaises(ValidationError):
+            cat.save()
+
+        cat = Category.objects.get(pk=cat.pk)
+        child = Category.objects.get(pk=categories[0][1][0][1].pk)
+        msg = "cat: {}, child: {}".format(cat.path, child.path)
+        self.assertEqual(cat.name, 'TestLevel-1', msg)
+        self.assertTrue(child.path.startswith(cat.path), msg)
+
+    def test_category_not_child_of_itself(self):
+        """
+        Test that a category cannot be moved under one of its own children.
+        """
+        #self.skipTest("Temporarily skipped")
+        create_list = [['TestLevel-0', [['TestLevel-1', 'TestLevel-2']]]]
+        categories = Category.objects.create_category_tree(
+            self.project, self.user, create_list)
+        cat = categories[0][1][0][0] # 'TestLevel-1'
+        cat.parent = categories[0][1][0][1] # 'TestLevel-2'
+        cat.name = 'TestLevel-1b'
+
+        with self.assertRaises(ValidationError):
+            cat.save()
@@ -9,11 +9,17 @@ __docformat__ = "restructuredtext en"
 
 import string
 
+from .key_allocator import KeyBlockAllocator
 from .key_generator import KeyGenerator
+from .relations import sync_relation
 
 __all__ = (
     'generate_public_key',
+    'generate_public_keys',
     'generate_sku_fragment',
+    'generate_sku_fragments',
+    'KeyBlockAllocator',
+    'sync_relation',
     )
 
 
@@ -24,3 +30,11 @@ def generate_public_key():
 def generate_sku_fragment():
     gen = KeyGenerator(length=7)
     return gen.generate(domain=string.digits)
+
+def generate_public_keys(count):
+    gen = KeyGenerator(length=20)
+    return gen.generate_many(count)
+
+def generate_sku_fragments(count):
+    gen = KeyGenerator(length=7)
+    return gen.generate_many(count, domain=string.digits)
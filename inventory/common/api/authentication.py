@@ -0,0 +1,40 @@
+# -*- coding: utf-8 -*-
+#
+# inventory/common/api/authentication.py
+#
+"""
+Authentication classes.
+"""
+__docformat__ = "restructuredtext en"
+
+import logging
+
+from django.contrib.auth import get_user_model
+from django.utils.translation import ugettext_lazy as _
+
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.exceptions import AuthenticationFailed
+
+
+log = logging.getLogger('api.common.authentication')
+UserModel = get_user_model()
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """
+    Token authentication, the clients send an `Authorization: Token <key>`
+    header with the key issued by the login endpoint. The primary key of
+    the token's user is read from the cache so an authenticated request
+    does not hash a password or read the token.
+    """
+
+    def authenticate_credentials(self, key):
+        user = UserModel.objects.get_token_user(key)
+
+        if user is None:
+            raise AuthenticationFailed(_("Invalid token."))
+
+        if not user.is_active:
+            raise AuthenticationFailed(_("User inactive or deleted."))
+
+        return (user, key)
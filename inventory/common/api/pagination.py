@@ -3,10 +3,291 @@
 # inventory/common/api/pagination.py
 #
 
-from rest_framework.pagination import PageNumberPagination
+import json
+import base64
+import binascii
+import datetime
+from collections import OrderedDict
+
+from django.core.exceptions import FieldDoesNotExist
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connections
+from django.db.models import Q, QuerySet
+from django.utils import six
+from django.utils.translation import ugettext_lazy as _
+
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class CursorJSONEncoder(DjangoJSONEncoder):
+    """
+    The `DjangoJSONEncoder` cuts times to milliseconds, a cursor on rows
+    sharing a time with microseconds would then match the same rows again.
+    The times are encoded with their full precision.
+    """
+
+    def default(self, o):
+        if isinstance(o, (datetime.datetime, datetime.time)):
+            return o.isoformat()
+
+        return super(CursorJSONEncoder, self).default(o)
+
+
+class KeysetPagination(BasePagination):
+    """
+    Keyset (cursor) pagination, each page is found with a `WHERE` on the
+    ordering values of the last row of the previous page instead of an
+    `OFFSET`, and there is no `COUNT(*)`. The rows are ordered on the
+    queryset's ordering, which defaults to the model's `Meta.ordering`,
+    plus the primary key so the keys are unique. The cursor holds these
+    values and the direction, an empty cursor starts at the first page.
+    """
+    cursor_query_param = 'cursor'
+    page_size = 25
+    page_size_query_param = 'page_size'
+    max_page_size = 200
+    invalid_cursor_message = _("Invalid cursor")
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+        self.ordering = self.get_ordering(queryset)
+        self.nulls_largest = connections[
+            queryset.db].features.nulls_order_largest
+        values, self.reverse = self.decode_cursor(request)
+        ordering = self.ordering
+
+        if self.reverse:
+            ordering = [self._invert(field) for field in ordering]
+
+        base = queryset.order_by(*ordering)
+        queryset = base
+
+        if values is not None:
+            queryset = queryset.filter(self._get_keyset_query(
+                ordering, values))
+
+        results = list(queryset[:self.page_size + 1])
+        has_more = len(results) > self.page_size
+        del results[self.page_size:]
+
+        if self.reverse:
+            results.reverse()
+            self.has_next, self.has_previous = bool(results), has_more
+        else:
+            self.has_next = has_more
+            self.has_previous = values is not None and bool(results)
+
+        self.keys = self._get_keys(base, results)
+        self.results = results
+        return results
+
+    def get_page_size(self, request):
+        page_size = self.page_size
+
+        if self.page_size_query_param:
+            try:
+                value = int(request.query_params[self.page_size_query_param])
+            except (KeyError, ValueError):
+                pass
+            else:
+                if value > 0:
+                    page_size = min(value, self.max_page_size)
+
+        return page_size
+
+    def get_ordering(self, queryset):
+        """
+        Returns the ordering field names with the primary key added last.
+        """
+        ordering = []
+
+        for field in (queryset.query.order_by or
+                      queryset.model._meta.ordering):
+            if isinstance(field, six.string_types) and field != '?':
+                ordering.extend(self._expand_field(queryset.model, field))
+
+        if not any(field.lstrip('-') in ('pk', queryset.model._meta.pk.name)
+                   for field in ordering):
+            ordering.append('pk')
+
+        return ordering
+
+    def _expand_field(self, model, field):
+        """
+        Ordering on a relation orders on the related model's ordering, the
+        same is done here so that the cursor holds the values actually
+        sorted on.
+        """
+        descending = field.startswith('-')
+        name = field.lstrip('-')
+        opts = model._meta
+        target = None
+
+        try:
+            for part in name.split('__'):
+                target = opts.get_field(part)
+                opts = target.related_model._meta
+        except (FieldDoesNotExist, AttributeError):
+            # Plain fields, annotations, and transforms are used as is.
+            target = None
+
+        fields = [field]
+
+        if target is not None and target.is_relation:
+            fields = []
+
+            for sub in target.related_model._meta.ordering or ('pk',):
+                sub_descending = sub.startswith('-') != descending
+                fields.extend(self._expand_field(model, "{}{}__{}".format(
+                    '-' if sub_descending else '', name, sub.lstrip('-'))))
+
+        return fields
+
+    def decode_cursor(self, request):
+        """
+        Returns a tuple of the cursor's ordering values, or `None` for the
+        first page, and the reverse flag.
+        """
+        encoded = request.query_params.get(self.cursor_query_param)
+
+        if not encoded:
+            return None, False
+
+        try:
+            data = json.loads(base64.urlsafe_b64decode(
+                encoded.encode('ascii')).decode('utf-8'))
+            values, reverse = data['v'], bool(data.get('r'))
+        except (TypeError, ValueError, KeyError, UnicodeError,
+                binascii.Error):
+            raise NotFound(self.invalid_cursor_message)
+
+        if not isinstance(values, list) or len(values) != len(self.ordering):
+            raise NotFound(self.invalid_cursor_message)
+
+        return values, reverse
+
+    def encode_cursor(self, values, reverse):
+        data = {'v': values}
+
+        if reverse:
+            data['r'] = 1
+
+        encoded = base64.urlsafe_b64encode(json.dumps(
+            data, cls=CursorJSONEncoder).encode('utf-8')).decode('ascii')
+        return replace_query_param(
+            self.base_url, self.cursor_query_param, encoded)
+
+    def _invert(self, field):
+        return field[1:] if field.startswith('-') else '-' + field
+
+    def _get_keys(self, queryset, results):
+        """
+        Returns a dict of the ordering values of the first and last rows
+        keyed by their primary keys, read with one query.
+        """
+        if not results:
+            return {}
+
+        pks = set(obj.pk for obj in results[:1] + results[-1:])
+        names = [field.lstrip('-') for field in self.ordering]
+        return {values[0]: list(values[1:]) for values in queryset.filter(
+            pk__in=pks).values_list('pk', *names)}
+
+    def _get_keyset_query(self, ordering, values):
+        """
+        Returns the query for the rows after `values`, the rows that sort
+        after the first differing value, ex. `(a > 1) OR (a = 1 AND b > 2)
+        OR (a = 1 AND b = 2 AND pk > 3)`.
+        """
+        query = Q(pk__in=[])
+        equal = Q()
+
+        for field, value in zip(ordering, values):
+            name = field.lstrip('-')
+            after = self._get_after_query(
+                name, value, field.startswith('-'))
+
+            if after is not None:
+                query |= equal & after
+
+            equal &= (Q(**{'{}__isnull'.format(name): True}) if value is None
+                      else Q(**{name: value}))
+
+        return query
+
+    def _get_after_query(self, name, value, descending):
+        # NULLs sort last ascending on a database where they are the
+        # largest values, ex. PostgreSQL, and first on the others.
+        nulls_after = self.nulls_largest != descending
+        isnull = Q(**{'{}__isnull'.format(name): True})
+
+        if value is None:
+            after = None if nulls_after else ~isnull
+        else:
+            after = Q(**{'{}__{}'.format(
+                name, 'lt' if descending else 'gt'): value})
+
+            if nulls_after:
+                after |= isnull
+
+        return after
+
+    def get_next_link(self, results):
+        link = None
+
+        if self.has_next and results:
+            link = self.encode_cursor(self.keys[results[-1].pk], False)
+
+        return link
+
+    def get_previous_link(self, results):
+        link = None
+
+        if self.has_previous and results:
+            link = self.encode_cursor(self.keys[results[0].pk], True)
+
+        return link
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link(self.results)),
+            ('previous', self.get_previous_link(self.results)),
+            ('results', data),
+            ]))
 
 
 class SmallResultsSetPagination(PageNumberPagination):
+    """
+    Page number pagination, or keyset pagination when the request has a
+    `cursor` query parameter, which may be empty for the first page.
+    """
     page_size = 25
     page_size_query_param = 'page_size'
     max_page_size = 200
+    keyset_class = KeysetPagination
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.keyset = None
+
+        if (self.keyset_class.cursor_query_param in request.query_params
+            and isinstance(queryset, QuerySet)):
+            self.keyset = self.keyset_class()
+            self.keyset.page_size = self.page_size
+            self.keyset.page_size_query_param = self.page_size_query_param
+            self.keyset.max_page_size = self.max_page_size
+            return self.keyset.paginate_queryset(queryset, request, view=view)
+
+        return super(SmallResultsSetPagination, self).paginate_queryset(
+            queryset, request, view=view)
+
+    def get_paginated_response(self, data):
+        if self.keyset is not None:
+            return self.keyset.get_paginated_response(data)
+
+        return super(SmallResultsSetPagination, self).get_paginated_response(
+            data)
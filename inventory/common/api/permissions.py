@@ -12,6 +12,7 @@ import logging
 from django.contrib.auth import get_user_model
 
 from rest_framework import permissions
+from rest_framework.request import Request
 
 from inventory.projects.models import Membership, Project
 
@@ -29,6 +30,40 @@ def get_user(request):
     return user
 
 
+def get_membership_map(request):
+    """
+    Returns a dict of the request user's project ids mapped to their role
+    in the project. The map comes from the user's cached project roles and
+    is kept on the DRF request, so all the project permissions checked on a
+    request, including the object permissions, share it.
+    """
+    user = get_user(request)
+    key = getattr(user, 'pk', None)
+    cached = getattr(request, '_membership_map', None)
+
+    if cached is None or cached[0] != key:
+        memberships = {}
+
+        if key is not None and hasattr(user, 'memberships'):
+            memberships = Membership.objects.get_project_roles(user)
+
+        cached = (key, memberships)
+
+        # Only a DRF request is limited to a single view call.
+        if isinstance(request, Request):
+            request._membership_map = cached
+
+    return cached[1]
+
+
+def get_project_ids(request):
+    """
+    Returns a sorted list of the request user's project ids, used by the
+    authorization mixins to filter on a literal list of ids.
+    """
+    return sorted(get_membership_map(request))
+
+
 #
 # User based permissions
 #
@@ -119,29 +154,31 @@ class BaseProjectPermission(permissions.BasePermission):
             if not isinstance(level, (list, tuple)):
                 level = (level,)
 
-            if (hasattr(user, 'memberships') and
-                user.memberships.filter(role__in=level).count()):
+            memberships = get_membership_map(request)
+
+            if any(role in level for role in memberships.values()):
                 result = True
 
         return result
 
     def has_project_object_permission(self, request, obj, level):
         result = False
-        project = None
+        project_id = None
         user = get_user(request)
 
         if user:
             if isinstance(obj, Project):
-                project = obj
+                project_id = obj.pk
+            elif hasattr(obj, 'project_id'):
+                project_id = obj.project_id
             elif hasattr(obj, 'project'):
-                project = obj.project
+                project_id = getattr(obj.project, 'pk', None)
 
-            if project:
+            if project_id:
                 if not isinstance(level, (list, tuple)):
                     level = (level,)
 
-                if user.memberships.filter(project=project,
-                                           role__in=level).count():
+                if get_membership_map(request).get(project_id) in level:
                     result = True
 
         return result
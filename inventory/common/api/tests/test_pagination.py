@@ -0,0 +1,180 @@
+# -*- coding: utf-8 -*-
+#
+# inventory/common/api/tests/test_pagination.py
+#
+
+from datetime import timedelta
+
+from django.utils import timezone
+
+from rest_framework import status
+from rest_framework.reverse import reverse
+from rest_framework.test import APIRequestFactory
+from rest_framework.request import Request
+
+from dcolumn.dcolumns.models import ColumnCollection
+
+from inventory.categories.models import Category
+from inventory.common.api.tests.base_test import BaseTest
+from inventory.invoices.models import Item
+from inventory.regions.models import Subdivision
+
+from ..pagination import KeysetPagination
+
+
+class TestKeysetPagination(BaseTest):
+
+    def __init__(self, name):
+        super(TestKeysetPagination, self).__init__(name)
+
+    def setUp(self):
+        super(TestKeysetPagination, self).setUp()
+        self.in_type = self._create_inventory_type()
+        self.project = self._create_project(self.in_type, members=[self.user])
+
+    def _get_pages(self, uri, data, link='next'):
+        """
+        Follows the links from the first page, returns a list of the pages'
+        results.
+        """
+        pages = []
+        response = self.client.get(uri, data=data, format='json',
+                                   **self._HEADERS)
+
+        while True:
+            msg = "Response: {} should be {}, content: {}".format(
+                response.status_code, status.HTTP_200_OK, response.data)
+            self.assertEqual(response.status_code, status.HTTP_200_OK, msg)
+            self.assertFalse('count' in response.data, msg)
+            pages.append(response.data['results'])
+
+            if not response.data[link]:
+                break
+
+            # A cursor that does not advance would follow links forever.
+            self.assertLess(len(pages), 20, "pages: {}".format(pages))
+
+            response = self.client.get(response.data[link], format='json',
+                                       **self._HEADERS)
+
+        return pages, response
+
+    def test_get_ordering(self):
+        #self.skipTest("Temporarily skipped")
+        paginator = KeysetPagination()
+        ordering = paginator.get_ordering(Item.objects.all())
+        msg = "ordering: {}".format(ordering)
+        self.assertEqual(ordering, ['project__name', 'sku', 'pk'], msg)
+        # A relation is ordered on the related model's ordering.
+        ordering = paginator.get_ordering(Subdivision.objects.all())
+        msg = "ordering: {}".format(ordering)
+        self.assertEqual(ordering, ['country__country', 'subdivision_name',
+                                    'pk'], msg)
+        ordering = paginator.get_ordering(
+            Subdivision.objects.order_by('-country', 'id'))
+        msg = "ordering: {}".format(ordering)
+        self.assertEqual(ordering, ['-country__country', 'id'], msg)
+
+    def test_keyset_pages(self):
+        #self.skipTest("Temporarily skipped")
+        names = ["Test Category {}".format(idx) for idx in range(7)]
+
+        for name in reversed(names):
+            self._create_category(self.project, name)
+
+        uri = reverse('category-list')
+        pages, response = self._get_pages(
+            uri, {'cursor': '', 'page_size': 3})
+        found = [[item['name'] for item in page] for page in pages]
+        msg = "pages: {}".format(found)
+        self.assertEqual(found, [names[0:3], names[3:6], names[6:]], msg)
+        # Follow the previous links back to the first page.
+        pages, response = self._get_pages(
+            response.data['previous'], {}, link='previous')
+        found = [[item['name'] for item in page] for page in pages]
+        msg = "pages: {}".format(found)
+        self.assertEqual(found, [names[3:6], names[0:3]], msg)
+        self.assertTrue(response.data['next'], msg)
+
+    def test_keyset_relation_ordering(self):
+        #self.skipTest("Temporarily skipped")
+        project_1 = self._create_project(
+            self.in_type, name="A Test Project", members=[self.user])
+        collection = ColumnCollection(
+            name="Test Collection", related_model='item', creator=self.user,
+            updater=self.user)
+        collection.save()
+
+        for project in (self.project, project_1):
+            for idx in range(3):
+                self._create_item(project, collection, "NE{}".format(idx))
+
+        expected = [item.public_id for item in Item.objects.all()]
+        uri = reverse('item-list')
+        pages, response = self._get_pages(
+            uri, {'cursor': '', 'page_size': 2})
+        found = [item['public_id'] for page in pages for item in page]
+        msg = "found: {}, expected: {}".format(found, expected)
+        self.assertEqual(len(pages), 3, msg)
+        self.assertEqual(found, expected, msg)
+
+    def test_invalid_cursor(self):
+        #self.skipTest("Temporarily skipped")
+        uri = reverse('category-list')
+        response = self.client.get(uri, data={'cursor': 'invalid'},
+                                   format='json', **self._HEADERS)
+        msg = "Response: {} should be {}, content: {}".format(
+            response.status_code, status.HTTP_404_NOT_FOUND, response.data)
+        self.assertEqual(
+            response.status_code, status.HTTP_404_NOT_FOUND, msg)
+
+    def test_nulls(self):
+        #self.skipTest("Temporarily skipped")
+        collection = ColumnCollection(
+            name="Test Collection", related_model='item', creator=self.user,
+            updater=self.user)
+        collection.save()
+
+        for number in (None, "NE555", None, "LM311", None):
+            Item(project=self.project, column_collection=collection,
+                 item_number=number, creator=self.user,
+                 updater=self.user).save()
+
+        queryset = Item.objects.order_by('item_number')
+        expected = list(queryset.values_list('pk', flat=True))
+        request = Request(APIRequestFactory().get('/', {'page_size': 2}))
+        found = []
+
+        while True:
+            paginator = KeysetPagination()
+            results = paginator.paginate_queryset(queryset, request)
+            found.extend(obj.pk for obj in results)
+            link = paginator.get_next_link(results)
+
+            if not link:
+                break
+
+            request = Request(APIRequestFactory().get(link))
+
+        msg = "found: {}, expected: {}".format(found, expected)
+        self.assertEqual(found, expected, msg)
+
+    def test_same_updated_microseconds(self):
+        """
+        Test that the pages of rows sharing an `updated` with microseconds,
+        as the bulk updates write them, do not repeat.
+        """
+        #self.skipTest("Temporarily skipped")
+        names = ["Test Category {}".format(idx) for idx in range(5)]
+
+        for name in names:
+            self._create_category(self.project, name)
+
+        updated = (timezone.now() - timedelta(days=1)).replace(
+            microsecond=123456)
+        Category.objects.update(updated=updated)
+        uri = reverse('category-delta')
+        pages, response = self._get_pages(uri, {'page_size': 2})
+        found = [[item['name'] for item in page] for page in pages]
+        msg = "pages: {}".format(found)
+        self.assertEqual(found, [names[0:2], names[2:4], names[4:]], msg)
@@ -5,9 +5,14 @@
 
 from rest_framework import status
 from rest_framework.reverse import reverse
+from rest_framework.request import Request
 from rest_framework.test import APIRequestFactory, force_authenticate
 
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
 
 from inventory.accounts.api.views import user_list
 from inventory.categories.api.views import category_detail
@@ -19,7 +24,7 @@ from inventory.projects.models import Membership
 from ..permissions import (
     IsAdminSuperUser, IsAdministrator, IsDefaultUser, IsAnyUser, IsReadOnly,
     IsProjectOwner, IsProjectManager, IsProjectDefaultUser, IsAnyProjectUser,
-    IsUserActive, CanDelete, IsPostOnly)
+    IsUserActive, CanDelete, IsPostOnly, get_membership_map)
 
 UserModel = get_user_model()
 
@@ -482,6 +487,113 @@ class TestPermissions(BaseTest):
     # Miscellaneous level roles
     #
 
+    def test_get_membership_map(self):
+        """
+        Test that the memberships are read once per DRF request.
+        """
+        #self.skipTest("Temporarily skipped")
+        in_type = self._create_inventory_type()
+        kwargs = {'username': 'Test_get_membership_map',
+                  'password': '1234567890',
+                  'email': 'test@example.org',
+                  'is_superuser': False,
+                  'role': UserModel.DEFAULT_USER}
+        user, client = self._create_user(**kwargs)
+        project = self._create_project(in_type, members=[user])
+        project_1 = self._create_project(in_type, name="Test Project 1")
+        project.set_role(user, Membership.PROJECT_MANAGER)
+        category = self._create_category(project, "Test Category")
+        category_1 = self._create_category(project_1, "Test Category 1")
+        factory = APIRequestFactory()
+        request = factory.get('category-list')
+        force_authenticate(request, user=user)
+        request = Request(request)
+        request.user # Authenticate before counting the queries.
+        auths = (IsProjectOwner(), IsProjectManager(), IsProjectDefaultUser(),
+                 IsAnyProjectUser())
+
+        with self.assertNumQueries(1):
+            found = [auth.has_permission(request, category_detail)
+                     for auth in auths]
+            found += [auth.has_object_permission(request, category_detail,
+                                                 obj)
+                      for auth in auths for obj in (project, category,
+                                                    category_1)]
+
+        expected = [False, True, False, True]
+        expected += [False, False, False, True, True, False, False, False,
+                     False, True, True, False]
+        msg = "found: {}, expected: {}".format(found, expected)
+        self.assertEqual(found, expected, msg)
+        memberships = get_membership_map(request)
+        msg = "memberships: {}".format(memberships)
+        self.assertEqual(
+            memberships, {project.pk: Membership.PROJECT_MANAGER}, msg)
+
+    def test_project_permission_query_budget(self):
+        """
+        Test that the number of queries for a detail GET does not depend on
+        the number of project permissions checked.
+        """
+        #self.skipTest("Temporarily skipped")
+        in_type = self._create_inventory_type()
+        kwargs = {'username': 'Test_query_budget',
+                  'password': '1234567890',
+                  'email': 'test@example.org',
+                  'is_superuser': False,
+                  'role': UserModel.DEFAULT_USER}
+        user, client = self._create_user(**kwargs)
+        project = self._create_project(in_type, members=[user])
+        category = self._create_category(project, "Test Category")
+        uri = reverse('category-detail',
+                      kwargs={'public_id': category.public_id})
+
+        # The memberships, the category with its project, and the creator
+        # and updater.
+        with self.assertNumQueries(4):
+            response = client.get(uri, format='json', **self._HEADERS)
+
+        msg = "Response: {} should be {}, content: {}".format(
+            response.status_code, status.HTTP_200_OK, response.data)
+        self.assertEqual(response.status_code, status.HTTP_200_OK, msg)
+
+    @override_settings(CACHES={'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+    def test_get_project_ids_cached(self):
+        """
+        Test that a list request with warm project roles does not read the
+        membership table.
+        """
+        #self.skipTest("Temporarily skipped")
+        cache.clear()
+        in_type = self._create_inventory_type()
+        kwargs = {'username': 'Test_get_project_ids',
+                  'password': '1234567890',
+                  'email': 'test@example.org',
+                  'is_superuser': False,
+                  'role': UserModel.DEFAULT_USER}
+        user, client = self._create_user(**kwargs)
+        project = self._create_project(in_type, members=[user])
+        project_1 = self._create_project(in_type, name="Test Project 1")
+        category = self._create_category(project, "Test Category")
+        self._create_category(project_1, "Test Category 1")
+        uri = reverse('category-list')
+        client.get(uri, format='json', **self._HEADERS)
+
+        with CaptureQueriesContext(connection) as context:
+            response = client.get(uri, format='json', **self._HEADERS)
+
+        msg = "Response: {} should be {}, content: {}".format(
+            response.status_code, status.HTTP_200_OK, response.data)
+        self.assertEqual(response.status_code, status.HTTP_200_OK, msg)
+        found = [item['public_id'] for item in response.data['results']]
+        msg = "found: {}".format(found)
+        self.assertEqual(found, [category.public_id], msg)
+        queries = [query['sql'] for query in context.captured_queries]
+        msg = "queries: {}".format(queries)
+        self.assertFalse(any('projects_membership' in sql
+                             for sql in queries), msg)
+
     def test_IsReadOnly(self):
         """
         Test that the access is read only.
@@ -4,12 +4,32 @@
 #
 
 import logging
+import hashlib
+import calendar
+from datetime import datetime, timedelta
+from dateutil.tz import tzutc
 
+from django.contrib.auth import get_user_model
 from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db.models import Count, Max
+from django.utils import timezone
+from django.utils.cache import get_conditional_response
+from django.utils.dateparse import parse_datetime
+from django.utils.http import http_date
+from django.utils.translation import ugettext_lazy as _
 
+from rest_framework import status
+from rest_framework.exceptions import APIException
+from rest_framework.response import Response
 from rest_framework.serializers import ValidationError
 
+from inventory.projects.models import Tombstone
+
+from .pagination import KeysetPagination
+from .permissions import get_project_ids
+
 log = logging.getLogger('api.common.view_mixin')
+UserModel = get_user_model()
 
 
 class TrapDjangoValidationErrorCreateMixin(object):
@@ -28,3 +48,176 @@ class TrapDjangoValidationErrorUpdateMixin(object):
             instance = serializer.save()
         except DjangoValidationError as detail:
             raise ValidationError(detail.message_dict)
+
+
+class ConditionalGetMixin(object):
+    """
+    Adds the `ETag` and `Last-Modified` validators to the list and detail
+    responses and answers the conditional GETs with a 304 before anything
+    is serialized. A detail's validators come from the object's `updated`
+    field. A list's come from the `Max('updated')` and the count of the
+    filtered queryset, read with one query, so a deleted row changes the
+    `ETag`. It does not change the newest `updated`, so a list only answers
+    `If-None-Match`, `If-Modified-Since` alone always gets the list.
+    """
+    updated_field = 'updated'
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        values = queryset.order_by().aggregate(
+            updated=Max(self.updated_field), count=Count('pk'))
+        etag = self.get_etag(request, values['updated'], values['count'])
+        response = get_conditional_response(request, etag=etag)
+
+        if response is None:
+            response = super(ConditionalGetMixin, self).list(
+                request, *args, **kwargs)
+
+        return self._set_validators(response, etag, values['updated'])
+
+    def retrieve(self, request, *args, **kwargs):
+        instance = self.get_object()
+        updated = getattr(instance, self.updated_field)
+        etag = self.get_etag(request, updated, instance.pk)
+        response = get_conditional_response(
+            request, etag=etag, last_modified=self._get_timestamp(updated))
+
+        if response is None:
+            serializer = self.get_serializer(instance)
+            response = Response(serializer.data)
+
+        return self._set_validators(response, etag, updated)
+
+    def get_etag(self, request, updated, key):
+        """
+        Returns a quoted `ETag` for the `updated` value and the key, the
+        media type is included since each renderer returns a different
+        body for the same URL.
+        """
+        value = "{}:{}:{}".format(
+            getattr(request, 'accepted_media_type', ''),
+            updated.isoformat() if updated else '', key)
+        return '"{}"'.format(hashlib.md5(value.encode('utf-8')).hexdigest())
+
+    def _get_timestamp(self, updated):
+        timestamp = None
+
+        if updated is not None:
+            timestamp = calendar.timegm(updated.utctimetuple())
+
+        return timestamp
+
+    def _set_validators(self, response, etag, updated):
+        if 200 <= response.status_code < 300 or response.status_code == 304:
+            response['ETag'] = etag
+            timestamp = self._get_timestamp(updated)
+
+            if timestamp is not None:
+                response['Last-Modified'] = http_date(timestamp)
+
+        return response
+
+
+class ResyncRequired(APIException):
+    status_code = status.HTTP_410_GONE
+    default_detail = _("The sync token is older than the deleted records "
+                       "are kept, all the records must be fetched again.")
+    default_code = 'resync_required'
+
+
+class DeltaFeedMixin(object):
+    """
+    A list of the records changed since the client's last sync, for the
+    clients that keep a copy of a project. The `updated_since` parameter
+    takes the `token` returned by the previous sync, the records updated
+    at or after it are returned in keyset pages ordered by `updated`, and
+    the public ids of the records deleted since then, or no longer visible
+    to the user, are in `deleted` on the first page. Without
+    `updated_since` all the records are returned. A token older than the
+    tombstone retention gets a 410, the client must then sync without it.
+    The `project` parameter limits the feed to one project's public id.
+    """
+    updated_since_param = 'updated_since'
+    project_param = 'project'
+    project_field = 'project'
+    pagination_class = KeysetPagination
+    # The token is earlier than the request so the rows written by
+    # transactions that were still open are sent again on the next sync.
+    token_overlap = timedelta(minutes=1)
+
+    def list(self, request, *args, **kwargs):
+        token = datetime.now(tzutc()) - self.token_overlap
+        since = self.get_updated_since(request)
+        project = request.query_params.get(self.project_param)
+        queryset = self.filter_queryset(self.get_queryset())
+
+        if project:
+            queryset = queryset.filter(**{
+                "{}__public_id".format(self.project_field): project})
+
+        visible = queryset
+
+        if since is not None:
+            queryset = queryset.filter(updated__gte=since)
+
+        page = self.paginate_queryset(queryset.order_by('updated', 'pk'))
+        serializer = self.get_serializer(page, many=True)
+        response = self.get_paginated_response(serializer.data)
+        deleted = []
+
+        if since is not None and not request.query_params.get(
+            self.paginator.cursor_query_param):
+            deleted = self.get_deleted(request, queryset.model, since,
+                                       project, visible=visible)
+
+        response.data['token'] = token.isoformat()
+        response.data['deleted'] = deleted
+        return response
+
+    def get_updated_since(self, request):
+        value = request.query_params.get(self.updated_since_param)
+        since = None
+
+        if value:
+            try:
+                since = parse_datetime(value)
+            except ValueError:
+                pass
+
+            if since is None:
+                msg = _("Invalid {}, it must be an ISO 8601 date and "
+                        "time.").format(self.updated_since_param)
+                raise ValidationError({self.updated_since_param: [msg]})
+
+            if timezone.is_naive(since):
+                since = timezone.make_aware(since, timezone.utc)
+
+            if since < Tombstone.objects.get_horizon():
+                raise ResyncRequired()
+
+        return since
+
+    def get_deleted(self, request, model, since, project=None,
+                    visible=None):
+        """
+        Returns a list of the public ids of the records of `model` deleted
+        at or after `since` in the user's projects. The records still in
+        the `visible` queryset, ex. an item removed from one of the user's
+        projects but still in another, are left out.
+        """
+        user = request.user
+        project_ids = None
+
+        if not (user.is_superuser or user.role == UserModel.ADMINISTRATOR):
+            project_ids = get_project_ids(request)
+
+        queryset = Tombstone.objects.get_deleted(model, since, project_ids)
+
+        if project:
+            queryset = queryset.filter(project__public_id=project)
+
+        if visible is not None:
+            queryset = queryset.exclude(public_id__in=visible.order_by(
+                ).values('public_id'))
+
+        return list(queryset.values_list('public_id', flat=True))
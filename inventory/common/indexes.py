@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+#
+# inventory/common/indexes.py
+#
+
+"""
+Index classes used in Django model `Meta.indexes` that the stock `Index`
+cannot express. They are created by the migrations like any other index.
+"""
+__docformat__ = "restructuredtext en"
+
+from django.db.models import Index
+
+
+class IfNotExistsIndex(Index):
+    """
+    An index that is only created if an index of the same name does not
+    exist, so the indexes made by hand or by earlier releases are kept.
+    PostgreSQL allows 63 character names, SQLite has no limit.
+    """
+    sql_create_index = ("CREATE INDEX IF NOT EXISTS %(name)s ON "
+                        "%(table)s%(using)s (%(columns)s)%(extra)s")
+    max_name_length = 63
+
+    def create_sql(self, model, schema_editor, using=''):
+        return self.sql_create_index % self.get_sql_create_template_values(
+            model, schema_editor, using)
+
+
+class GinIndex(IfNotExistsIndex):
+    """
+    A GIN index on PostgreSQL, every column uses the `opclass` operator
+    class if one is given, ex. `gin_trgm_ops` for the trigram indexes. The
+    extension of the operator class is created first. Other databases get
+    a plain index with the same name.
+    """
+    suffix = 'gin'
+    EXTENSIONS = {'gin_trgm_ops': 'pg_trgm'}
+
+    def __init__(self, fields=[], name=None, opclass=''):
+        self.opclass = opclass
+        super(GinIndex, self).__init__(fields, name)
+
+    def deconstruct(self):
+        path, args, kwargs = super(GinIndex, self).deconstruct()
+
+        if self.opclass:
+            kwargs['opclass'] = self.opclass
+
+        return path, args, kwargs
+
+    def create_sql(self, model, schema_editor, using=''):
+        if schema_editor.connection.vendor != 'postgresql':
+            return super(GinIndex, self).create_sql(model, schema_editor)
+
+        values = self.get_sql_create_template_values(
+            model, schema_editor, ' USING gin')
+        sql = []
+
+        if self.opclass:
+            values['columns'] = ", ".join([
+                "{} {}".format(schema_editor.quote_name(
+                    model._meta.get_field(field).column), self.opclass)
+                for field, order in self.fields_orders])
+
+            if self.opclass in self.EXTENSIONS:
+                sql.append("CREATE EXTENSION IF NOT EXISTS {}".format(
+                    self.EXTENSIONS[self.opclass]))
+
+        sql.append(self.sql_create_index % values)
+        return "; ".join(sql)
+
+
+class ParentTableIndex(IfNotExistsIndex):
+    """
+    An index on the fields a multi-table inherited model gets from its
+    parent, which is created on the parent's table. Used when the parent
+    model is in another app and its `Meta` cannot be changed.
+    """
+
+    def _get_parent(self, model):
+        return model._meta.get_field(self.fields_orders[0][0]).model
+
+    def get_sql_create_template_values(self, model, schema_editor, using):
+        return super(ParentTableIndex, self).get_sql_create_template_values(
+            self._get_parent(model), schema_editor, using)
+
+    def remove_sql(self, model, schema_editor):
+        return super(ParentTableIndex, self).remove_sql(
+            self._get_parent(model), schema_editor)
@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+#
+# inventory/common/key_allocator.py
+#
+
+"""
+Allocates blocks of keys that do not collide with the database.
+"""
+__docformat__ = "restructuredtext en"
+
+import logging
+
+from django.utils.translation import ugettext, ugettext_lazy as _
+
+log = logging.getLogger('inventory.common.key-allocator')
+
+
+class KeyBlockAllocator(object):
+    """
+    Pre-generates blocks of keys for the bulk create paths. Each block is
+    checked against the database with a single query, the keys that already
+    exist or are duplicates of the keys still in the pool are dropped and
+    counted as collisions. The keys handed out must be saved before the next
+    call to `allocate` so they are seen by the database check.
+    """
+    _ERROR_MSGS = {
+        'exhausted': _("Could not allocate {} unique keys for '{}' after {} "
+                       "attempts, collisions: {}."),
+        }
+    BLOCK_SIZE = 1000
+    MAX_ATTEMPTS = 10
+
+    def __init__(self, queryset, field, generator, block_size=BLOCK_SIZE,
+                 max_attempts=MAX_ATTEMPTS):
+        """
+        @param queryset: The queryset the keys must be unique in, ex.
+                         `Item.objects.filter(project=project)` for SKUs.
+        @param field: The name of the field that holds the keys.
+        @param generator: A callable that takes a count and returns a list of
+                          that many new keys.
+        @param block_size: The minimum number of keys generated at a time.
+        @param max_attempts: The number of blocks to try before giving up.
+        """
+        self._queryset = queryset
+        self._field = field
+        self._generator = generator
+        self._block_size = block_size
+        self._max_attempts = max_attempts
+        self._pool = []
+        self.generated = 0
+        self.collisions = 0
+
+    def allocate(self, count):
+        """
+        Returns a list of `count` unique keys.
+        """
+        attempts = 0
+
+        while len(self._pool) < count:
+            if attempts >= self._max_attempts:
+                msg = self._ERROR_MSGS.get('exhausted').format(
+                    count, self._field, attempts, self.collisions)
+                log.error(ugettext(msg))
+                raise ValueError(msg)
+
+            self._fill(max(count - len(self._pool), self._block_size))
+            attempts += 1
+
+        keys, self._pool[:] = self._pool[:count], self._pool[count:]
+        return keys
+
+    def _fill(self, count):
+        keys = self._generator(count)
+        self.generated += len(keys)
+        candidates = set(keys) - set(self._pool)
+        existing = set(self._queryset.filter(**{
+            "{}__in".format(self._field): candidates}).values_list(
+            self._field, flat=True))
+        candidates -= existing
+        self.collisions += len(keys) - len(candidates)
+        self._pool.extend(candidates)
+
+    @property
+    def collision_rate(self):
+        """
+        The fraction of the generated keys that were dropped.
+        """
+        rate = 0.0
+
+        if self.generated:
+            rate = float(self.collisions) / self.generated
+
+        return rate
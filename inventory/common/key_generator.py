@@ -8,6 +8,7 @@ Generates keys used throughout the system.
 """
 __docformat__ = "restructuredtext en"
 
+import os
 import logging
 import random
 from string import ascii_lowercase, ascii_uppercase, digits
@@ -24,9 +25,18 @@ class KeyGenerator(object):
     """
     _ERROR_MSGS = {
         'invalid_length': _("Invalid key length value."),
+        'invalid_domain': _("Invalid key domain, it must be from 1 to 256 "
+                            "ASCII characters."),
         }
     _UNKNOWN_MSG = _("Unknown")
     _KEY_DOMAIN = ascii_lowercase + ascii_uppercase + digits
+    # Byte translation tables keyed by domain, used by generate_many.
+    _TABLE_CACHE = {}
+
+    try:
+        _SYSTEM_RANDOM = random.SystemRandom()
+    except NotImplementedError: # pragma: no cover
+        _SYSTEM_RANDOM = None # pragma: no cover
 
     def __init__(self, length):
         """
@@ -41,9 +51,9 @@ class KeyGenerator(object):
         Try to access the system random number generator if exists else
         return the pseudo random number generator.
         """
-        try:
-            rand = random.SystemRandom()
-        except NotImplementedError: # pragma: no cover
+        rand = self._SYSTEM_RANDOM
+
+        if rand is None: # pragma: no cover
             log.warn("Using the pseudo number generator.") # pragma: no cover
             rand = random # pragma: no cover
 
@@ -60,20 +70,64 @@ class KeyGenerator(object):
             else:
                 self._length = length
 
-            if not isinstance(length, six.integer_types):
-                msg = self._ERROR_MSGS.get('invalid_length', self._UNKNOWN_MSG)
-                log.error(ugettext(msg))
-                raise ValueError(msg)
+            self._check_length(length)
+            self.__key = ''.join(self._generator.choice(domain)
+                                 for i in range(length))
+
+        return self.__key
 
-            if length <= 0:
-                msg = self._ERROR_MSGS.get('invalid_length', self._UNKNOWN_MSG)
+    def generate_many(self, count, length=0, domain=_KEY_DOMAIN):
+        """
+        Generates a list of `count` keys of the given length from a single
+        `os.urandom` read. The random bytes are mapped into the domain with a
+        translation table, the bytes that would bias the result are deleted
+        in the same pass. This does not change the key returned by
+        `generate`.
+        """
+        length = length or self._length
+        self._check_length(length)
+        table, delete, limit = self._get_table(domain)
+        needed = count * length
+        chars = b''
+
+        while len(chars) < needed:
+            # Read enough to cover the deleted bytes on average.
+            size = (needed - len(chars)) * 256 // limit + 16
+            chars += os.urandom(size).translate(table, delete)
+
+        chars = chars[:needed].decode('ascii')
+        return [chars[i:i + length] for i in range(0, needed, length)]
+
+    def _check_length(self, length):
+        if not isinstance(length, six.integer_types) or length <= 0:
+            msg = self._ERROR_MSGS.get('invalid_length', self._UNKNOWN_MSG)
+            log.error(ugettext(msg))
+            raise ValueError(msg)
+
+    def _get_table(self, domain):
+        result = self._TABLE_CACHE.get(domain)
+
+        if result is None:
+            try:
+                chars = bytearray(domain.encode('ascii'))
+            except UnicodeError:
+                chars = None
+
+            if not chars or len(chars) > 256:
+                msg = self._ERROR_MSGS.get('invalid_domain',
+                                           self._UNKNOWN_MSG)
                 log.error(ugettext(msg))
                 raise ValueError(msg)
 
-            self.__key = ''.join(self._generator.choice(domain)
-                                 for i in range(length))
+            size = len(chars)
+            # Only use the bytes below the largest multiple of the domain
+            # size so every character is equally likely.
+            limit = 256 - 256 % size
+            table = bytes(bytearray(chars[b % size] for b in range(256)))
+            delete = bytes(bytearray(range(limit, 256)))
+            result = self._TABLE_CACHE[domain] = (table, delete, limit)
 
-        return self.__key
+        return result
 
     @property
     def length(self):
@@ -0,0 +1,29 @@
+# -*- coding: utf-8 -*-
+#
+# inventory/common/middleware.py
+#
+"""
+Middleware.
+"""
+__docformat__ = "restructuredtext en"
+
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.utils.deprecation import MiddlewareMixin
+
+
+class AuthorizationCacheMiddleware(MiddlewareMixin):
+    """
+    The site cache keys the pages on the URL and the `Vary` headers, so a
+    page read with an `Authorization` header, ex. an API token, could be
+    served to other clients or after the token is revoked. The responses
+    vary on the header and the ones to requests that send it are not
+    cached. This must come right after `UpdateCacheMiddleware`.
+    """
+
+    def process_response(self, request, response):
+        patch_vary_headers(response, ('Authorization',))
+
+        if 'HTTP_AUTHORIZATION' in request.META:
+            patch_cache_control(response, private=True, max_age=0)
+
+        return response
@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+#
+# inventory/common/relations.py
+#
+"""
+Set based synchronization of many to many relations.
+"""
+__docformat__ = "restructuredtext en"
+
+
+def sync_relation(through, source_field, source_pk, target_field, targets,
+                  **defaults):
+    """
+    Makes the rows in the `through` model for `source_pk` point to exactly
+    the `targets` provided. The current target pks are read with a single
+    `values_list` query, the unwanted rows are removed with a single delete,
+    and the missing rows are added with a single bulk insert.
+
+    @param through: The model joining the source and target models, this can
+                    be an auto created model (`Item.categories.through`) or
+                    an explicit one (`Membership`).
+    @param source_field: The name of the `through` foreign key to the source
+                         model, ex. 'item'.
+    @param source_pk: The primary key of the source object.
+    @param target_field: The name of the `through` foreign key to the target
+                         model, ex. 'category'.
+    @param targets: A list, tuple, or QuerySet of target model objects or
+                    their primary keys.
+    @param defaults: Any extra field values used on the new rows.
+    @return: A tuple of the set of added pks and the set of removed pks.
+    """
+    source_attr = "{}_id".format(source_field)
+    target_attr = "{}_id".format(target_field)
+    wanted_pks = set([getattr(obj, 'pk', obj) for obj in targets])
+    queryset = through.objects.filter(**{source_attr: source_pk})
+    old_pks = set(queryset.values_list(target_attr, flat=True))
+    rem_pks = old_pks - wanted_pks
+    add_pks = wanted_pks - old_pks
+
+    if rem_pks:
+        queryset.filter(**{"{}__in".format(target_attr): rem_pks}).delete()
+
+    if add_pks:
+        objs = []
+
+        for pk in sorted(add_pks):
+            kwargs = defaults.copy()
+            kwargs[source_attr] = source_pk
+            kwargs[target_attr] = pk
+            objs.append(through(**kwargs))
+
+        through.objects.bulk_create(objs)
+
+    return add_pks, rem_pks
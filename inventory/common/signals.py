@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+#
+# inventory/common/signals.py
+#
+"""
+Signals sent by the bulk update paths that bypass the model signals.
+"""
+__docformat__ = "restructuredtext en"
+
+import threading
+from contextlib import contextmanager
+
+from django.dispatch import Signal
+
+# Sent after a tree node was saved with a new path and the paths of all its
+# descendants were rewritten with a single update.
+child_paths_updated = Signal(providing_args=['instance'])
+# Sent before the records in `pks` are deleted in a `bulk_delete` block, so
+# the receivers can do at once what the per-row delete signals would do.
+pre_bulk_delete = Signal(providing_args=['pks'])
+
+_bulk = threading.local()
+
+
+@contextmanager
+def bulk_delete(model, pks=()):
+    """
+    Deletes the `model` records in `pks`, or the ones deleted with another
+    record, in bulk. `pre_bulk_delete` is sent first and the per-row delete
+    signal receivers skip the `model` records deleted in the block, see
+    `in_bulk_delete`.
+    """
+    labels = _get_bulk_labels()
+    label = model._meta.label_lower
+    nested = label in labels
+    pre_bulk_delete.send(sender=model, pks=pks)
+    labels.add(label)
+
+    try:
+        yield
+    finally:
+        if not nested:
+            labels.discard(label)
+
+
+def in_bulk_delete(model):
+    """
+    Returns `True` when the `model` records are being deleted in a
+    `bulk_delete` block.
+    """
+    return model._meta.label_lower in _get_bulk_labels()
+
+
+def _get_bulk_labels():
+    if not hasattr(_bulk, 'labels'):
+        _bulk.labels = set()
+
+    return _bulk.labels
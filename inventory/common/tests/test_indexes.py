@@ -0,0 +1,53 @@
+# -*- coding: utf-8 -*-
+#
+# inventory/common/tests/test_indexes.py
+#
+
+from django.db import connection
+
+from dcolumn.dcolumns.models import CollectionBase
+
+from inventory.invoices.models import Item, ItemSearchIndex
+
+from .base_tests import BaseTest
+from ..indexes import GinIndex
+
+
+class TestIndexes(BaseTest):
+
+    def __init__(self, name):
+        super(TestIndexes, self).__init__(name)
+
+    def _get_index_names(self, model):
+        with connection.cursor() as cursor:
+            constraints = connection.introspection.get_constraints(
+                cursor, model._meta.db_table)
+
+        return set(name for name, info in constraints.items()
+                   if info['index'])
+
+    def test_migrated_indexes(self):
+        """
+        Test that the migrations create the search indexes and the item
+        `updated` index on the parent table.
+        """
+        #self.skipTest("Temporarily skipped")
+        names = self._get_index_names(ItemSearchIndex)
+        expected = set(index.name for index in ItemSearchIndex._meta.indexes)
+        msg = "names: {}, expected: {}".format(names, expected)
+        self.assertTrue(expected.issubset(names), msg)
+        names = self._get_index_names(CollectionBase)
+        msg = "names: {}".format(names)
+        self.assertIn('dcolumns_collectionbase_updated_id', names, msg)
+        self.assertNotIn('dcolumns_collectionbase_updated_id',
+                         self._get_index_names(Item), msg)
+
+    def test_gin_index_deconstruct(self):
+        #self.skipTest("Temporarily skipped")
+        index = GinIndex(fields=['codes'], name='test_codes_trgm',
+                         opclass='gin_trgm_ops')
+        path, args, kwargs = index.deconstruct()
+        msg = "path: {}, kwargs: {}".format(path, kwargs)
+        self.assertEqual(path, 'inventory.common.indexes.GinIndex', msg)
+        self.assertEqual(kwargs['opclass'], 'gin_trgm_ops', msg)
+        self.assertEqual(index.clone(), index, msg)
@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+#
+# inventory/common/tests/test_key_allocator.py
+#
+
+from inventory.projects.models import Project
+
+from .base_tests import BaseTest
+from ..key_allocator import KeyBlockAllocator
+
+
+class TestKeyBlockAllocator(BaseTest):
+
+    def __init__(self, name):
+        super(TestKeyBlockAllocator, self).__init__(name)
+
+    def setUp(self):
+        super(TestKeyBlockAllocator, self).setUp()
+        self.inventory_type = self._create_inventory_type()
+        self.project = self._create_project(self.inventory_type)
+
+    def test_allocate(self):
+        #self.skipTest("Temporarily skipped")
+        existing = self.project.public_id
+        blocks = [[existing, 'A', 'A', 'B'], ['B', 'C', 'D', 'E']]
+        allocator = KeyBlockAllocator(
+            Project.objects.all(), 'public_id', lambda count: blocks.pop(0),
+            block_size=4)
+
+        with self.assertNumQueries(1):
+            keys = allocator.allocate(2)
+
+        msg = "keys: {}, collisions: {}".format(keys, allocator.collisions)
+        self.assertEqual(sorted(keys), ['A', 'B'], msg)
+        self.assertEqual(allocator.collisions, 2, msg)
+        # The keys handed out were not saved so 'B' is not a collision.
+        keys = allocator.allocate(4)
+        msg = "keys: {}, collisions: {}".format(keys, allocator.collisions)
+        self.assertEqual(sorted(keys), ['B', 'C', 'D', 'E'], msg)
+        self.assertEqual(allocator.generated, 8, msg)
+        self.assertEqual(allocator.collision_rate, 0.25, msg)
+
+    def test_allocate_exhausted(self):
+        #self.skipTest("Temporarily skipped")
+        existing = self.project.public_id
+        allocator = KeyBlockAllocator(
+            Project.objects.all(), 'public_id',
+            lambda count: [existing] * count, max_attempts=3)
+
+        with self.assertRaises(ValueError) as cm:
+            allocator.allocate(1)
+
+        msg = "Exception: {}".format(cm.exception)
+        self.assertTrue("after 3 attempts" in str(cm.exception), msg)
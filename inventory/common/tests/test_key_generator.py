@@ -84,3 +84,56 @@ class TestKeyGenerator(TestCase):
 
         with self.assertRaises(ValueError) as cm:
             key0 = kg.generate(-1)
+
+    def test_generate_many(self):
+        #self.skipTest("Temporarily skipped")
+        length = 18
+        count = 500
+        kg = KeyGenerator(length)
+        key = kg.generate()
+        keys = kg.generate_many(count)
+        msg = "Found {} keys, should be: {}".format(len(keys), count)
+        self.assertEqual(len(keys), count, msg)
+        sizes = set(len(k) for k in keys)
+        msg = "Found key lengths: {}, should be: {}".format(sizes, length)
+        self.assertEqual(sizes, {length}, msg)
+        msg = "Found {} unique keys, should be: {}".format(
+            len(set(keys)), count)
+        self.assertEqual(len(set(keys)), count, msg)
+        # The cached key is not changed.
+        msg = "Found key: {}, should be: {}".format(kg.generate(), key)
+        self.assertEqual(kg.generate(), key, msg)
+
+    def test_generate_many_domain(self):
+        #self.skipTest("Temporarily skipped")
+        kg = KeyGenerator(18)
+        keys = kg.generate_many(100, length=7, domain=string.digits)
+        invalid_chars = [c for c in ''.join(keys) if c not in string.digits]
+        msg = "Keys with characters '{}' are not in domain '{}'.".format(
+            invalid_chars, string.digits)
+        self.assertTrue(invalid_chars == [], msg)
+        sizes = set(len(k) for k in keys)
+        msg = "Found key lengths: {}, should be: {}".format(sizes, 7)
+        self.assertEqual(sizes, {7}, msg)
+        # Every character in the domain should be used.
+        found = set(''.join(kg.generate_many(100, domain='AB')))
+        msg = "Found characters: {}, should be: {}".format(found, {'A', 'B'})
+        self.assertEqual(found, {'A', 'B'}, msg)
+
+    def test_generate_many_invalid(self):
+        #self.skipTest("Temporarily skipped")
+        kg = KeyGenerator(0)
+
+        with self.assertRaises(ValueError) as cm:
+            kg.generate_many(10)
+
+        kg = KeyGenerator(18)
+
+        with self.assertRaises(ValueError) as cm:
+            kg.generate_many(10, domain='')
+
+        with self.assertRaises(ValueError) as cm:
+            kg.generate_many(10, domain=u'éè')
+
+        msg = "Found: {}, should be: []".format(kg.generate_many(0))
+        self.assertEqual(kg.generate_many(0), [], msg)
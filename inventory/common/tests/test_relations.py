@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+#
+# inventory/common/tests/test_relations.py
+#
+
+from django.contrib.auth import get_user_model
+
+from inventory.projects.models import Membership
+
+from .base_tests import BaseTest
+from ..relations import sync_relation
+
+UserModel = get_user_model()
+
+
+class TestRelations(BaseTest):
+
+    def __init__(self, name):
+        super(TestRelations, self).__init__(name)
+
+    def setUp(self):
+        super(TestRelations, self).setUp()
+        self.inventory_type = self._create_inventory_type()
+        self.project = self._create_project(self.inventory_type)
+        self.users = [self._create_user(
+            username="Test_User_{:02}".format(idx), is_superuser=False)
+                      for idx in range(3)]
+
+    def test_sync_relation(self):
+        #self.skipTest("Temporarily skipped")
+        # The project creator is already a member.
+        user_0, user_1, user_2 = self.users
+        added, removed = sync_relation(
+            Membership, 'project', self.project.pk, 'user', [user_0, user_1],
+            role=Membership.PROJECT_MANAGER)
+        msg = "added: {}, removed: {}".format(added, removed)
+        self.assertEqual(added, set([user_0.pk, user_1.pk]), msg)
+        self.assertEqual(removed, set([self.user.pk]), msg)
+        self.assertEqual(self.project.get_role(user_0),
+                         Membership.PROJECT_MANAGER, msg)
+        # A mix of objects and pks, only the differences are written.
+        with self.assertNumQueries(3):
+            added, removed = sync_relation(
+                Membership, 'project', self.project.pk, 'user',
+                [user_1.pk, user_2])
+
+        msg = "added: {}, removed: {}".format(added, removed)
+        self.assertEqual(added, set([user_2.pk]), msg)
+        self.assertEqual(removed, set([user_0.pk]), msg)
+        members = sorted(self.project.members.values_list('pk', flat=True))
+        msg = "members: {}".format(members)
+        self.assertEqual(members, [user_1.pk, user_2.pk], msg)
+
+    def test_sync_relation_no_changes(self):
+        #self.skipTest("Temporarily skipped")
+        with self.assertNumQueries(1):
+            added, removed = sync_relation(
+                Membership, 'project', self.project.pk, 'user', [self.user])
+
+        msg = "added: {}, removed: {}".format(added, removed)
+        self.assertEqual(added, set(), msg)
+        self.assertEqual(removed, set(), msg)
@@ -7,6 +7,10 @@ Invoice, InvoiceItem and Item serializers.
 """
 __docformat__ = "restructuredtext en"
 
+import io
+
+from django.utils.translation import ugettext_lazy as _
+
 from rest_framework import serializers
 
 from inventory.categories.models import Category
@@ -18,7 +22,8 @@ from inventory.projects.models import Project
 from inventory.regions.models import Currency
 from inventory.suppliers.models import Supplier
 
-from ..models import Condition, Item, Invoice, InvoiceItem
+from ..importer import ItemImporter
+from ..models import Condition, Item, Invoice, InvoiceItem, InvoiceSpend
 
 
 #
@@ -192,6 +197,11 @@ class InvoiceSerializer(SerializerMixin, serializers.ModelSerializer):
         view_name='supplier-detail', default=None,
         queryset=Supplier.objects.all(), lookup_field='public_id')
     invoice_items = InvoiceItemSerializer(many=True, read_only=True)
+    item_count = serializers.IntegerField(read_only=True)
+    subtotal = serializers.DecimalField(
+        max_digits=20, decimal_places=4, read_only=True)
+    total = serializers.DecimalField(
+        max_digits=20, decimal_places=4, read_only=True)
     href = serializers.HyperlinkedIdentityField(
         view_name='invoice-detail', lookup_field='public_id')
 
@@ -204,7 +214,7 @@ class InvoiceSerializer(SerializerMixin, serializers.ModelSerializer):
         validated_data['updater'] = user
         obj = Invoice(**validated_data)
         obj.save()
-        return obj
+        return self._get_with_totals(obj)
 
     def update(self, instance, validated_data):
         instance.project = validated_data.get(
@@ -229,13 +239,152 @@ class InvoiceSerializer(SerializerMixin, serializers.ModelSerializer):
             'notes', instance.notes)
         instance.updater = self.get_user_object()
         instance.save()
-        return instance
+        return self._get_with_totals(instance)
+
+    def _get_with_totals(self, obj):
+        # The totals are database annotations, they are read back after
+        # a save.
+        return Invoice.objects.annotate_totals().get(pk=obj.pk)
 
     class Meta:
         model = Invoice
         fields = ('public_id', 'project', 'project_public_id', 'currency',
                   'supplier', 'invoice_number', 'invoice_date', 'credit',
                   'shipping', 'other', 'tax', 'notes', 'invoice_items',
-                  'creator', 'created', 'updater', 'updated', 'href',)
-        read_only_fields = ('public_id', 'creator', 'created', 'updater',
-                            'updated',)
+                  'item_count', 'subtotal', 'total', 'creator', 'created',
+                  'updater', 'updated', 'href',)
+        read_only_fields = ('public_id', 'item_count', 'subtotal', 'total',
+                            'creator', 'created', 'updater', 'updated',)
+
+
+#
+# InvoiceBulkSerializer
+#
+class InvoiceLineSerializer(serializers.Serializer):
+    """
+    One invoice item of a bulk invoice, only validated in Python.
+    """
+    item_number = serializers.CharField(max_length=50)
+    description = serializers.CharField(
+        max_length=200, required=False, allow_blank=True, allow_null=True)
+    quantity = serializers.IntegerField(min_value=0, default=0)
+    unit_price = serializers.DecimalField(max_digits=10, decimal_places=4)
+    process = serializers.BooleanField(default=InvoiceItem.YES)
+
+
+class InvoiceBulkSerializer(SerializerMixin, serializers.ModelSerializer):
+    """
+    Invoice Bulk Serializer, an invoice with all its invoice items.
+    """
+    project = serializers.HyperlinkedRelatedField(
+        view_name='project-detail', queryset=Project.objects.all(),
+        lookup_field='public_id')
+    currency = serializers.HyperlinkedRelatedField(
+        view_name='currency-detail', queryset=Currency.objects.all())
+    supplier = serializers.HyperlinkedRelatedField(
+        view_name='supplier-detail', queryset=Supplier.objects.all(),
+        lookup_field='public_id')
+    invoice_items = InvoiceLineSerializer(many=True)
+
+    def validate_project(self, value):
+        if not value.has_authority(self.get_user_object()):
+            msg = _("The user must have authority on the '{}' project."
+                    ).format(value)
+            raise serializers.ValidationError(msg)
+
+        return value
+
+    def create(self, validated_data):
+        lines = validated_data.pop('invoice_items')
+        return Invoice.objects.bulk_create_invoice(
+            self.get_user_object(), lines, **validated_data)
+
+    class Meta:
+        model = Invoice
+        fields = ('project', 'currency', 'supplier', 'invoice_number',
+                  'invoice_date', 'credit', 'shipping', 'other', 'tax',
+                  'notes', 'invoice_items',)
+
+
+#
+# InvoiceSpendSerializer
+#
+class InvoiceSpendSerializer(SerializerMixin, serializers.ModelSerializer):
+    """
+    Invoice Spend Serializer, a read only row of the spend report.
+    """
+    project = serializers.HyperlinkedRelatedField(
+        view_name='project-detail', read_only=True, lookup_field='public_id')
+    project_public_id = serializers.CharField(
+        source='project.public_id', read_only=True)
+    supplier = serializers.HyperlinkedRelatedField(
+        view_name='supplier-detail', read_only=True, lookup_field='public_id')
+    supplier_name = serializers.CharField(
+        source='supplier.name', read_only=True)
+    currency = serializers.HyperlinkedRelatedField(
+        view_name='currency-detail', read_only=True)
+    currency_code = serializers.CharField(
+        source='currency.alphabetic_code', read_only=True)
+
+    class Meta:
+        model = InvoiceSpend
+        fields = ('project', 'project_public_id', 'supplier', 'supplier_name',
+                  'currency', 'currency_code', 'month', 'invoice_count',
+                  'item_count', 'subtotal', 'total',)
+        read_only_fields = fields
+
+
+#
+# ItemImportSerializer
+#
+class ItemImportSerializer(SerializerMixin, serializers.Serializer):
+    """
+    Item Import Serializer, the items are either in an uploaded CSV or JSON
+    `file` or in the `items` list.
+    """
+    project = serializers.CharField(max_length=30)
+    format = serializers.ChoiceField(
+        choices=ItemImporter.FORMATS, default=ItemImporter.CSV)
+    file = serializers.FileField(required=False)
+    items = serializers.ListField(
+        child=serializers.DictField(), required=False)
+
+    def validate_project(self, value):
+        try:
+            project = Project.objects.get(public_id=value)
+        except Project.DoesNotExist:
+            msg = _("A project with the {} '{}' does not exist.").format(
+                "public_id", value)
+            raise serializers.ValidationError(msg)
+
+        if not project.has_authority(self.get_user_object()):
+            msg = _("The user must have authority on the '{}' project."
+                    ).format(project)
+            raise serializers.ValidationError(msg)
+
+        return project
+
+    def validate(self, data):
+        if not (data.get('file') or data.get('items')):
+            msg = _("Either a file or a list of items must be provided.")
+            raise serializers.ValidationError(msg)
+
+        return data
+
+    def create(self, validated_data):
+        importer = ItemImporter(validated_data.get('project'),
+                                self.get_user_object())
+        upload = validated_data.get('file')
+
+        if upload:
+            stream = io.TextIOWrapper(upload.file, encoding='utf-8',
+                                      newline='')
+            rows = importer.read(stream, validated_data.get('format'))
+        else:
+            rows = (importer.split_values(row)
+                    for row in validated_data.get('items'))
+
+        return importer.run(rows)
+
+    class Meta:
+        fields = ('project', 'format', 'file', 'items',)
@@ -3,15 +3,25 @@
 # inventory/invoices/api/tests/test_invoices_api.py
 #
 
+from datetime import date, timedelta
+from decimal import Decimal
+
 from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
 
 from dcolumn.dcolumns.models import ColumnCollection
 
 from rest_framework.reverse import reverse
 from rest_framework import status
 
+from inventory.categories.models import Category
 from inventory.common.api.tests.base_test import BaseTest
 from inventory.invoices.models import Condition, Item, Invoice, InvoiceItem
+from inventory.locations.models import LocationFormat, LocationCode
+from inventory.projects.models import Tombstone
 
 UserModel = get_user_model()
 
@@ -146,6 +156,123 @@ class TestItemAPI(BaseTest):
                                                 default_user=False)
         self._test_project_users_with_valid_permissions(uri, method)
 
+    def _create_related_items(self, start, stop):
+        supplier = self._create_supplier(self.project)
+        category = self._create_category(self.project, "Test Category")
+        loc_fmt = LocationFormat.objects.filter(
+            location_set_name__project=self.project).exclude(
+            char_definition=LocationCode.ROOT_NAME).first()
+
+        if not loc_fmt:
+            loc_set_name = self._create_location_set_name(self.project)
+            loc_fmt = self._create_location_format(loc_set_name, 'A\\d\\d')
+
+        project = self._create_project(self.in_type, name="Test Project_1")
+
+        for idx in range(start, stop):
+            item = self._create_item(
+                self.project, self.collection, "NE{}".format(idx),
+                manufacturer=supplier)
+            code = self._create_location_code(
+                loc_fmt, "A{:02}".format(idx))
+            item.process_categories([category])
+            item.process_location_codes([code])
+            item.process_shared_projects([project])
+
+    def test_GET_item_list_query_count(self):
+        """
+        Test that the number of queries on the item_list endpoint does not
+        grow with the page size.
+        """
+        #self.skipTest("Temporarily skipped")
+        uri = reverse('item-list')
+        data = {'page_size': 200}
+        self._create_related_items(0, 2)
+
+        with CaptureQueriesContext(connection) as ctx_0:
+            response = self.client.get(uri, data=data, format='json',
+                                       **self._HEADERS)
+
+        msg = "Response: {} should be {}, content: {}".format(
+            response.status_code, status.HTTP_200_OK, response.data)
+        self.assertEqual(response.status_code, status.HTTP_200_OK, msg)
+        self.assertEqual(response.data['count'], 2, msg)
+        self._create_related_items(2, 20)
+
+        with CaptureQueriesContext(connection) as ctx_1:
+            response = self.client.get(uri, data=data, format='json',
+                                       **self._HEADERS)
+
+        msg = "Response: {} should be {}, content: {}".format(
+            response.status_code, status.HTTP_200_OK, response.data)
+        self.assertEqual(response.status_code, status.HTTP_200_OK, msg)
+        self.assertEqual(response.data['count'], 20, msg)
+        msg = "Queries with 2 items: {}, with 20 items: {}".format(
+            len(ctx_0), len(ctx_1))
+        self.assertEqual(len(ctx_0), len(ctx_1), msg)
+
+    def test_GET_item_list_search(self):
+        """
+        Test that the item_list endpoint filters and ranks the items with
+        the q parameter.
+        """
+        #self.skipTest("Temporarily skipped")
+        self._create_item(self.project, self.collection, "NE555",
+                          description="Timer, replaces the LM555")
+        self._create_item(self.project, self.collection, "LM555",
+                          description="Timer")
+        self._create_item(self.project, self.collection, "LM311",
+                          description="Comparator")
+        uri = reverse('item-list')
+        response = self.client.get(uri, data={'q': 'lm555'}, format='json',
+                                   **self._HEADERS)
+        msg = "Response: {} should be {}, content: {}".format(
+            response.status_code, status.HTTP_200_OK, response.data)
+        self.assertEqual(response.status_code, status.HTTP_200_OK, msg)
+        self.assertEqual([item['item_number'] for item in
+                          response.data['results']], ['LM555', 'NE555'], msg)
+        response = self.client.get(uri, data={'q': 'comparator'},
+                                   format='json', **self._HEADERS)
+        msg = "Response: {} should be {}, content: {}".format(
+            response.status_code, status.HTTP_200_OK, response.data)
+        self.assertEqual(response.status_code, status.HTTP_200_OK, msg)
+        self.assertEqual(response.data['count'], 1, msg)
+
+    def test_POST_item_import(self):
+        """
+        Test that the item_import endpoint creates items from a list and
+        from an uploaded file.
+        """
+        #self.skipTest("Temporarily skipped")
+        uri = reverse('item-import')
+        data = {}
+        data['project'] = self.project.public_id
+        data['items'] = [{'item_number': 'NE555', 'quantity': '5'},
+                         {'item_number': 'LM311', 'manufacturer': 'Bad'}]
+        response = self.client.post(uri, data=data, format='json',
+                                    **self._HEADERS)
+        msg = "Response: {} should be {}, content: {}".format(
+            response.status_code, status.HTTP_201_CREATED, response.data)
+        self.assertEqual(
+            response.status_code, status.HTTP_201_CREATED, msg)
+        self.assertEqual(response.data['created'], 1, msg)
+        self.assertEqual(list(response.data['errors']), [2], msg)
+        # Upload a CSV file.
+        upload = SimpleUploadedFile(
+            'items.csv', b"item_number,quantity\nUA1489,3\nUA1488,2\n")
+        data = {'project': self.project.public_id, 'format': 'csv',
+                'file': upload}
+        response = self.client.post(uri, data=data, format='multipart',
+                                    **self._HEADERS)
+        msg = "Response: {} should be {}, content: {}".format(
+            response.status_code, status.HTTP_201_CREATED, response.data)
+        self.assertEqual(
+            response.status_code, status.HTTP_201_CREATED, msg)
+        self.assertEqual(response.data['created'], 2, msg)
+        count = Item.objects.filter(project=self.project).count()
+        msg = "Found {} items, should be 3.".format(count)
+        self.assertEqual(count, 3, msg)
+
     def test_POST_item_list_with_invalid_permissions(self):
         """
         Test that a POST to item_list fails with invalid permissions.
@@ -234,6 +361,42 @@ class TestItemAPI(BaseTest):
         self._test_users_with_valid_permissions(uri, method)
         self._test_project_users_with_valid_permissions(uri, method)
 
+    def test_GET_item_detail_conditional_related_delete(self):
+        """
+        Test that deleting a category of an item changes the item's `ETag`,
+        the relation is deleted without saving the item.
+        """
+        #self.skipTest("Temporarily skipped")
+        item = self._create_item(self.project, self.collection, "NE555")
+        categories = [self._create_category(self.project, name)
+                      for name in ("Test Category 0", "Test Category 1")]
+        item.categories.add(*categories)
+        uri = reverse('item-detail', kwargs={'public_id': item.public_id})
+        response = self.client.get(uri, format='json', **self._HEADERS)
+        etag = response.get('ETag')
+        msg = "ETag: {}, content: {}".format(etag, response.data)
+        self.assertEqual(len(response.data['categories']), 2, msg)
+        categories[0].delete()
+        response = self.client.get(uri, format='json', HTTP_IF_NONE_MATCH=etag,
+                                   **self._HEADERS)
+        msg = "Response: {} should be {}, ETag: {}, old ETag: {}".format(
+            response.status_code, status.HTTP_200_OK, response.get('ETag'),
+            etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK, msg)
+        self.assertNotEqual(response.get('ETag'), etag, msg)
+        self.assertEqual(len(response.data['categories']), 1, msg)
+        # Test that a category deleted in bulk also changes the ETag.
+        etag = response.get('ETag')
+        Category.objects.delete_category_tree(self.project, categories[1])
+        response = self.client.get(uri, format='json', HTTP_IF_NONE_MATCH=etag,
+                                   **self._HEADERS)
+        msg = "Response: {} should be {}, ETag: {}, old ETag: {}".format(
+            response.status_code, status.HTTP_200_OK, response.get('ETag'),
+            etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK, msg)
+        self.assertNotEqual(response.get('ETag'), etag, msg)
+        self.assertEqual(response.data['categories'], [], msg)
+
     def test_PUT_item_detail_with_invalid_permissions(self):
         """
         Test that a PUT to item_detail fails with invalid permissions.
@@ -526,6 +689,84 @@ class TestItemAPI(BaseTest):
             })
 
 
+    def test_GET_item_delta(self):
+        """
+        Test that the item delta feed returns the changed and deleted items.
+        """
+        #self.skipTest("Temporarily skipped")
+        items = [self._create_item(self.project, self.collection,
+                                   "NE{}".format(idx)) for idx in range(3)]
+        Item.objects.filter(pk__in=[item.pk for item in items]).update(
+            updated=timezone.now() - timedelta(days=1))
+        since = (timezone.now() - timedelta(hours=1)).isoformat()
+        items[2].item_number = "LM311"
+        items[2].save()
+        public_id = items[0].public_id
+        items[0].delete()
+        uri = reverse('item-delta')
+        data = {'updated_since': since, 'project': self.project.public_id}
+        response = self.client.get(uri, data=data, format='json',
+                                   **self._HEADERS)
+        msg = "Response: {} should be {}, content: {}".format(
+            response.status_code, status.HTTP_200_OK, response.data)
+        self.assertEqual(response.status_code, status.HTTP_200_OK, msg)
+        found = [item['public_id'] for item in response.data['results']]
+        self.assertEqual(found, [items[2].public_id], msg)
+        self.assertEqual(response.data['deleted'], [public_id], msg)
+
+    def test_GET_item_delta_shared_project_removed(self):
+        """
+        Test that the item delta feed returns the items removed from a
+        shared project as deleted while they are not visible to the user.
+        """
+        #self.skipTest("Temporarily skipped")
+        (client, uri, project_0, item_0,
+         project_1, item_1) = self._create_shared_project_objects()
+        item_0.process_shared_projects([project_1])
+        uri = reverse('item-delta')
+        data = {'updated_since': (
+            timezone.now() - timedelta(hours=1)).isoformat()}
+        item_0.process_shared_projects([])
+        response = client.get(uri, data=data, format='json', **self._HEADERS)
+        msg = "Response: {} should be {}, content: {}".format(
+            response.status_code, status.HTTP_200_OK, response.data)
+        self.assertEqual(response.status_code, status.HTTP_200_OK, msg)
+        self.assertEqual(response.data['deleted'], [item_0.public_id], msg)
+        # Test that an item shared again is not deleted.
+        item_0.process_shared_projects([project_1])
+        response = client.get(uri, data=data, format='json', **self._HEADERS)
+        msg = "content: {}".format(response.data)
+        self.assertEqual(response.data['deleted'], [], msg)
+        # Test that the related managers also add the tombstones.
+        project_1.shared_items.clear()
+        response = client.get(uri, data=data, format='json', **self._HEADERS)
+        msg = "content: {}".format(response.data)
+        self.assertEqual(set(response.data['deleted']),
+                         set([item_0.public_id]), msg)
+
+    def test_GET_item_delta_expired_token(self):
+        """
+        Test that a token older than the tombstone retention gets a 410.
+        """
+        #self.skipTest("Temporarily skipped")
+        self._create_item(self.project, self.collection, "NE555")
+        uri = reverse('item-delta')
+        days = Tombstone.objects.RETENTION_DAYS + 1
+        data = {'updated_since': (
+            timezone.now() - timedelta(days=days)).isoformat()}
+        response = self.client.get(uri, data=data, format='json',
+                                   **self._HEADERS)
+        msg = "Response: {} should be {}, content: {}".format(
+            response.status_code, status.HTTP_410_GONE, response.data)
+        self.assertEqual(response.status_code, status.HTTP_410_GONE, msg)
+        self.assertTrue(self._has_error(response), msg)
+        # Test that the client can get all the items again.
+        response = self.client.get(uri, format='json', **self._HEADERS)
+        msg = "Response: {} should be {}, content: {}".format(
+            response.status_code, status.HTTP_200_OK, response.data)
+        self.assertEqual(response.status_code, status.HTTP_200_OK, msg)
+        self.assertEqual(len(response.data['results']), 1, msg)
+
 class TestInvoiceAPI(BaseTest):
 
     def __init__(self, name):
@@ -673,6 +914,106 @@ class TestInvoiceAPI(BaseTest):
         self._test_users_with_valid_permissions(uri, method)
         self._test_project_users_with_valid_permissions(uri, method)
 
+    def test_GET_invoice_totals(self):
+        """
+        Test that the invoice_list and invoice_detail endpoints return the
+        invoice totals.
+        """
+        #self.skipTest("Temporarily skipped")
+        ColumnCollection(name="Test Collection", related_model='item',
+                         creator=self.user, updater=self.user).save()
+        invoice = self._create_invoice(
+            self.project, self.currency, self.supplier, "TEST12345",
+            invoice_date=date(2017, 3, 5), tax=Decimal('1.00'))
+        self._create_invoice_item(invoice, "NE555", 10, Decimal('0.25'))
+        self._create_invoice_item(invoice, "LM311", 2, Decimal('1.10'))
+        uri = reverse('invoice-detail',
+                      kwargs={'public_id': invoice.public_id})
+        response = self.client.get(uri, format='json', **self._HEADERS)
+        msg = "Response: {} should be {}, content: {}".format(
+            response.status_code, status.HTTP_200_OK, response.data)
+        self.assertEqual(response.status_code, status.HTTP_200_OK, msg)
+        self.assertEqual(response.data['item_count'], 2, msg)
+        self.assertEqual(Decimal(response.data['subtotal']), Decimal('4.70'),
+                         msg)
+        self.assertEqual(Decimal(response.data['total']), Decimal('5.70'),
+                         msg)
+        uri = reverse('invoice-list')
+        response = self.client.get(uri, format='json', **self._HEADERS)
+        msg = "Response: {} should be {}, content: {}".format(
+            response.status_code, status.HTTP_200_OK, response.data)
+        self.assertEqual(response.status_code, status.HTTP_200_OK, msg)
+        self.assertEqual(Decimal(response.data['results'][0]['total']),
+                         Decimal('5.70'), msg)
+        # The spend report
+        uri = reverse('invoice-spend-list')
+        data = {'project': self.project.public_id, 'month': '2017-03-01'}
+        response = self.client.get(uri, data=data, format='json',
+                                   **self._HEADERS)
+        msg = "Response: {} should be {}, content: {}".format(
+            response.status_code, status.HTTP_200_OK, response.data)
+        self.assertEqual(response.status_code, status.HTTP_200_OK, msg)
+        self.assertEqual(response.data['count'], 1, msg)
+        row = response.data['results'][0]
+        self.assertEqual(row['supplier_name'], self.supplier.name, msg)
+        self.assertEqual(row['currency_code'], 'USD', msg)
+        self.assertEqual(row['invoice_count'], 1, msg)
+        self.assertEqual(Decimal(row['total']), Decimal('5.70'), msg)
+
+    def test_POST_invoice_bulk(self):
+        """
+        Test that the invoice_bulk endpoint creates an invoice with all its
+        invoice items.
+        """
+        #self.skipTest("Temporarily skipped")
+        ColumnCollection(name="Test Collection", related_model='item',
+                         creator=self.user, updater=self.user).save()
+        uri = reverse('invoice-bulk')
+        data = {}
+        data['project'] = self.project_uri
+        data['currency'] = self.cur_uri
+        data['supplier'] = self.sup_uri
+        data['invoice_number'] = "TEST12345"
+        data['invoice_date'] = '2017-03-05'
+        data['invoice_items'] = [
+            {'item_number': "NE{}".format(idx), 'quantity': 2,
+             'unit_price': '0.50'} for idx in range(20)]
+        response = self.client.post(uri, data=data, format='json',
+                                    **self._HEADERS)
+        msg = "Response: {} should be {}, content: {}".format(
+            response.status_code, status.HTTP_201_CREATED, response.data)
+        self.assertEqual(
+            response.status_code, status.HTTP_201_CREATED, msg)
+        self.assertEqual(response.data['item_count'], 20, msg)
+        self.assertEqual(Decimal(response.data['total']), Decimal('20'), msg)
+        self.assertEqual(len(response.data['invoice_items']), 20, msg)
+        count = Item.objects.filter(project=self.project).count()
+        msg = "Found {} items, should be 20.".format(count)
+        self.assertEqual(count, 20, msg)
+        # An invalid line
+        data['invoice_number'] = "TEST54321"
+        data['invoice_items'] = [{'item_number': "NE555", 'quantity': -1,
+                                  'unit_price': '0.50'}]
+        response = self.client.post(uri, data=data, format='json',
+                                    **self._HEADERS)
+        msg = "Response: {} should be {}, content: {}".format(
+            response.status_code, status.HTTP_400_BAD_REQUEST, response.data)
+        self.assertEqual(
+            response.status_code, status.HTTP_400_BAD_REQUEST, msg)
+        self.assertTrue('invoice_items' in response.data, msg)
+
+    def test_GET_invoice_spend_with_invalid_permissions(self):
+        """
+        Test the invoice_spend_list endpoint with no permissions.
+        """
+        #self.skipTest("Temporarily skipped")
+        method = 'get'
+        self._create_invoice(
+            self.project, self.currency, self.supplier, "TEST12345")
+        uri = reverse('invoice-spend-list')
+        self._test_users_with_invalid_permissions(uri, method)
+        self._test_project_users_with_invalid_permissions(uri, method)
+
     def test_PUT_invoice_detail_with_invalid_permissions(self):
         """
         Test that a PUT to invoice_detail fails with invalid permissions.
@@ -6,8 +6,9 @@
 from django.conf.urls import include, url
 
 from .views import (
-    condition_list, condition_detail, item_list, item_detail, invoice_list,
-    invoice_detail, invoice_item_list, invoice_item_detail)
+    condition_list, condition_detail, item_list, item_detail, item_import,
+    invoice_list, invoice_detail, invoice_item_list, invoice_item_detail,
+    invoice_bulk, invoice_spend_list, item_delta)
 
 
 urlpatterns = [
@@ -17,9 +18,13 @@ urlpatterns = [
     url(r'^invoice-items/$', invoice_item_list, name='invoice-item-list'),
     url(r'^invoice-items/(?P<public_id>\w+)/$', invoice_item_detail,
         name='invoice-item-detail'),
+    url(r'^invoice-bulk/$', invoice_bulk, name='invoice-bulk'),
+    url(r'^invoice-spend/$', invoice_spend_list, name='invoice-spend-list'),
     url(r'^invoices/$', invoice_list, name='invoice-list'),
     url(r'^invoices/(?P<public_id>\w+)/$', invoice_detail,
         name='invoice-detail'),
+    url(r'^item-delta/$', item_delta, name='item-delta'),
+    url(r'^item-import/$', item_import, name='item-import'),
     url(r'^items/$', item_list, name='item-list'),
     url(r'^items/(?P<public_id>\w+)/$', item_detail, name='item-detail'),
     ]
@@ -16,11 +16,15 @@ from django.utils.translation import ugettext_lazy as _
 from django_filters import filters, CharFilter, NumberFilter, DateFilter
 from django_filters.rest_framework import DjangoFilterBackend, FilterSet
 
-from rest_framework.filters import SearchFilter
+from rest_framework import status
+from rest_framework.filters import BaseFilterBackend, SearchFilter
 from rest_framework.generics import (
     ListAPIView, ListCreateAPIView, RetrieveAPIView,
-    RetrieveUpdateDestroyAPIView)
+    RetrieveUpdateDestroyAPIView, GenericAPIView)
+from rest_framework.mixins import CreateModelMixin
+from rest_framework.parsers import JSONParser, MultiPartParser, FormParser
 from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
 from rest_framework.serializers import ValidationError
 
 from rest_condition import C, And, Or, Not
@@ -28,16 +32,19 @@ from rest_condition import C, And, Or, Not
 from inventory.common.api.permissions import (
     IsAdminSuperUser, IsAdministrator, IsDefaultUser, IsAnyUser, IsReadOnly,
     IsProjectOwner, IsProjectManager, IsProjectDefaultUser, IsAnyProjectUser,
-    IsUserActive)
+    IsUserActive, get_project_ids)
 from inventory.common.api.pagination import SmallResultsSetPagination
 from inventory.common.api.view_mixins import (
-    TrapDjangoValidationErrorCreateMixin, TrapDjangoValidationErrorUpdateMixin)
+    TrapDjangoValidationErrorCreateMixin, TrapDjangoValidationErrorUpdateMixin,
+    ConditionalGetMixin, DeltaFeedMixin)
 
-from ..models import Condition, Item, Invoice, InvoiceItem
+from ..models import (
+    Condition, Item, ItemSearchIndex, Invoice, InvoiceItem, InvoiceSpend)
 
 from .serializers import (
     ConditionSerializer, ItemSerializer, InvoiceSerializer,
-    InvoiceItemSerializer)
+    InvoiceBulkSerializer, InvoiceItemSerializer, InvoiceSpendSerializer,
+    ItemImportSerializer)
 
 log = logging.getLogger('api.invoices.views')
 UserModel = get_user_model()
@@ -118,17 +125,22 @@ condition_detail = ConditionDetail.as_view()
 # Item
 #
 class ItemAuthorizationMixin(object):
+    # The ItemSerializer renders all these relations on every row, fetching
+    # them up front keeps the number of queries constant per page.
+    SELECT_RELATED = ('project', 'manufacturer', 'creator', 'updater',)
+    PREFETCH_RELATED = ('categories', 'location_codes', 'shared_projects',)
 
     def get_queryset(self):
         if (self.request.user.is_superuser or
             self.request.user.role == UserModel.ADMINISTRATOR):
             result = Item.objects.all()
         else:
-            projects = self.request.user.projects.all()
+            projects = get_project_ids(self.request)
             query = Q(project__in=projects) | Q(shared_projects__in=projects)
-            result = Item.objects.select_related('project').filter(query)
+            result = Item.objects.filter(query)
 
-        return result
+        return result.select_related(*self.SELECT_RELATED).prefetch_related(
+            *self.PREFETCH_RELATED)
 
 
 class ItemFilter(FilterSet):
@@ -172,8 +184,21 @@ class ItemFilter(FilterSet):
                   'location_path', 'shared_projects',)
 
 
+class ItemSearchFilter(BaseFilterBackend):
+    """
+    Filters and ranks the items with the text in the `q` query parameter,
+    see `ItemSearchIndexManager.search`.
+    """
+    search_param = 'q'
+
+    def filter_queryset(self, request, queryset, view):
+        query = request.query_params.get(self.search_param, '')
+        return ItemSearchIndex.objects.search(queryset, query)
+
+
 class ItemList(TrapDjangoValidationErrorCreateMixin,
                ItemAuthorizationMixin,
+               ConditionalGetMixin,
                ListCreateAPIView):
     """
     Item list endpoint.
@@ -191,7 +216,7 @@ class ItemList(TrapDjangoValidationErrorCreateMixin,
         )
     pagination_class = SmallResultsSetPagination
     lookup_field = 'public_id'
-    filter_backends = (DjangoFilterBackend,)
+    filter_backends = (DjangoFilterBackend, ItemSearchFilter,)
     filter_class = ItemFilter
 
 item_list = ItemList.as_view()
@@ -199,6 +224,7 @@ item_list = ItemList.as_view()
 
 class ItemDetail(TrapDjangoValidationErrorUpdateMixin,
                  ItemAuthorizationMixin,
+                 ConditionalGetMixin,
                  RetrieveUpdateDestroyAPIView):
     """
     Item detail endpoint.
@@ -219,6 +245,59 @@ class ItemDetail(TrapDjangoValidationErrorUpdateMixin,
 item_detail = ItemDetail.as_view()
 
 
+class ItemDelta(ItemAuthorizationMixin,
+                DeltaFeedMixin,
+                ListAPIView):
+    """
+    Item delta feed endpoint, the items changed since a sync token.
+    """
+    serializer_class = ItemSerializer
+    permission_classes = (
+        And(IsUserActive, IsAuthenticated,
+            Or(IsAdminSuperUser,
+               IsAdministrator,
+               IsAnyProjectUser
+               ),
+            ),
+        )
+
+item_delta = ItemDelta.as_view()
+
+
+class ItemImport(TrapDjangoValidationErrorCreateMixin,
+                 CreateModelMixin,
+                 GenericAPIView):
+    """
+    Bulk imports items from an uploaded CSV or JSON file or a list of items.
+    Returns the number of rows read and items created, and the errors of
+    the rows that could not be imported.
+    """
+    serializer_class = ItemImportSerializer
+    parser_classes = (JSONParser, MultiPartParser, FormParser,)
+    permission_classes = (
+        And(IsUserActive,
+            Or(IsAdminSuperUser,
+               IsAdministrator,
+               IsProjectOwner,
+               IsProjectManager
+               ),
+            ),
+        )
+
+    def post(self, request, *args, **kwargs):
+        return self.create(request, *args, **kwargs)
+
+    def create(self, request, *args, **kwargs):
+        input_serializer = self.get_serializer(data=request.data)
+        input_serializer.is_valid(raise_exception=True)
+        report = input_serializer.create(input_serializer.validated_data)
+        headers = self.get_success_headers(report)
+        return Response(report, status=status.HTTP_201_CREATED,
+                        headers=headers)
+
+item_import = ItemImport.as_view()
+
+
 #
 # Invoice
 #
@@ -229,11 +308,11 @@ class InvoiceAuthorizationMixin(object):
             self.request.user.role == UserModel.ADMINISTRATOR):
             result = Invoice.objects.all()
         else:
-            projects = self.request.user.projects.all()
+            projects = get_project_ids(self.request)
             result = Invoice.objects.select_related(
                 'project').filter(project__in=projects)
 
-        return result
+        return Invoice.objects.annotate_totals(result)
 
 
 class InvoiceFilter(FilterSet):
@@ -325,6 +404,96 @@ class InvoiceDetail(TrapDjangoValidationErrorUpdateMixin,
 invoice_detail = InvoiceDetail.as_view()
 
 
+class InvoiceBulk(TrapDjangoValidationErrorCreateMixin,
+                  CreateModelMixin,
+                  GenericAPIView):
+    """
+    Creates an invoice with all its invoice items in one request, the items
+    and invoice items are inserted in bulk. Returns the new invoice.
+    """
+    serializer_class = InvoiceBulkSerializer
+    permission_classes = (
+        And(IsUserActive,
+            Or(IsAdminSuperUser,
+               IsAdministrator,
+               IsProjectOwner,
+               IsProjectManager
+               ),
+            ),
+        )
+
+    def post(self, request, *args, **kwargs):
+        return self.create(request, *args, **kwargs)
+
+    def create(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        self.perform_create(serializer)
+        invoice = Invoice.objects.annotate_totals().select_related(
+            'project').prefetch_related('invoice_items__item').get(
+            pk=serializer.instance.pk)
+        data = InvoiceSerializer(
+            invoice, context=self.get_serializer_context()).data
+        return Response(data, status=status.HTTP_201_CREATED)
+
+invoice_bulk = InvoiceBulk.as_view()
+
+
+#
+# InvoiceSpend
+#
+class InvoiceSpendAuthorizationMixin(object):
+
+    def get_queryset(self):
+        if (self.request.user.is_superuser or
+            self.request.user.role == UserModel.ADMINISTRATOR):
+            result = InvoiceSpend.objects.all()
+        else:
+            projects = get_project_ids(self.request)
+            result = InvoiceSpend.objects.filter(project__in=projects)
+
+        return result.select_related('project', 'supplier', 'currency')
+
+
+class InvoiceSpendFilter(FilterSet):
+    project = CharFilter(
+        name='project__public_id', label=_("Project Public Id"),
+        lookup_expr='exact')
+    supplier = CharFilter(
+        name='supplier__public_id', label=_("Supplier Public Id"),
+        lookup_expr='exact')
+    currency = CharFilter(
+        name='currency__alphabetic_code', label=_("Currency Code"),
+        lookup_expr='exact')
+    month = DateFilter(
+        name='month', label=_("Month"), lookup_expr=['exact', 'gte', 'lte',])
+
+    class Meta:
+        model = InvoiceSpend
+        fields = ('project', 'supplier', 'currency', 'month',)
+
+
+class InvoiceSpendList(InvoiceSpendAuthorizationMixin, ListAPIView):
+    """
+    Invoice spend report endpoint, the invoice totals of each project by
+    supplier, currency, and month.
+    """
+    serializer_class = InvoiceSpendSerializer
+    permission_classes = (
+        And(IsUserActive,
+            IsReadOnly,
+            Or(IsAdminSuperUser,
+               IsAdministrator,
+               IsAnyProjectUser),
+            ),
+        )
+    pagination_class = SmallResultsSetPagination
+    filter_backends = (DjangoFilterBackend,)
+    filter_class = InvoiceSpendFilter
+
+invoice_spend_list = InvoiceSpendList.as_view()
+
+
 #
 # InvoiceItem
 #
@@ -335,7 +504,7 @@ class InvoiceItemAuthorizationMixin(object):
             self.request.user.role == UserModel.ADMINISTRATOR):
             result = InvoiceItem.objects.all()
         else:
-            projects = self.request.user.projects.all()
+            projects = get_project_ids(self.request)
             invoices = Invoice.objects.select_related(
                 'project').filter(project__in=projects)
             result = InvoiceItem.objects.select_related(
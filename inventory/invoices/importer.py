@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+#
+# inventory/invoices/importer.py
+#
+"""
+Streaming bulk Item importer.
+"""
+__docformat__ = "restructuredtext en"
+
+import csv
+import json
+import logging
+from itertools import islice
+
+from django.utils import six
+
+from .models import Item
+
+log = logging.getLogger('inventory.invoices.importer')
+
+
+class ItemImporter(object):
+    """
+    Reads items from CSV or JSON streams and creates them a chunk at a time
+    with `ItemManager.bulk_import_items`. The relation columns in a CSV file
+    hold many values separated by `MULTI_VALUE_SEPARATOR`. A JSON stream can
+    be either a list of objects or one object per line (JSON Lines), only
+    the latter is read without loading the whole stream.
+    """
+    CHUNK_SIZE = 1000
+    MULTI_VALUE_SEPARATOR = '|'
+    MULTI_VALUE_FIELDS = ('categories', 'location_codes', 'shared_projects',)
+    CSV = 'csv'
+    JSON = 'json'
+    FORMATS = (CSV, JSON,)
+
+    def __init__(self, project, user, chunk_size=CHUNK_SIZE):
+        self.project = project
+        self.user = user
+        self.chunk_size = chunk_size
+        self.column_collection = Item.objects.get_column_collection()
+        self.allocators = Item.objects.get_key_allocators(project)
+
+    def read(self, stream, fmt):
+        if fmt == self.CSV:
+            rows = self.read_csv(stream)
+        elif fmt == self.JSON:
+            rows = self.read_json(stream)
+        else:
+            raise ValueError("Invalid format '{}', must be one of {}.".format(
+                fmt, self.FORMATS))
+
+        return rows
+
+    def read_csv(self, stream):
+        for row in csv.DictReader(stream):
+            yield self.split_values(row)
+
+    def read_json(self, stream):
+        first = stream.readline()
+
+        if first.lstrip().startswith('['):
+            rows = json.loads(first + stream.read())
+        else:
+            rows = self._read_lines(first, stream)
+
+        for row in rows:
+            yield self.split_values(row)
+
+    def _read_lines(self, first, stream):
+        line = first
+
+        while line:
+            if line.strip():
+                yield json.loads(line)
+
+            line = stream.readline()
+
+    def split_values(self, row):
+        for field in self.MULTI_VALUE_FIELDS:
+            value = row.get(field)
+
+            if isinstance(value, six.string_types):
+                row[field] = [v.strip() for v in value.split(
+                    self.MULTI_VALUE_SEPARATOR) if v.strip()]
+
+        return row
+
+    def chunks(self, rows):
+        rows = iter(rows)
+        chunk = list(islice(rows, self.chunk_size))
+
+        while chunk:
+            yield chunk
+            chunk = list(islice(rows, self.chunk_size))
+
+    def run(self, rows):
+        """
+        Imports all the rows, returns a report dict with the number of rows
+        read, the number of items created, and the errors keyed by the row
+        number.
+        """
+        report = {'rows': 0, 'created': 0, 'errors': {}}
+
+        for chunk in self.chunks(rows):
+            items, errors = Item.objects.bulk_import_items(
+                self.project, self.user, chunk,
+                column_collection=self.column_collection,
+                start=report['rows'] + 1, allocators=self.allocators)
+            report['rows'] += len(chunk)
+            report['created'] += len(items)
+            report['errors'].update(errors)
+            log.debug("Imported %s of %s rows.", report['created'],
+                      report['rows'])
+
+        return report
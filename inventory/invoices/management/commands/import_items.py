@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+#
+# inventory/invoices/management/commands/import_items.py
+#
+"""
+Bulk import Items from a CSV or JSON file.
+"""
+__docformat__ = "restructuredtext en"
+
+import io
+import os
+import json
+import logging
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from inventory.invoices.importer import ItemImporter
+from inventory.projects.models import Project
+
+log = logging.getLogger('commands.invoices.import-items')
+UserModel = get_user_model()
+
+
+class Command(BaseCommand):
+    """
+    Management command for bulk importing items.
+    """
+    help = "Bulk import items from a CSV or JSON file."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'filename', type=str,
+            help="Item filename (relative or absolute path).")
+        parser.add_argument(
+            '-p', '--project', type=str, required=True, dest='project',
+            help="The public id of the project the items are imported to.")
+        parser.add_argument(
+            '-u', '--user', type=str, required=True, dest='user',
+            help="The username of the creator of the items.")
+        parser.add_argument(
+            '-f', '--format', type=str, default='', dest='format',
+            choices=ItemImporter.FORMATS,
+            help="The file format, defaults to the file extension.")
+        parser.add_argument(
+            '-c', '--chunk-size', type=int, default=ItemImporter.CHUNK_SIZE,
+            dest='chunk_size', help="Number of items created at a time.")
+        parser.add_argument(
+            '-r', '--report', type=str, default='', dest='report',
+            help="Write the error report as JSON to this filename.")
+
+    def handle(self, *args, **options):
+        filename = options.get('filename')
+        fmt = (options.get('format') or
+               os.path.splitext(filename)[1].lstrip('.').lower())
+
+        if fmt not in ItemImporter.FORMATS:
+            raise CommandError("Cannot determine the format of '{}', use "
+                               "the --format option.".format(filename))
+
+        try:
+            project = Project.objects.get(public_id=options.get('project'))
+            user = UserModel.objects.get(username=options.get('user'))
+        except (Project.DoesNotExist, UserModel.DoesNotExist) as e:
+            raise CommandError(str(e))
+
+        importer = ItemImporter(project, user,
+                                chunk_size=options.get('chunk_size'))
+
+        try:
+            with io.open(filename, 'r', encoding='utf-8', newline='') as f:
+                report = importer.run(importer.read(f, fmt))
+        except Exception as e:
+            msg = "Import failed (See traceback in log file.), {}".format(e)
+            log.error(msg, exc_info=True)
+            raise CommandError(msg)
+
+        if options.get('report'):
+            with io.open(options.get('report'), 'w', encoding='utf-8') as f:
+                f.write(json.dumps(report, indent=2, default=str))
+
+        self.stdout.write("Processed {} rows, created {} items, {} rows with "
+                          "errors.".format(report['rows'], report['created'],
+                                           len(report['errors'])))
@@ -0,0 +1,41 @@
+# -*- coding: utf-8 -*-
+#
+# inventory/invoices/management/commands/rebuild_invoice_spend.py
+#
+"""
+Rebuild the InvoiceSpend summary table.
+"""
+__docformat__ = "restructuredtext en"
+
+import logging
+
+from django.core.management.base import BaseCommand, CommandError
+
+from inventory.invoices.models import InvoiceSpend
+from inventory.projects.models import Project
+
+log = logging.getLogger('commands.invoices.rebuild-invoice-spend')
+
+
+class Command(BaseCommand):
+    """
+    Management command for rebuilding the invoice spend summary.
+    """
+    help = "Rebuild the invoice spend summary of all or one project."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '-p', '--project', type=str, default='', dest='project',
+            help="The public id of the project to rebuild, defaults to all.")
+
+    def handle(self, *args, **options):
+        project = None
+
+        if options.get('project'):
+            try:
+                project = Project.objects.get(public_id=options['project'])
+            except Project.DoesNotExist as e:
+                raise CommandError(str(e))
+
+        count = InvoiceSpend.objects.rebuild(project)
+        self.stdout.write("Rebuilt {} invoice spend rows.".format(count))
@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+#
+# inventory/invoices/management/commands/rebuild_item_search.py
+#
+"""
+Rebuild the Item search index.
+"""
+__docformat__ = "restructuredtext en"
+
+import logging
+
+from django.core.management.base import BaseCommand, CommandError
+
+from inventory.invoices.models import Item, ItemSearchIndex
+from inventory.projects.models import Project
+
+log = logging.getLogger('commands.invoices.rebuild-item-search')
+
+
+class Command(BaseCommand):
+    """
+    Management command for rebuilding the item search index.
+    """
+    help = "Rebuild the item search index of all or one project's items."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '-p', '--project', type=str, default='', dest='project',
+            help="The public id of the project to rebuild, defaults to all.")
+        parser.add_argument(
+            '-c', '--chunk-size', type=int, default=10000, dest='chunk_size',
+            help="Number of items read at a time.")
+
+    def handle(self, *args, **options):
+        items = Item.objects.all()
+
+        if options.get('project'):
+            try:
+                project = Project.objects.get(public_id=options['project'])
+            except Project.DoesNotExist as e:
+                raise CommandError(str(e))
+
+            items = items.filter(project=project)
+
+        chunk_size = options.get('chunk_size')
+        last_pk = 0
+        count = 0
+
+        while True:
+            pks = list(items.filter(pk__gt=last_pk).order_by(
+                'pk').values_list('pk', flat=True)[:chunk_size])
+
+            if not pks:
+                break
+
+            count += ItemSearchIndex.objects.update_items(pks)
+            last_pk = pks[-1]
+            log.debug("Rebuilt the search index of %s items.", count)
+
+        self.stdout.write("Rebuilt the search index of {} items.".format(
+            count))
@@ -10,11 +10,25 @@ Invoice, InvoiceItem and Item model and the Condition pseudo model.
 __docformat__ = "restructuredtext en"
 
 import logging
+from datetime import datetime, date
+from decimal import Decimal
+from functools import reduce
+from operator import or_
+from dateutil.tz import tzutc
 
 from django.conf import settings
-from django.db import models
-from django.db.models.signals import post_save
+from django.core.cache import cache
+from django.contrib.postgres.search import (
+    SearchQuery, SearchRank, SearchVector, SearchVectorField,
+    TrigramSimilarity)
+from django.db import (
+    connections, models, router, transaction)
+from django.db.models import Q
+from django.db.models.functions import Coalesce
+from django.db.models.signals import (
+    m2m_changed, post_delete, post_save, pre_delete)
 from django.dispatch import receiver
+from django.utils import six
 from django.utils.encoding import python_2_unicode_compatible
 from django.core.exceptions import ValidationError
 from django.utils.safestring import mark_safe
@@ -25,14 +39,19 @@ from dcolumn.dcolumns.models import (
     CollectionBase, CollectionBaseManager, ColumnCollection)
 from dcolumn.dcolumns.manager import dcolumn_manager
 
-from inventory.common import generate_public_key, generate_sku_fragment
+from inventory.common import (
+    generate_public_key, generate_public_keys, generate_sku_fragment,
+    generate_sku_fragments, sync_relation, KeyBlockAllocator)
+from inventory.common.indexes import GinIndex, ParentTableIndex
 from inventory.common.model_mixins import (
     UserModelMixin, TimeModelMixin, StatusModelMixin, StatusModelManagerMixin,
     ValidateOnSaveMixin)
+from inventory.common.signals import (
+    child_paths_updated, bulk_delete, in_bulk_delete, pre_bulk_delete)
 from inventory.common.storage import create_file_path, InventoryFileStorage
 from inventory.categories.models import Category
 from inventory.locations.models import LocationCode
-from inventory.projects.models import Project
+from inventory.projects.models import Project, Tombstone
 from inventory.regions.models import Currency
 from inventory.suppliers.models import Supplier
 
@@ -73,13 +92,258 @@ dcolumn_manager.register_choice(Condition, 1, 'name')
 # Item
 #
 class ItemManager(CollectionBaseManager, StatusModelManagerMixin):
+    IMPORT_FIELDS = ('item_number', 'item_number_mfg', 'description',
+                     'quantity', 'purge', 'active',)
+    BOOLEAN_MAP = {'true': True, 'yes': True, 'y': True, 't': True,
+                   '1': True, 'false': False, 'no': False, 'n': False,
+                   'f': False, '0': False}
+    COLUMN_COLLECTION_CACHE_KEY = 'item-column-collection'
+    COLUMN_COLLECTION_CACHE_TIMEOUT = 60 * 60
 
     def get_column_collection(self):
         """
-        This method should be in the CollectionBaseManager managers.
+        This method should be in the CollectionBaseManager managers. The
+        collection is cached until a ColumnCollection is saved or deleted.
         """
-        related_model = dcolumn_manager.get_collection_name('Item')
-        return ColumnCollection.objects.get(related_model=related_model)
+        collection = cache.get(self.COLUMN_COLLECTION_CACHE_KEY)
+
+        if collection is None:
+            related_model = dcolumn_manager.get_collection_name('Item')
+            collection = ColumnCollection.objects.get(
+                related_model=related_model)
+            cache.set(self.COLUMN_COLLECTION_CACHE_KEY, collection,
+                      self.COLUMN_COLLECTION_CACHE_TIMEOUT)
+
+        return collection
+
+    def invalidate_column_collection(self):
+        cache.delete(self.COLUMN_COLLECTION_CACHE_KEY)
+
+    def mark_updated(self, pks):
+        """
+        Sets the `updated` time of the items in `pks` to now without saving
+        them, used when their categories or location codes change so their
+        `ETag` and the delta feed show the change.
+        """
+        return self.filter(pk__in=pks).update(updated=datetime.now(tzutc()))
+
+    def get_key_allocators(self, project):
+        """
+        Returns a tuple of the public id and SKU block allocators used by
+        the bulk create paths.
+        """
+        return (KeyBlockAllocator(self.all(), 'public_id',
+                                  generate_public_keys),
+                KeyBlockAllocator(self.filter(project=project), 'sku',
+                                  generate_sku_fragments))
+
+    def bulk_import_items(self, project, user, rows, column_collection=None,
+                          start=1, allocators=None):
+        """
+        Creates items from a chunk of rows, each row is a dict with any of
+        the `IMPORT_FIELDS` plus the `manufacturer` name, a list of
+        `categories` paths, a list of `location_codes` paths, and a list of
+        `shared_projects` public ids. All the relations in the chunk are
+        resolved with one query each, then the items and their many to many
+        rows are bulk inserted. Returns a tuple of the created items and a
+        dict of the invalid row numbers, counting from `start`, mapped to a
+        list of their errors. The public ids and SKUs are taken from the
+        `allocators`, see `get_key_allocators`.
+        """
+        if column_collection is None:
+            column_collection = self.get_column_collection()
+
+        if allocators is None:
+            allocators = self.get_key_allocators(project)
+
+        lookups = self._get_import_lookups(project, rows)
+        now = datetime.now(tzutc())
+        errors = {}
+        valid = []
+
+        for num, row in enumerate(rows, start=start):
+            row_errors = []
+            kwargs = {key: self._to_python(key, row[key])
+                      for key in self.IMPORT_FIELDS
+                      if row.get(key) not in (None, '')}
+            name = row.get('manufacturer')
+
+            if name:
+                kwargs['manufacturer'] = lookups['manufacturer'].get(name)
+
+                if kwargs['manufacturer'] is None:
+                    row_errors.append(_("Invalid manufacturer '{}'.").format(
+                        name))
+
+            related = {}
+
+            for field in ('categories', 'location_codes', 'shared_projects'):
+                related[field] = []
+
+                for value in row.get(field) or []:
+                    pks = lookups[field].get(value, [])
+
+                    if len(pks) == 1:
+                        related[field].append(pks[0])
+                    else:
+                        row_errors.append(_("Invalid {} '{}', found {} "
+                                            "matches.").format(
+                            field, value, len(pks)))
+
+            obj = self.model(
+                project=project, column_collection=column_collection,
+                creator=user, updater=user, created=now, updated=now,
+                **kwargs)
+
+            try:
+                obj.clean_fields(exclude=('public_id', 'sku', 'project',
+                                          'column_collection', 'manufacturer',
+                                          'creator', 'updater',))
+            except ValidationError as e:
+                row_errors.extend(["{}: {}".format(key, " ".join(value))
+                                   for key, value in e.message_dict.items()])
+
+            if row_errors:
+                errors[num] = row_errors
+            else:
+                valid.append((obj, related))
+
+        items = []
+
+        if valid:
+            with transaction.atomic():
+                items[:] = self._bulk_create_items(valid, allocators)
+
+        return items, errors
+
+    def _to_python(self, name, value):
+        """
+        Converts the usual text representations of booleans, the model
+        fields convert and validate everything else.
+        """
+        field = self.model._meta.get_field(name)
+
+        if (isinstance(field, models.BooleanField) and
+            isinstance(value, six.string_types)):
+            value = self.BOOLEAN_MAP.get(value.strip().lower(), value)
+
+        return value
+
+    def _get_import_lookups(self, project, rows):
+        """
+        Returns a dict of the import relation fields each mapped to a dict of
+        the row values and the model objects or pks they refer to.
+        """
+        values = {'manufacturer': set(), 'categories': set(),
+                  'location_codes': set(), 'shared_projects': set()}
+
+        for row in rows:
+            if row.get('manufacturer'):
+                values['manufacturer'].add(row['manufacturer'])
+
+            for field in ('categories', 'location_codes', 'shared_projects'):
+                values[field].update(row.get(field) or [])
+
+        lookups = {field: {} for field in values}
+
+        if values['manufacturer']:
+            lookups['manufacturer'].update({obj.name: obj for obj in (
+                Supplier.objects.filter(
+                    project=project, name__in=values['manufacturer'],
+                    stype__in=(Supplier.MANUFACTURER,
+                               Supplier.BOTH_MFG_DIS)))})
+
+        queries = (
+            ('categories', Category.objects.filter(
+                project=project, path__in=values['categories']), 'path'),
+            ('location_codes', LocationCode.objects.filter(
+                location_format__location_set_name__project=project,
+                path__in=values['location_codes']), 'path'),
+            ('shared_projects', Project.objects.filter(
+                public_id__in=values['shared_projects'], public=True),
+             'public_id'),
+            )
+
+        for field, queryset, key in queries:
+            if values[field]:
+                for pk, value in queryset.values_list('pk', key):
+                    lookups[field].setdefault(value, []).append(pk)
+
+        return lookups
+
+    def _bulk_create_items(self, valid, allocators):
+        objs = [obj for obj, related in valid]
+        public_ids = allocators[0].allocate(len(objs))
+        skus = allocators[1].allocate(len(objs))
+
+        for obj, public_id, sku in zip(objs, public_ids, skus):
+            obj.public_id = public_id
+            obj.sku = sku
+
+        self._bulk_insert(objs)
+
+        for field, target in (('categories', 'category'),
+                              ('location_codes', 'locationcode'),
+                              ('shared_projects', 'project')):
+            through = getattr(self.model, field).through
+            through.objects.bulk_create([
+                through(**{'item_id': obj.pk, target + '_id': pk})
+                for obj, related in valid for pk in set(related[field])])
+
+        ItemSearchIndex.objects.update_items(objs)
+        return objs
+
+    def _bulk_insert(self, objs):
+        """
+        The `Item` model inherits from the concrete `CollectionBase` model,
+        which `bulk_create` does not support. The item rows are inserted
+        with their parent links set by multi-row INSERT statements, in as
+        few batches as the database allows, on every database.
+
+        How the parent rows are inserted depends on the database. On
+        PostgreSQL, which returns the new primary keys, they are inserted
+        with one `bulk_create`. On SQLite, which the tests run on, they are
+        saved one by one, so the tests only cover the single row parent
+        inserts. The saved items are marked as loaded from the database, as
+        `bulk_create` does, so later saves and validation update them.
+        """
+        parent_model = CollectionBase
+        link = self.model._meta.get_ancestor_link(parent_model)
+        fields = [field for field in parent_model._meta.concrete_fields
+                  if not field.primary_key]
+        parents = [parent_model(**{field.attname: getattr(obj, field.attname)
+                                   for field in fields}) for obj in objs]
+        db = router.db_for_write(self.model)
+        connection = connections[db]
+
+        if connection.features.can_return_ids_from_bulk_insert:
+            parent_model.objects.using(db).bulk_create(parents)
+        else:
+            for parent in parents:
+                parent.save(force_insert=True, using=db,
+                            disable_created=True, disable_updated=True)
+
+        for obj, parent in zip(objs, parents):
+            setattr(obj, link.attname, parent.pk)
+            obj._state.adding = False
+            obj._state.db = db
+
+        fields = self.model._meta.local_concrete_fields
+        qn = connection.ops.quote_name
+        sql = "INSERT INTO {} ({}) VALUES ".format(
+            qn(self.model._meta.db_table),
+            ", ".join([qn(field.column) for field in fields]))
+        placeholders = "({})".format(", ".join(["%s"] * len(fields)))
+        batch_size = max(connection.ops.bulk_batch_size(fields, objs), 1)
+
+        with connection.cursor() as cursor:
+            for idx in range(0, len(objs), batch_size):
+                batch = objs[idx:idx + batch_size]
+                params = [field.get_db_prep_save(field.pre_save(obj, True),
+                                                 connection=connection)
+                          for obj in batch for field in fields]
+                cursor.execute(sql + ", ".join([placeholders] * len(batch)),
+                               params)
 
 
 @python_2_unicode_compatible
@@ -157,6 +421,11 @@ class Item(CollectionBase, ValidateOnSaveMixin, models.Model):
     class Meta:
         unique_together = ('project', 'sku')
         ordering = ('project__name', 'sku',)
+        # Supports the delta feed, `updated` is on the dcolumns
+        # CollectionBase table.
+        indexes = (ParentTableIndex(
+            fields=['updated', 'id'],
+            name='dcolumns_collectionbase_updated_id'),)
         verbose_name = _("Item")
         verbose_name_plural = _("Items")
 
@@ -177,57 +446,350 @@ class Item(CollectionBase, ValidateOnSaveMixin, models.Model):
         Add and remove location_codes.
         """
         if isinstance(location_codes, (list, tuple, models.QuerySet)):
-            wanted_pks = [inst.pk for inst in location_codes]
-            old_pks = [inst.pk for inst in self.location_codes.all()]
-            # Remove unwanted location_codes.
-            rem_pks = list(set(old_pks) - set(wanted_pks))
-            unwanted = self.location_codes.filter(pk__in=rem_pks)
-            self.location_codes.remove(*unwanted)
-            # Add new location_codes.
-            add_pks = list(set(wanted_pks) - set(old_pks))
-            wanted = [obj for obj in location_codes if obj.pk in add_pks]
-            self.location_codes.add(*wanted)
+            add, rem = sync_relation(self.location_codes.through, 'item',
+                                     self.pk, 'locationcode', location_codes)
+
+            if add or rem:
+                ItemSearchIndex.objects.update_items([self.pk])
 
     def process_categories(self, categories):
         """
         Add and remove categories.
         """
         if isinstance(categories, (list, tuple, models.QuerySet)):
-            wanted_pks = [inst.pk for inst in categories]
-            old_pks = [inst.pk for inst in self.categories.all()]
-            # Remove unwanted categories.
-            rem_pks = list(set(old_pks) - set(wanted_pks))
-            unwanted = self.categories.filter(pk__in=rem_pks)
-            self.categories.remove(*unwanted)
-            # Add new categories.
-            add_pks = list(set(wanted_pks) - set(old_pks))
-            wanted = [obj for obj in categories if obj.pk in add_pks]
-            self.categories.add(*wanted)
+            add, rem = sync_relation(self.categories.through, 'item',
+                                     self.pk, 'category', categories)
+
+            if add or rem:
+                ItemSearchIndex.objects.update_items([self.pk])
 
     def process_shared_projects(self, shared_projects):
         """
-        Add and remove shared projects.
+        Add and remove shared projects. The removed projects get a
+        tombstone of this item for their delta feeds.
         """
         if isinstance(shared_projects, (list, tuple, models.QuerySet)):
-            wanted_pks = [inst.pk for inst in shared_projects if inst.public]
-            old_pks = [inst.pk for inst in self.shared_projects.all()]
-            # Remove unwanted shared projects.
-            rem_pks = list(set(old_pks) - set(wanted_pks))
-            unwanted = self.shared_projects.filter(pk__in=rem_pks)
-            self.shared_projects.remove(*unwanted)
-            # Add new shared projects.
-            add_pks = list(set(wanted_pks) - set(old_pks))
-            wanted = [obj for obj in shared_projects if obj.pk in add_pks]
-            self.shared_projects.add(*wanted)
+            add, rem = sync_relation(
+                self.shared_projects.through, 'item', self.pk, 'project',
+                [inst for inst in shared_projects if inst.public])
+
+            for project_id in rem:
+                Tombstone.objects.add(self, project_id)
 
 dcolumn_manager.register_choice(Item, 2, 'sku')
 
 
+#
+# ItemSearchIndex
+#
+class ItemSearchIndexManager(models.Manager):
+    SEARCH_CONFIG = 'simple'
+    BATCH_SIZE = 500
+    SEARCH_FIELDS = ('codes', 'names', 'description',)
+    # Only the short columns are matched by substring, the description is
+    # matched by words through the tsvector.
+    SUBSTRING_FIELDS = ('codes', 'names',)
+    VECTOR_WEIGHTS = (('codes', 'A'), ('names', 'B'), ('description', 'C'),)
+
+    def is_full_text(self, using=None):
+        """
+        Returns `True` if the database supports the tsvector and trigram
+        search, only PostgreSQL does.
+        """
+        using = using or router.db_for_write(self.model)
+        return connections[using].vendor == 'postgresql'
+
+    def update_items(self, items):
+        """
+        Rebuilds the index rows of the `items`, either `Item` objects or
+        their primary keys, in batches of `BATCH_SIZE`. Returns the number of
+        rows written.
+        """
+        pks = sorted(set(getattr(item, 'pk', item) for item in items))
+        count = 0
+
+        for idx in range(0, len(pks), self.BATCH_SIZE):
+            count += self._update_batch(pks[idx:idx + self.BATCH_SIZE])
+
+        return count
+
+    def _update_batch(self, pks):
+        paths = {pk: [] for pk in pks}
+
+        for field, target in (('categories', 'category'),
+                              ('location_codes', 'locationcode')):
+            through = getattr(Item, field).through
+
+            for pk, path in through.objects.filter(
+                item_id__in=pks).values_list(
+                'item_id', '{}__path'.format(target)).order_by(
+                '{}__path'.format(target)):
+                paths[pk].append(path)
+
+        rows = []
+
+        for (pk, sku, number, number_mfg, description,
+             mfg_name) in Item.objects.filter(pk__in=pks).values_list(
+            'pk', 'sku', 'item_number', 'item_number_mfg', 'description',
+            'manufacturer__name'):
+            rows.append(self.model(
+                item_id=pk,
+                codes=self._join(sku, number, number_mfg),
+                names=self._join(mfg_name, *paths[pk]),
+                description=self._join(description)))
+
+        with transaction.atomic():
+            self.filter(item_id__in=pks).delete()
+            self.bulk_create(rows)
+
+            if rows and self.is_full_text():
+                self.filter(item_id__in=pks).update(vector=reduce(
+                    lambda a, b: a + b, [
+                        SearchVector(field, weight=weight,
+                                     config=self.SEARCH_CONFIG)
+                        for field, weight in self.VECTOR_WEIGHTS]))
+
+        return len(rows)
+
+    def _join(self, *values):
+        return "\n".join([value for value in values if value]).lower()
+
+    def update_manufacturer_items(self, manufacturer):
+        """
+        Rebuilds the index rows of the `manufacturer`'s items whose names do
+        not start with its name, the manufacturer's name is the first line
+        of the names.
+        """
+        name = manufacturer.name.lower()
+        pks = Item.objects.filter(manufacturer=manufacturer).exclude(
+            Q(search_index__names=name) |
+            Q(search_index__names__startswith=name + "\n")).values_list(
+            'pk', flat=True)
+        return self.update_items(list(pks))
+
+    def update_tree_items(self, field, node):
+        """
+        Rebuilds the index rows of the items related through `field`, either
+        `categories` or `location_codes`, to the `node` or its descendants,
+        used when the paths of the tree changed.
+        """
+        name = Item._meta.get_field(field).m2m_reverse_field_name()
+        pks = getattr(Item, field).through.objects.filter(
+            Q(**{name: node}) |
+            Q(**{'{}__id_path__startswith'.format(name):
+                 node.descendant_id_path})).values_list(
+            'item_id', flat=True).distinct()
+        return self.update_items(list(pks))
+
+    def remove_related(self, field, pks):
+        """
+        Removes the relations through `field`, either `categories` or
+        `location_codes`, to the records in `pks` and rebuilds the index
+        rows of their items, used before the records are deleted in bulk.
+        """
+        name = Item._meta.get_field(field).m2m_reverse_field_name()
+        rows = getattr(Item, field).through.objects.filter(
+            **{'{}_id__in'.format(name): pks})
+        item_pks = list(rows.values_list('item_id', flat=True).distinct())
+        rows.delete()
+        return self.update_items(item_pks)
+
+    def search(self, queryset, query):
+        """
+        Filters the `Item` queryset with the `query` text and orders it by
+        relevance, the rank is annotated as `search_rank`. On PostgreSQL the
+        words are matched against the tsvector and the whole text is matched
+        as a substring of the SKU, item numbers, and paths using the trigram
+        indexes. Other databases match each word as a substring of any of
+        the indexed text.
+        """
+        terms = query.lower().split()
+
+        if not terms:
+            return queryset
+
+        text = " ".join(terms)
+
+        if self.is_full_text(queryset.db):
+            search_query = SearchQuery(text, config=self.SEARCH_CONFIG)
+            match = reduce(or_, [Q(**{
+                'search_index__{}__contains'.format(field): text})
+                for field in self.SUBSTRING_FIELDS],
+                           Q(search_index__vector=search_query))
+            rank = (SearchRank(models.F('search_index__vector'), search_query)
+                    + TrigramSimilarity('search_index__codes', text))
+        else:
+            match = Q()
+
+            for term in terms:
+                match &= reduce(or_, [Q(**{
+                    'search_index__{}__contains'.format(field): term})
+                    for field in self.SEARCH_FIELDS])
+
+            rank = models.Case(
+                models.When(search_index__codes__startswith=text,
+                            then=models.Value(1.0)),
+                models.When(search_index__codes__contains=text,
+                            then=models.Value(0.5)),
+                default=models.Value(0.0), output_field=models.FloatField())
+
+        return queryset.filter(match).annotate(search_rank=rank).order_by(
+            '-search_rank', *Item._meta.ordering)
+
+
+class ItemSearchIndex(models.Model):
+    """
+    The searchable text of an item, kept current by the signals below and
+    the bulk create paths. All the text is stored in lower case so that the
+    substring matches can use the trigram indexes.
+    """
+    item = models.OneToOneField(
+        Item, on_delete=models.CASCADE, primary_key=True,
+        related_name='search_index', verbose_name=_("Item"))
+    codes = models.TextField(
+        verbose_name=_("Codes"), blank=True,
+        help_text=_("The SKU, item number, and manufacturer item number."))
+    names = models.TextField(
+        verbose_name=_("Names"), blank=True,
+        help_text=_("The manufacturer name, category paths, and location "
+                    "code paths."))
+    description = models.TextField(
+        verbose_name=_("Description"), blank=True,
+        help_text=_("The item description."))
+    vector = SearchVectorField(
+        verbose_name=_("Search Vector"), null=True, blank=True,
+        help_text=_("The weighted tsvector, PostgreSQL only."))
+
+    objects = ItemSearchIndexManager()
+
+    class Meta:
+        # The tsvector and trigram indexes used on PostgreSQL.
+        indexes = (
+            GinIndex(fields=['vector'],
+                     name='invoices_itemsearchindex_vector_gin'),
+            GinIndex(fields=['codes'], opclass='gin_trgm_ops',
+                     name='invoices_itemsearchindex_codes_trgm'),
+            GinIndex(fields=['names'], opclass='gin_trgm_ops',
+                     name='invoices_itemsearchindex_names_trgm'),
+            GinIndex(fields=['description'], opclass='gin_trgm_ops',
+                     name='invoices_itemsearchindex_description_trgm'),
+            )
+        verbose_name = _("Item Search Index")
+        verbose_name_plural = _("Item Search Indexes")
+
+
 #
 # Invoice
 #
 class InvoiceManager(models.Manager):
-    pass
+    AMOUNT_FIELD = models.DecimalField(max_digits=20, decimal_places=4)
+
+    def annotate_totals(self, queryset=None):
+        """
+        Annotates the invoices with the `item_count`, the `subtotal` of the
+        invoice items' quantity times unit price, and the `total`, which is
+        the subtotal plus the shipping, other, and tax amounts less the
+        credit. The item values are correlated subqueries so that filters on
+        the invoice items do not change them.
+        """
+        if queryset is None:
+            queryset = self.get_queryset()
+
+        lines = InvoiceItem.objects.filter(
+            invoice=models.OuterRef('pk')).order_by().values('invoice')
+        subtotal = Coalesce(models.Subquery(
+            lines.annotate(amount=models.Sum(models.ExpressionWrapper(
+                models.F('quantity') * models.F('unit_price'),
+                output_field=self.AMOUNT_FIELD))).values('amount'),
+            output_field=self.AMOUNT_FIELD), self._zero())
+        count = Coalesce(models.Subquery(
+            lines.annotate(count=models.Count('pk')).values('count'),
+            output_field=models.IntegerField()), models.Value(0))
+        total = models.ExpressionWrapper(
+            subtotal + self._amount('shipping') + self._amount('other') +
+            self._amount('tax') - self._amount('credit'),
+            output_field=self.AMOUNT_FIELD)
+        return queryset.annotate(item_count=count, subtotal=subtotal,
+                                 total=total)
+
+    def bulk_create_invoice(self, user, lines, column_collection=None,
+                            **kwargs):
+        """
+        Creates an invoice from the `kwargs` and its invoice items from the
+        `lines`, a list of dicts of the `InvoiceItem` fields. All the lines
+        are validated before anything is written, a `ValidationError` keyed
+        by the line numbers is raised on any error. The items of the lines
+        with `process` set are created the same as `create_item_post_save`
+        does for a single line, but the items and the invoice items are
+        each inserted in bulk. Returns the new invoice.
+        """
+        kwargs['creator'] = user
+        kwargs['updater'] = user
+        invoice = self.model(**kwargs)
+        objs = []
+        errors = {}
+
+        for num, line in enumerate(lines, start=1):
+            obj = InvoiceItem(invoice=invoice, **line)
+
+            try:
+                obj.clean_fields(exclude=('public_id', 'invoice', 'item',))
+            except ValidationError as e:
+                errors[num] = ["{}: {}".format(key, " ".join(value))
+                               for key, value in e.message_dict.items()]
+
+            objs.append(obj)
+
+        if errors:
+            raise ValidationError({'invoice_items': [
+                _("Line {}: {}").format(num, "; ".join(errors[num]))
+                for num in sorted(errors)]})
+
+        with transaction.atomic():
+            invoice.save()
+            self._bulk_create_lines(invoice, objs, column_collection)
+            InvoiceSpend.objects.update_invoices([invoice.pk])
+
+        return invoice
+
+    def _bulk_create_lines(self, invoice, objs, column_collection):
+        if column_collection is None:
+            column_collection = Item.objects.get_column_collection()
+
+        now = datetime.now(tzutc())
+        lines = [obj for obj in objs if obj.process == InvoiceItem.YES]
+        items = [Item(
+            project=invoice.project, column_collection=column_collection,
+            item_number=obj.item_number, description=obj.description,
+            quantity=obj.quantity, creator=invoice.creator,
+            updater=invoice.updater, created=now, updated=now)
+                 for obj in lines]
+        related = {'categories': [], 'location_codes': [],
+                   'shared_projects': []}
+
+        if items:
+            Item.objects._bulk_create_items(
+                [(item, related) for item in items],
+                Item.objects.get_key_allocators(invoice.project))
+
+        for obj, item in zip(lines, items):
+            obj.item = item
+
+        allocator = KeyBlockAllocator(InvoiceItem.objects.all(),
+                                      'public_id', generate_public_keys)
+
+        for obj, public_id in zip(objs, allocator.allocate(len(objs))):
+            obj.invoice = invoice
+            obj.public_id = public_id
+
+        InvoiceItem.objects.bulk_create(objs)
+
+    def _zero(self):
+        return models.Value(Decimal(0), output_field=self.AMOUNT_FIELD)
+
+    def _amount(self, name):
+        return Coalesce(models.F(name), self._zero(),
+                        output_field=self.AMOUNT_FIELD)
 
 
 @python_2_unicode_compatible
@@ -279,7 +841,34 @@ class Invoice(UserModelMixin, TimeModelMixin, ValidateOnSaveMixin,
             self.public_id = generate_public_key()
 
     def save(self, *args, **kwargs):
-        super(Invoice, self).save(*args, **kwargs)
+        with transaction.atomic():
+            old = None
+
+            if self.pk is not None:
+                old = Invoice.objects.filter(pk=self.pk).values_list(
+                    'project_id', 'supplier_id', 'currency_id',
+                    'invoice_date').first()
+
+            super(Invoice, self).save(*args, **kwargs)
+            # Update the spend summary the invoice moved from and to.
+            buckets = [InvoiceSpend.objects.get_bucket(*old)] if old else []
+            buckets.append(self.spend_bucket)
+            InvoiceSpend.objects.update_buckets(buckets)
+
+    def delete(self, *args, **kwargs):
+        # The invoice items are not subtracted one by one, the invoice's
+        # spend summary is recomputed once after they are deleted with it.
+        with transaction.atomic(), bulk_delete(InvoiceItem):
+            return super(Invoice, self).delete(*args, **kwargs)
+
+    @property
+    def spend_bucket(self):
+        """
+        The key of the `InvoiceSpend` row this invoice is summed in.
+        """
+        return InvoiceSpend.objects.get_bucket(
+            self.project_id, self.supplier_id, self.currency_id,
+            self.invoice_date)
 
     def __str__(self):
         return "{} ({})".format(self.supplier.name, self.invoice_number)
@@ -287,6 +876,8 @@ class Invoice(UserModelMixin, TimeModelMixin, ValidateOnSaveMixin,
     class Meta:
         unique_together = ('supplier', 'invoice_number',)
         ordering = ('-invoice_date', 'supplier__name')
+        # Supports the keyset pagination on the ordering.
+        indexes = (models.Index(fields=['invoice_date', 'id']),)
         verbose_name = _("Invoice")
         verbose_name_plural = _("Invoices")
 
@@ -300,6 +891,7 @@ class InvoiceItemManager(models.Manager):
 
 @python_2_unicode_compatible
 class InvoiceItem(ValidateOnSaveMixin, models.Model):
+    SPEND_FIELDS = ('invoice', 'invoice_id', 'quantity', 'unit_price',)
     YES = True
     NO = False
     YES_NO = (
@@ -341,17 +933,223 @@ class InvoiceItem(ValidateOnSaveMixin, models.Model):
             self.public_id = generate_public_key()
 
     def save(self, *args, **kwargs):
-        super(InvoiceItem, self).save(*args, **kwargs)
+        update_fields = kwargs.get('update_fields')
+        spend = (update_fields is None or
+                 bool(set(update_fields) & set(self.SPEND_FIELDS)))
+
+        with transaction.atomic():
+            old = None
+
+            if spend and self.pk is not None:
+                old = InvoiceItem.objects.filter(pk=self.pk).values_list(
+                    'invoice_id', 'quantity', 'unit_price').first()
+
+            super(InvoiceItem, self).save(*args, **kwargs)
+
+            if spend:
+                self._update_spend(old)
+
+    def _update_spend(self, old):
+        """
+        Applies the change of the line to the spend summary, `old` is the
+        invoice, quantity, and unit price before the save.
+        """
+        amount = self.amount
+
+        if old and old[0] == self.invoice_id:
+            if old[1] * old[2] != amount:
+                InvoiceSpend.objects.add_lines(
+                    self.invoice.spend_bucket, 0, amount - old[1] * old[2])
+        else:
+            if old:
+                InvoiceSpend.objects.add_lines(
+                    Invoice.objects.get(pk=old[0]).spend_bucket, -1,
+                    -(old[1] * old[2]))
+
+            InvoiceSpend.objects.add_lines(self.invoice.spend_bucket, 1,
+                                           amount)
+
+    @property
+    def amount(self):
+        """
+        The quantity times the unit price.
+        """
+        return self.quantity * Decimal(self.unit_price)
 
     def __str__(self):
         return "{} ({})".format(self.item_number, self.invoice.invoice_number)
 
     class Meta:
         ordering = ('item_number',)
+        # Supports the keyset pagination on the ordering.
+        indexes = (models.Index(fields=['item_number', 'id']),)
         verbose_name = _("Invoice Item")
         verbose_name_plural = _("Invoice Items")
 
 
+#
+# InvoiceSpend
+#
+class InvoiceSpendManager(models.Manager):
+
+    def get_bucket(self, project_id, supplier_id, currency_id, invoice_date):
+        """
+        Returns the summary key of an invoice, the month is the first day
+        of the invoice date's month.
+        """
+        month = invoice_date.replace(day=1) if invoice_date else None
+        return (project_id, supplier_id, currency_id, month)
+
+    def update_invoices(self, pks):
+        """
+        Updates the summary rows of the invoices with the primary keys.
+        """
+        self.update_buckets([self.get_bucket(*values) for values in (
+            Invoice.objects.filter(pk__in=pks).values_list(
+                'project_id', 'supplier_id', 'currency_id', 'invoice_date'))])
+
+    def add_lines(self, bucket, item_count, amount):
+        """
+        Adds the `item_count` and `amount` of invoice items to the summary
+        row of the bucket, see `get_bucket`, without recomputing it. The row
+        is recomputed if it does not exist.
+        """
+        project_id, supplier_id, currency_id, month = bucket
+        updated = self.filter(
+            project_id=project_id, supplier_id=supplier_id,
+            currency_id=currency_id, month=month).update(
+            item_count=models.F('item_count') + item_count,
+            subtotal=models.F('subtotal') + amount,
+            total=models.F('total') + amount)
+
+        if not updated:
+            self._update_bucket(*bucket)
+
+    def update_buckets(self, buckets):
+        """
+        Recomputes the summary rows of the buckets, see `get_bucket`, from
+        only the invoices in each bucket. A row is deleted when there are no
+        invoices left in its bucket.
+        """
+        for bucket in set(buckets):
+            self._update_bucket(*bucket)
+
+    def _update_bucket(self, project_id, supplier_id, currency_id, month):
+        key = {'project_id': project_id, 'supplier_id': supplier_id,
+               'currency_id': currency_id, 'month': month}
+        invoices = Invoice.objects.filter(
+            project_id=project_id, supplier_id=supplier_id,
+            currency_id=currency_id)
+
+        if month is None:
+            invoices = invoices.filter(invoice_date__isnull=True)
+        else:
+            invoices = invoices.filter(
+                invoice_date__gte=month, invoice_date__lt=self._next_month(
+                    month))
+
+        totals = invoices.aggregate(
+            invoice_count=models.Count('pk'), credit=models.Sum('credit'),
+            shipping=models.Sum('shipping'), other=models.Sum('other'),
+            tax=models.Sum('tax'))
+
+        if not totals['invoice_count']:
+            self.filter(**key).delete()
+            return
+
+        amount_field = Invoice.objects.AMOUNT_FIELD
+        lines = InvoiceItem.objects.filter(invoice__in=invoices).aggregate(
+            item_count=models.Count('pk'),
+            subtotal=models.Sum(models.ExpressionWrapper(
+                models.F('quantity') * models.F('unit_price'),
+                output_field=amount_field)))
+        subtotal = lines['subtotal'] or Decimal(0)
+        total = (subtotal + (totals['shipping'] or 0) +
+                 (totals['other'] or 0) + (totals['tax'] or 0) -
+                 (totals['credit'] or 0))
+        defaults = {'invoice_count': totals['invoice_count'],
+                    'item_count': lines['item_count'],
+                    'subtotal': subtotal, 'total': total}
+        self.update_or_create(defaults=defaults, **key)
+
+    def _next_month(self, month):
+        if month.month == 12:
+            month = date(month.year + 1, 1, 1)
+        else:
+            month = date(month.year, month.month + 1, 1)
+
+        return month
+
+    def rebuild(self, project=None):
+        """
+        Rebuilds all the summary rows, or only the rows of the `project`.
+        Returns the number of buckets updated.
+        """
+        invoices = Invoice.objects.all()
+        rows = self.all()
+
+        if project is not None:
+            invoices = invoices.filter(project=project)
+            rows = rows.filter(project=project)
+
+        buckets = set(self.get_bucket(*values) for values in (
+            invoices.values_list('project_id', 'supplier_id', 'currency_id',
+                                 'invoice_date')))
+        buckets.update(rows.values_list(
+            'project_id', 'supplier_id', 'currency_id', 'month'))
+        self.update_buckets(buckets)
+        return len(buckets)
+
+
+@python_2_unicode_compatible
+class InvoiceSpend(models.Model):
+    """
+    The invoice amounts of a project summed by supplier, currency, and
+    month. The rows are updated when an invoice or invoice item is saved or
+    deleted, only the affected buckets are recomputed.
+    """
+    project = models.ForeignKey(
+        Project, on_delete=models.CASCADE, verbose_name=_("Project"),
+        related_name='invoice_spends', db_index=False,
+        help_text=_("The project the invoices are part of."))
+    supplier = models.ForeignKey(
+        Supplier, on_delete=models.CASCADE, verbose_name=_("Supplier"),
+        related_name='invoice_spends',
+        help_text=_("The supplier of the invoices."))
+    currency = models.ForeignKey(
+        Currency, on_delete=models.CASCADE, verbose_name=_("Currency"),
+        related_name='invoice_spends',
+        help_text=_("The currency of the invoices."))
+    month = models.DateField(
+        verbose_name=_("Month"), null=True, blank=True,
+        help_text=_("The first day of the invoice month, empty for the "
+                    "invoices without a date."))
+    invoice_count = models.PositiveIntegerField(
+        verbose_name=_("Invoice Count"), default=0,
+        help_text=_("Number of invoices."))
+    item_count = models.PositiveIntegerField(
+        verbose_name=_("Item Count"), default=0,
+        help_text=_("Number of invoice items."))
+    subtotal = models.DecimalField(
+        verbose_name=_("Subtotal"), max_digits=20, decimal_places=4,
+        default=0, help_text=_("Sum of the invoice items' amounts."))
+    total = models.DecimalField(
+        verbose_name=_("Total"), max_digits=20, decimal_places=4,
+        default=0, help_text=_("Sum of the invoice totals."))
+
+    objects = InvoiceSpendManager()
+
+    def __str__(self):
+        return "{} {} ({})".format(self.supplier.name, self.month,
+                                   self.currency.alphabetic_code)
+
+    class Meta:
+        unique_together = ('project', 'supplier', 'currency', 'month',)
+        ordering = ('-month', 'supplier__name',)
+        verbose_name = _("Invoice Spend")
+        verbose_name_plural = _("Invoice Spends")
+
+
 #
 # post_save Items
 #
@@ -369,8 +1167,7 @@ def create_item_post_save(sender, **kwargs):
                 instance.item.save()
             else:
                 try:
-                    name = dcolumn_manager.get_collection_name('item')
-                    cc = ColumnCollection.objects.get(related_model=name)
+                    cc = Item.objects.get_column_collection()
                 except ColumnCollection.DoesNotExist as e:
                     msg = _("ColumnCollection objects does not exist for "
                             "'item'")
@@ -388,6 +1185,200 @@ def create_item_post_save(sender, **kwargs):
                     item = Item(**kwargs)
                     item.save()
                     instance.item = item
-                    instance.save()
+                    instance.save(update_fields=['item'])
         else:
             instance.item.delete()
+
+
+@receiver(post_save, sender=ColumnCollection)
+@receiver(post_delete, sender=ColumnCollection)
+def invalidate_item_column_collection(sender, **kwargs):
+    """
+    Invalidate the cached item ColumnCollection.
+    """
+    Item.objects.invalidate_column_collection()
+
+
+#
+# Item search index signals
+#
+@receiver(post_save, sender=Item)
+def update_item_search_index(sender, **kwargs):
+    """
+    Rebuild the search index row of the saved item.
+    """
+    instance = kwargs.get('instance')
+
+    if instance and not kwargs.get('raw', False):
+        ItemSearchIndex.objects.update_items([instance.pk])
+
+
+@receiver(m2m_changed, sender=Item.categories.through)
+@receiver(m2m_changed, sender=Item.location_codes.through)
+def update_item_search_index_relations(sender, **kwargs):
+    """
+    Rebuild the search index rows and mark updated the items whose
+    categories or location codes were changed through the related managers.
+    """
+    action = kwargs.get('action')
+    instance = kwargs.get('instance')
+
+    if action == 'pre_clear' and kwargs.get('reverse'):
+        # The cleared items are only known before the clear.
+        instance._search_item_pks = list(instance.items.values_list(
+            'pk', flat=True))
+    elif action in ('post_add', 'post_remove', 'post_clear'):
+        pks = ()
+
+        if not kwargs.get('reverse'):
+            pks = [instance.pk]
+        elif kwargs.get('pk_set'):
+            pks = kwargs.get('pk_set')
+        elif action == 'post_clear':
+            pks = getattr(instance, '_search_item_pks', ())
+
+        if pks:
+            ItemSearchIndex.objects.update_items(pks)
+            Item.objects.mark_updated(pks)
+
+
+@receiver(post_save, sender=Supplier)
+def update_item_search_index_supplier(sender, **kwargs):
+    """
+    Rebuild the search index rows of the items made by a renamed
+    manufacturer.
+    """
+    instance = kwargs.get('instance')
+
+    if instance and not kwargs.get('created', False):
+        ItemSearchIndex.objects.update_manufacturer_items(instance)
+
+
+@receiver(child_paths_updated, sender=Category)
+@receiver(child_paths_updated, sender=LocationCode)
+def update_item_search_index_path(sender, **kwargs):
+    """
+    Rebuild the search index rows of the items in a renamed or moved
+    category or location code tree. The descendants' paths are rewritten
+    in bulk so the items of the whole tree are rebuilt.
+    """
+    instance = kwargs.get('instance')
+
+    if instance:
+        field = ('categories' if sender is Category
+                 else 'location_codes')
+        ItemSearchIndex.objects.update_tree_items(field, instance)
+
+
+@receiver(pre_delete, sender=Category)
+@receiver(pre_delete, sender=LocationCode)
+def collect_item_search_index_delete(sender, **kwargs):
+    """
+    Keep the items of a deleted category or location code, their relations
+    are deleted with it.
+    """
+    instance = kwargs.get('instance')
+
+    if instance and not in_bulk_delete(sender):
+        instance._search_item_pks = list(instance.items.values_list(
+            'pk', flat=True))
+
+
+@receiver(post_delete, sender=Category)
+@receiver(post_delete, sender=LocationCode)
+def update_item_search_index_delete(sender, **kwargs):
+    """
+    Remove the path of a deleted category or location code from the search
+    index rows of its items and mark the items updated, their relations
+    were deleted without saving them.
+    """
+    instance = kwargs.get('instance')
+
+    if instance and getattr(instance, '_search_item_pks', None):
+        ItemSearchIndex.objects.update_items(instance._search_item_pks)
+        Item.objects.mark_updated(instance._search_item_pks)
+
+
+@receiver(pre_bulk_delete, sender=Category)
+@receiver(pre_bulk_delete, sender=LocationCode)
+def update_item_search_index_bulk_delete(sender, **kwargs):
+    """
+    Remove the paths of the categories or location codes deleted in bulk
+    from the search index rows of their items at once and mark the items
+    updated.
+    """
+    pks = kwargs.get('pks')
+
+    if pks:
+        field = ('categories' if sender is Category
+                 else 'location_codes')
+        Item.objects.mark_updated(Item.objects.filter(
+            **{'{}__in'.format(field): pks}).values('pk'))
+        ItemSearchIndex.objects.remove_related(field, pks)
+
+
+@receiver(m2m_changed, sender=Item.shared_projects.through)
+def add_item_shared_project_tombstone(sender, **kwargs):
+    """
+    Record the items removed from a shared project through the related
+    managers for the project's delta feed.
+    """
+    action = kwargs.get('action')
+    instance = kwargs.get('instance')
+    reverse = kwargs.get('reverse')
+    pks = ()
+
+    if action == 'pre_clear':
+        # The cleared relations are only known before the clear.
+        related = (instance.shared_items if reverse
+                   else instance.shared_projects)
+        instance._tombstone_pks = list(related.values_list('pk', flat=True))
+    elif action == 'post_remove':
+        pks = kwargs.get('pk_set')
+    elif action == 'post_clear':
+        pks = getattr(instance, '_tombstone_pks', ())
+
+    if pks and reverse:
+        Tombstone.objects.add_many(Item, instance.pk, Item.objects.filter(
+            pk__in=pks).values_list('public_id', flat=True))
+    elif pks:
+        for project_id in pks:
+            Tombstone.objects.add(instance, project_id)
+
+
+@receiver(post_delete, sender=Item)
+def add_item_tombstone(sender, **kwargs):
+    """
+    Record the deleted item for the delta feed.
+    """
+    instance = kwargs.get('instance')
+
+    if instance:
+        Tombstone.objects.add(instance, instance.project_id)
+
+
+#
+# Invoice spend signals
+#
+@receiver(post_delete, sender=InvoiceItem)
+def update_invoice_spend_item(sender, **kwargs):
+    """
+    Subtract the deleted invoice item from the spend summary of its
+    invoice, the saved ones are applied in `InvoiceItem.save`.
+    """
+    instance = kwargs.get('instance')
+
+    if instance and not in_bulk_delete(sender):
+        InvoiceSpend.objects.add_lines(instance.invoice.spend_bucket, -1,
+                                       -instance.amount)
+
+
+@receiver(post_delete, sender=Invoice)
+def update_invoice_spend_delete(sender, **kwargs):
+    """
+    Update the spend summary the deleted invoice was in.
+    """
+    instance = kwargs.get('instance')
+
+    if instance:
+        InvoiceSpend.objects.update_buckets([instance.spend_bucket])
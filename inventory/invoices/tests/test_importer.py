@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+#
+# inventory/invoices/tests/test_importer.py
+#
+
+import io
+import os
+import json
+import shutil
+import tempfile
+
+from django.core.management import call_command
+
+from ..importer import ItemImporter
+from ..models import Item, ItemSearchIndex
+from .test_invoice_models import BaseInvoice
+
+
+class TestItemImporter(BaseInvoice):
+
+    def __init__(self, name):
+        super(TestItemImporter, self).__init__(name)
+
+    def setUp(self):
+        super(TestItemImporter, self).setUp()
+        self.supplier = self._create_supplier(self.project)
+        self.setup_categories()
+
+    def test_read_csv(self):
+        #self.skipTest("Temporarily skipped")
+        stream = io.StringIO(
+            "item_number,manufacturer,categories\r\n"
+            "NE555,Test Supplier,TestLevel-0|TestLevel-0>TestLevel-1\r\n"
+            "LM311,,\r\n")
+        importer = ItemImporter(self.project, self.user)
+        rows = list(importer.read(stream, ItemImporter.CSV))
+        msg = "rows: {}".format(rows)
+        self.assertEqual(len(rows), 2, msg)
+        self.assertEqual(rows[0]['categories'],
+                         ['TestLevel-0', 'TestLevel-0>TestLevel-1'], msg)
+        self.assertEqual(rows[1]['categories'], [], msg)
+
+    def test_read_json(self):
+        #self.skipTest("Temporarily skipped")
+        importer = ItemImporter(self.project, self.user)
+        items = [{'item_number': 'NE555', 'categories': 'TestLevel-0'},
+                 {'item_number': 'LM311'}]
+        # A JSON list
+        stream = io.StringIO(json.dumps(items, indent=2))
+        rows = list(importer.read(stream, ItemImporter.JSON))
+        msg = "rows: {}".format(rows)
+        self.assertEqual(len(rows), 2, msg)
+        self.assertEqual(rows[0]['categories'], ['TestLevel-0'], msg)
+        # JSON Lines
+        stream = io.StringIO("\n".join([json.dumps(item) for item in items]))
+        rows = list(importer.read(stream, ItemImporter.JSON))
+        msg = "rows: {}".format(rows)
+        self.assertEqual(len(rows), 2, msg)
+        self.assertEqual(rows[1]['item_number'], 'LM311', msg)
+
+    def test_run(self):
+        #self.skipTest("Temporarily skipped")
+        rows = [{'item_number': 'NE{}'.format(idx),
+                 'categories': ['TestLevel-0']} for idx in range(7)]
+        rows[5]['manufacturer'] = "Bad Supplier"
+        importer = ItemImporter(self.project, self.user, chunk_size=3)
+        report = importer.run(iter(rows))
+        msg = "report: {}".format(report)
+        self.assertEqual(report['rows'], 7, msg)
+        self.assertEqual(report['created'], 6, msg)
+        self.assertEqual(list(report['errors']), [6], msg)
+        self.assertEqual(Item.objects.filter(
+            categories__name='TestLevel-0').count(), 6, msg)
+
+    def test_import_items_command(self):
+        #self.skipTest("Temporarily skipped")
+        tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp_dir)
+        filename = os.path.join(tmp_dir, 'items.csv')
+        report = os.path.join(tmp_dir, 'report.json')
+
+        with io.open(filename, 'w', encoding='utf-8') as f:
+            f.write("item_number,manufacturer,quantity\n"
+                    "NE555,Test Supplier,5\n"
+                    "LM311,Bad Supplier,1\n")
+
+        call_command('import_items', filename,
+                     '--project', self.project.public_id,
+                     '--user', self.user.username, '--report', report,
+                     stdout=io.StringIO())
+
+        with io.open(report, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+
+        msg = "report: {}".format(data)
+        self.assertEqual(data['created'], 1, msg)
+        self.assertEqual(list(data['errors']), ['2'], msg)
+        item = Item.objects.get(item_number='NE555')
+        self.assertEqual(item.manufacturer, self.supplier, msg)
+        self.assertEqual(item.quantity, 5, msg)
+
+    def test_rebuild_item_search_command(self):
+        #self.skipTest("Temporarily skipped")
+        items, errors = Item.objects.bulk_import_items(
+            self.project, self.user, [{'item_number': 'NE555'},
+                                      {'item_number': 'LM311'}])
+        ItemSearchIndex.objects.all().delete()
+        stdout = io.StringIO()
+        call_command('rebuild_item_search', '--project',
+                     self.project.public_id, '--chunk-size', '1',
+                     stdout=stdout)
+        msg = "stdout: {}".format(stdout.getvalue())
+        self.assertEqual(ItemSearchIndex.objects.count(), 2, msg)
+        self.assertTrue("of 2 items" in stdout.getvalue(), msg)
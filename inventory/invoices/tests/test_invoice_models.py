@@ -3,16 +3,25 @@
 # inventory/invoices/tests/test_invoice_models.py
 #
 
+import string
+from datetime import date
+from decimal import Decimal
+
 from django.core.exceptions import ValidationError
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 
-from dcolumn.dcolumns.models import ColumnCollection
+from dcolumn.dcolumns.models import CollectionBase, ColumnCollection
 
 from inventory.categories.models import Category
+from inventory.common import KeyBlockAllocator, generate_public_keys
+from inventory.common.key_generator import KeyGenerator
 from inventory.common.tests.base_tests import BaseTest
 from inventory.locations.models import LocationSetName
 from inventory.projects.models import Project
 
-from ..models import Condition, Item, Invoice, InvoiceItem
+from ..models import (
+    Condition, Item, ItemSearchIndex, Invoice, InvoiceItem, InvoiceSpend)
 
 
 class TestCondition(BaseTest):
@@ -237,6 +246,250 @@ class TestItem(BaseInvoice):
         msg = "Found: {} codes, should be 1".format(shared_projects.count())
         self.assertEqual(shared_projects.count(), 1, msg)
 
+    def test_bulk_import_items(self):
+        """
+        Test that items are imported with their relations and that invalid
+        rows are reported.
+        """
+        #self.skipTest("Temporarily skipped")
+        code_1, code_2, code_3 = self.setup_locations()
+        categories = self.setup_categories()
+        supplier = self._create_supplier(self.project)
+        project_1 = self._create_project(
+            self.inventory_type, name="Test Project_1")
+        rows = [
+            {'item_number': 'NE555', 'quantity': '10',
+             'manufacturer': supplier.name,
+             'categories': ['TestLevel-0>TestLevel-1>TestLevel-2'],
+             'location_codes': [code_1.path, code_2.path],
+             'shared_projects': [project_1.public_id]},
+            {'item_number': 'LM311', 'purge': 'true'},
+            {'item_number': 'UA1489', 'manufacturer': "Bad Supplier"},
+            {'item_number': 'LM393D', 'categories': ['Bad>Category']},
+            {'item_number': 'UA1488', 'quantity': 'ten'},
+            ]
+        items, errors = Item.objects.bulk_import_items(
+            self.project, self.user, rows, column_collection=self.collection)
+        msg = "items: {}, errors: {}".format(items, errors)
+        self.assertEqual([item.item_number for item in items],
+                         ['NE555', 'LM311'], msg)
+        self.assertEqual(sorted(errors), [3, 4, 5], msg)
+        item = Item.objects.get(item_number='NE555')
+        self.assertEqual(item.quantity, 10, msg)
+        self.assertEqual(item.manufacturer, supplier, msg)
+        self.assertTrue(item.public_id and item.sku, msg)
+        self.assertEqual(
+            list(item.categories.values_list('name', flat=True)),
+            ['TestLevel-2'], msg)
+        self.assertEqual(item.location_codes.count(), 2, msg)
+        self.assertEqual(list(item.shared_projects.all()), [project_1], msg)
+        item = Item.objects.get(item_number='LM311')
+        self.assertTrue(item.purge, msg)
+        self.assertEqual(item.categories.count(), 0, msg)
+
+    def test_sku_collision_rate(self):
+        """
+        Benchmark the SKU collision rate in a crowded key domain, every SKU
+        must still be unique in the project.
+        """
+        #self.skipTest("Temporarily skipped")
+        domain = string.digits
+        generator = lambda count: [KeyGenerator(2).generate(domain=domain)
+                                   for i in range(count)]
+        allocators = (
+            KeyBlockAllocator(Item.objects.all(), 'public_id',
+                              generate_public_keys),
+            KeyBlockAllocator(Item.objects.filter(project=self.project),
+                              'sku', generator, block_size=10,
+                              max_attempts=100))
+
+        for chunk in range(8):
+            rows = [{'item_number': "NE{}{}".format(chunk, idx)}
+                    for idx in range(10)]
+            items, errors = Item.objects.bulk_import_items(
+                self.project, self.user, rows,
+                column_collection=self.collection, allocators=allocators)
+
+        skus = list(Item.objects.values_list('sku', flat=True))
+        allocator = allocators[1]
+        msg = "generated: {}, collisions: {}, rate: {:.2f}".format(
+            allocator.generated, allocator.collisions,
+            allocator.collision_rate)
+        self.assertEqual(len(skus), 80, msg)
+        self.assertEqual(len(set(skus)), 80, msg)
+        self.assertTrue(allocator.collision_rate > 0, msg)
+
+
+class TestItemSearchIndex(BaseInvoice):
+
+    def __init__(self, name):
+        super(TestItemSearchIndex, self).__init__(name)
+
+    def setUp(self):
+        super(TestItemSearchIndex, self).setUp()
+        self.supplier = self._create_supplier(self.project)
+
+    def _search(self, query):
+        items = ItemSearchIndex.objects.search(Item.objects.all(), query)
+        return [item.item_number for item in items]
+
+    def test_update_on_save(self):
+        """
+        Test that the index row is created and updated with the item.
+        """
+        #self.skipTest("Temporarily skipped")
+        item = self._create_item(self.project, self.collection, "NE555",
+                                 description="Precision Timer",
+                                 manufacturer=self.supplier)
+        index = ItemSearchIndex.objects.get(item=item)
+        msg = "codes: {}, names: {}, description: {}".format(
+            index.codes, index.names, index.description)
+        self.assertEqual(index.codes, "{}\nne555".format(item.sku.lower()),
+                         msg)
+        self.assertEqual(index.names, "test supplier", msg)
+        self.assertEqual(index.description, "precision timer", msg)
+        item.item_number = "LM311"
+        item.save()
+        index = ItemSearchIndex.objects.get(item=item)
+        msg = "codes: {}".format(index.codes)
+        self.assertTrue("lm311" in index.codes, msg)
+        self.assertFalse("ne555" in index.codes, msg)
+
+    def test_update_relations(self):
+        """
+        Test that the category and location code paths are indexed and kept
+        current when they are changed, renamed, or deleted.
+        """
+        #self.skipTest("Temporarily skipped")
+        item = self._create_item(self.project, self.collection, "NE555")
+        code_1, code_2, code_3 = self.setup_locations()
+        categories = self.setup_categories()
+        cat_0 = categories[0][0] # 'TestLevel-0'
+        cat_2 = categories[0][1][0][1] # 'TestLevel-2'
+        item.process_categories([cat_2])
+        item.process_location_codes([code_1])
+        names = ItemSearchIndex.objects.get(item=item).names
+        msg = "names: {}".format(names)
+        self.assertTrue(cat_2.path.lower() in names, msg)
+        self.assertTrue(code_1.path.lower() in names, msg)
+        # Renaming a parent rewrites the descendant paths in bulk.
+        cat_0.name = "Renamed"
+        cat_0.save()
+        names = ItemSearchIndex.objects.get(item=item).names
+        msg = "names: {}".format(names)
+        self.assertTrue("renamed>testlevel-1>testlevel-2" in names, msg)
+        # A shorter name is contained in the old paths.
+        cat_0.name = "Rename"
+        cat_0.save()
+        names = ItemSearchIndex.objects.get(item=item).names
+        msg = "names: {}".format(names)
+        self.assertTrue("rename>testlevel-1>testlevel-2" in names, msg)
+        self.assertFalse("renamed" in names, msg)
+        # Removing through the related manager.
+        item.location_codes.remove(code_1)
+        names = ItemSearchIndex.objects.get(item=item).names
+        msg = "names: {}".format(names)
+        self.assertFalse(code_1.path.lower() in names, msg)
+        # Deleting the category.
+        path = cat_2.path.lower()
+        cat_2.delete()
+        names = ItemSearchIndex.objects.get(item=item).names
+        msg = "names: {}".format(names)
+        self.assertFalse(path in names, msg)
+
+    def test_update_supplier(self):
+        """
+        Test that renaming a manufacturer updates the index.
+        """
+        #self.skipTest("Temporarily skipped")
+        item = self._create_item(self.project, self.collection, "NE555",
+                                 manufacturer=self.supplier)
+        self.supplier.name = "Signetics"
+        self.supplier.save()
+        names = ItemSearchIndex.objects.get(item=item).names
+        msg = "names: {}".format(names)
+        self.assertEqual(names, "signetics", msg)
+        # A shorter name is contained in the old name.
+        self.supplier.name = "Signet"
+        self.supplier.save()
+        names = ItemSearchIndex.objects.get(item=item).names
+        msg = "names: {}".format(names)
+        self.assertEqual(names, "signet", msg)
+
+    def test_bulk_delete(self):
+        """
+        Test that the paths of the categories and location codes deleted in
+        bulk are removed from the index rows of their items only.
+        """
+        #self.skipTest("Temporarily skipped")
+        item = self._create_item(self.project, self.collection, "NE555")
+        item_1 = self._create_item(self.project, self.collection, "LM311")
+        code_1, code_2, code_3 = self.setup_locations()
+        categories = self.setup_categories()
+        cat_2 = categories[0][1][0][1] # 'TestLevel-2'
+        cat_2a = categories[0][1][1][1] # 'TestLevel-2a'
+        item.process_categories([cat_2a])
+        item.process_location_codes([code_1])
+        item_1.process_categories([cat_2])
+        Category.objects.delete_category_tree(self.project, cat_2a)
+        names = ItemSearchIndex.objects.get(item=item).names
+        msg = "names: {}".format(names)
+        self.assertFalse("testlevel-2a" in names, msg)
+        self.assertTrue(code_1.path.lower() in names, msg)
+        names = ItemSearchIndex.objects.get(item=item_1).names
+        msg = "names: {}".format(names)
+        self.assertTrue(cat_2.path.lower() in names, msg)
+        LocationSetName.objects.delete_set_name_tree(
+            self.project, code_1.location_format.location_set_name,
+            self.user)
+        names = ItemSearchIndex.objects.get(item=item).names
+        msg = "names: {}".format(names)
+        self.assertEqual(names, "", msg)
+
+    def test_bulk_import_items(self):
+        """
+        Test that the bulk imported items are indexed.
+        """
+        #self.skipTest("Temporarily skipped")
+        self.setup_categories()
+        rows = [{'item_number': 'NE555', 'categories': ['TestLevel-0']},
+                {'item_number': 'LM311', 'description': "Comparator"}]
+        items, errors = Item.objects.bulk_import_items(
+            self.project, self.user, rows, column_collection=self.collection)
+        msg = "errors: {}".format(errors)
+        self.assertEqual(ItemSearchIndex.objects.count(), 2, msg)
+        self.assertEqual(self._search("testlevel-0"), ['NE555'], msg)
+        self.assertEqual(self._search("comparator"), ['LM311'], msg)
+
+    def test_search(self):
+        """
+        Test that every word must match and the SKU and item number matches
+        are ranked first.
+        """
+        #self.skipTest("Temporarily skipped")
+        self._create_item(self.project, self.collection, "NE555",
+                          description="Timer, replaces the LM555")
+        self._create_item(self.project, self.collection, "LM555",
+                          description="Timer")
+        self._create_item(self.project, self.collection, "LM311",
+                          description="Comparator",
+                          manufacturer=self.supplier)
+        result = self._search("timer")
+        msg = "result: {}".format(result)
+        self.assertEqual(sorted(result), ['LM555', 'NE555'], msg)
+        result = self._search("LM555")
+        msg = "result: {}".format(result)
+        self.assertEqual(result, ['LM555', 'NE555'], msg)
+        result = self._search("comparator test supplier")
+        msg = "result: {}".format(result)
+        self.assertEqual(result, ['LM311'], msg)
+        result = self._search("timer comparator")
+        msg = "result: {}".format(result)
+        self.assertEqual(result, [], msg)
+        result = self._search("  ")
+        msg = "result: {}".format(result)
+        self.assertEqual(len(result), 3, msg)
+
 
 class TestInvoice(BaseInvoice):
 
@@ -263,6 +516,261 @@ class TestInvoice(BaseInvoice):
         msg = "__str__ name: {}, object name: {}".format(inv, sup_inv)
         self.assertEqual(inv, sup_inv, msg)
 
+    def test_annotate_totals(self):
+        """
+        Test that the subtotal, total, and item count are annotated.
+        """
+        #self.skipTest("Temporarily skipped")
+        invoice = self._create_invoice(
+            self.project, self.currency, self.supplier, "TEST123456",
+            shipping=Decimal('5.00'), tax=Decimal('1.50'),
+            credit=Decimal('2.00'))
+        empty = self._create_invoice(
+            self.project, self.currency, self.supplier, "TEST654321")
+        self._create_invoice_item(invoice, "NE555", 10, Decimal('0.25'))
+        self._create_invoice_item(invoice, "LM311", 2, Decimal('1.10'))
+        invoices = Invoice.objects.annotate_totals()
+        # Filtering on the invoice items does not change the totals.
+        obj = invoices.filter(invoice_items__item_number='NE555').get()
+        msg = "item_count: {}, subtotal: {}, total: {}".format(
+            obj.item_count, obj.subtotal, obj.total)
+        self.assertEqual(obj.item_count, 2, msg)
+        self.assertEqual(obj.subtotal, Decimal('4.70'), msg)
+        self.assertEqual(obj.total, Decimal('9.20'), msg)
+        obj = invoices.get(pk=empty.pk)
+        msg = "item_count: {}, subtotal: {}, total: {}".format(
+            obj.item_count, obj.subtotal, obj.total)
+        self.assertEqual(obj.item_count, 0, msg)
+        self.assertEqual(obj.subtotal, 0, msg)
+        self.assertEqual(obj.total, 0, msg)
+
+    def test_invoice_spend(self):
+        """
+        Test that the spend summary follows the invoice and invoice item
+        changes.
+        """
+        #self.skipTest("Temporarily skipped")
+        invoice_0 = self._create_invoice(
+            self.project, self.currency, self.supplier, "TEST0",
+            invoice_date=date(2017, 3, 5), shipping=Decimal('5.00'))
+        invoice_1 = self._create_invoice(
+            self.project, self.currency, self.supplier, "TEST1",
+            invoice_date=date(2017, 3, 28))
+        self._create_invoice_item(invoice_0, "NE555", 10, Decimal('0.25'))
+        item = self._create_invoice_item(invoice_1, "LM311", 2,
+                                         Decimal('1.10'))
+        spend = InvoiceSpend.objects.get()
+        msg = "month: {}, invoices: {}, items: {}, total: {}".format(
+            spend.month, spend.invoice_count, spend.item_count, spend.total)
+        self.assertEqual(spend.month, date(2017, 3, 1), msg)
+        self.assertEqual(spend.invoice_count, 2, msg)
+        self.assertEqual(spend.item_count, 2, msg)
+        self.assertEqual(spend.subtotal, Decimal('4.70'), msg)
+        self.assertEqual(spend.total, Decimal('9.70'), msg)
+        # Moving an invoice to another month updates both months.
+        invoice_1.invoice_date = date(2017, 4, 1)
+        invoice_1.save()
+        result = list(InvoiceSpend.objects.values_list(
+            'month', 'invoice_count', 'total'))
+        msg = "result: {}".format(result)
+        self.assertEqual(result, [(date(2017, 4, 1), 1, Decimal('2.20')),
+                                  (date(2017, 3, 1), 1, Decimal('7.50'))],
+                         msg)
+        # Deleting the invoice items and invoices.
+        item.delete()
+        spend = InvoiceSpend.objects.get(month=date(2017, 4, 1))
+        msg = "items: {}, total: {}".format(spend.item_count, spend.total)
+        self.assertEqual(spend.item_count, 0, msg)
+        self.assertEqual(spend.total, 0, msg)
+        invoice_0.delete()
+        result = list(InvoiceSpend.objects.values_list('month', flat=True))
+        msg = "result: {}".format(result)
+        self.assertEqual(result, [date(2017, 4, 1)], msg)
+        # Rebuilding gives the same result.
+        InvoiceSpend.objects.all().delete()
+        InvoiceSpend.objects.rebuild(self.project)
+        result = list(InvoiceSpend.objects.values_list(
+            'month', 'invoice_count', 'total'))
+        msg = "result: {}".format(result)
+        self.assertEqual(result, [(date(2017, 4, 1), 1, 0)], msg)
+
+    def test_invoice_spend_items(self):
+        """
+        Test that the invoice item changes are applied to the spend summary
+        and that deleting an invoice does not recompute it for every line.
+        """
+        #self.skipTest("Temporarily skipped")
+        invoice_0 = self._create_invoice(
+            self.project, self.currency, self.supplier, "TEST0",
+            invoice_date=date(2017, 3, 5))
+        invoice_1 = self._create_invoice(
+            self.project, self.currency, self.supplier, "TEST1",
+            invoice_date=date(2017, 4, 5))
+        item = self._create_invoice_item(invoice_0, "NE555", 10,
+                                         Decimal('0.25'))
+        item.quantity = 20
+        item.save()
+        spend = InvoiceSpend.objects.get(month=date(2017, 3, 1))
+        msg = "items: {}, total: {}".format(spend.item_count, spend.total)
+        self.assertEqual(spend.item_count, 1, msg)
+        self.assertEqual(spend.total, Decimal('5.00'), msg)
+        # Moving the invoice item to another invoice updates both months.
+        item.invoice = invoice_1
+        item.save()
+        result = list(InvoiceSpend.objects.values_list(
+            'month', 'item_count', 'total'))
+        msg = "result: {}".format(result)
+        self.assertEqual(result, [(date(2017, 4, 1), 1, Decimal('5.00')),
+                                  (date(2017, 3, 1), 0, 0)], msg)
+        counts = []
+
+        for num, size in enumerate((2, 20)):
+            invoice = self._create_invoice(
+                self.project, self.currency, self.supplier,
+                "TEST{}".format(num + 2), invoice_date=date(2017, 3, 5))
+
+            for idx in range(size):
+                self._create_invoice_item(invoice, "NE{}".format(idx), 1,
+                                          Decimal('0.25'))
+
+            with CaptureQueriesContext(connection) as ctx:
+                invoice.delete()
+
+            counts.append(len(ctx))
+
+        msg = "Queries with 2 items: {}, with 20 items: {}".format(*counts)
+        self.assertEqual(counts[0], counts[1], msg)
+        result = list(InvoiceSpend.objects.values_list(
+            'month', 'invoice_count', 'item_count', 'total'))
+        msg = "result: {}".format(result)
+        self.assertEqual(result, [(date(2017, 4, 1), 1, 1, Decimal('5.00')),
+                                  (date(2017, 3, 1), 1, 0, 0)], msg)
+
+
+class TestInvoiceBulk(BaseInvoice):
+
+    def __init__(self, name):
+        super(TestInvoiceBulk, self).__init__(name)
+
+    def setUp(self):
+        super(TestInvoiceBulk, self).setUp()
+        self.country = self._create_country()
+        self.currency = self._create_currency(
+            self.country, "US Dollar", "USD", 840, 2)
+        self.supplier = self._create_supplier(self.project)
+
+    def _bulk_create_invoice(self, invoice_number, lines):
+        return Invoice.objects.bulk_create_invoice(
+            self.user, lines, project=self.project, currency=self.currency,
+            supplier=self.supplier, invoice_number=invoice_number,
+            invoice_date=date(2017, 3, 5))
+
+    def test_bulk_create_invoice(self):
+        """
+        Test that the invoice items and their items are created the same as
+        with single saves.
+        """
+        #self.skipTest("Temporarily skipped")
+        lines = [{'item_number': 'NE555', 'description': "Timer",
+                  'quantity': 10, 'unit_price': Decimal('0.25')},
+                 {'item_number': 'LM311', 'quantity': 2,
+                  'unit_price': Decimal('1.10'), 'process': False}]
+        invoice = self._bulk_create_invoice("TEST0", lines)
+        invoice_items = list(invoice.invoice_items.order_by('pk'))
+        msg = "invoice items: {}".format(invoice_items)
+        self.assertEqual(len(invoice_items), 2, msg)
+        self.assertTrue(all(obj.public_id for obj in invoice_items), msg)
+        self.assertEqual(invoice_items[1].item, None, msg)
+        item = invoice_items[0].item
+        self.assertEqual(item.project, self.project, msg)
+        self.assertEqual(item.item_number, 'NE555', msg)
+        self.assertEqual(item.description, "Timer", msg)
+        self.assertEqual(item.quantity, 10, msg)
+        self.assertEqual(item.creator, self.user, msg)
+        self.assertTrue(item.public_id and item.sku, msg)
+        spend = InvoiceSpend.objects.get()
+        msg = "invoices: {}, items: {}, total: {}".format(
+            spend.invoice_count, spend.item_count, spend.total)
+        self.assertEqual(spend.item_count, 2, msg)
+        self.assertEqual(spend.total, Decimal('4.70'), msg)
+
+    def test_bulk_create_invoice_invalid(self):
+        """
+        Test that nothing is written when a line is invalid.
+        """
+        #self.skipTest("Temporarily skipped")
+        lines = [{'item_number': 'NE555', 'unit_price': Decimal('0.25')},
+                 {'item_number': 'LM311', 'unit_price': 'bad'}]
+
+        with self.assertRaises(ValidationError) as cm:
+            self._bulk_create_invoice("TEST0", lines)
+
+        msg = "Exception: {}".format(cm.exception)
+        self.assertTrue("Line 2" in str(cm.exception), msg)
+        self.assertEqual(Invoice.objects.count(), 0, msg)
+        self.assertEqual(Item.objects.count(), 0, msg)
+
+    def test_bulk_create_invoice_query_count(self):
+        """
+        Test that the number of queries does not grow with the number of
+        invoice items.
+        """
+        #self.skipTest("Temporarily skipped")
+        # The first invoice also creates the spend summary row.
+        self._bulk_create_invoice("TEST", [
+            {'item_number': 'NE555', 'unit_price': Decimal('0.25')}])
+        counts = []
+
+        for num, size in enumerate((5, 50)):
+            lines = [{'item_number': "NE{}".format(idx), 'quantity': 1,
+                      'unit_price': Decimal('0.25'), 'process': False}
+                     for idx in range(size)]
+
+            with CaptureQueriesContext(connection) as ctx:
+                self._bulk_create_invoice("TEST{}".format(num), lines)
+
+            counts.append(len(ctx))
+
+        msg = "Queries with 5 lines: {}, with 50 lines: {}".format(*counts)
+        self.assertEqual(counts[0], counts[1], msg)
+        self.assertEqual(InvoiceItem.objects.count(), 56, msg)
+
+
+    def test_bulk_create_invoice_query_count_process(self):
+        """
+        Test that the number of queries does not grow with the number of
+        invoice items that create items. The parent rows of the items are
+        saved one by one on databases that do not return the new primary
+        keys from a bulk insert, those inserts are not counted.
+        """
+        #self.skipTest("Temporarily skipped")
+        # The first invoice also creates the spend summary row.
+        self._bulk_create_invoice("TEST", [
+            {'item_number': 'NE555', 'unit_price': Decimal('0.25')}])
+        parent_sql = 'INSERT INTO {} '.format(connection.ops.quote_name(
+            CollectionBase._meta.db_table))
+        counts = []
+
+        for num, size in enumerate((5, 50)):
+            lines = [{'item_number': "LM{}{:03}".format(num, idx),
+                      'quantity': 1, 'unit_price': Decimal('0.25')}
+                     for idx in range(size)]
+
+            with CaptureQueriesContext(connection) as ctx:
+                self._bulk_create_invoice("TEST{}".format(num), lines)
+
+            queries = [query['sql'] for query in ctx.captured_queries]
+
+            if not connection.features.can_return_ids_from_bulk_insert:
+                queries = [sql for sql in queries
+                           if not sql.startswith(parent_sql)]
+
+            counts.append(len(queries))
+
+        msg = "Queries with 5 lines: {}, with 50 lines: {}".format(*counts)
+        self.assertEqual(counts[0], counts[1], msg)
+        self.assertEqual(Item.objects.filter(
+            item_number__startswith='LM').count(), 55, msg)
 
 class TestInvoiceItem(BaseInvoice):
 
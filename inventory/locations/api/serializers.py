@@ -217,6 +217,7 @@ class LocationCloneSerializer(SerializerMixin, serializers.Serializer):
     location_set_name = serializers.CharField(max_length=250)
     with_set_name = serializers.BooleanField(default=True)
     with_root = serializers.BooleanField(default=False)
+    with_codes = serializers.BooleanField(default=False)
 
     def validate_project(self, value):
         try:
@@ -247,8 +248,74 @@ class LocationCloneSerializer(SerializerMixin, serializers.Serializer):
         user = self.get_user_object()
         project = validated_data.get('project')
         location_set_name = validated_data.get('location_set_name')
+        with_codes = validated_data.get('with_codes')
         return LocationSetName.objects.clone_set_name_tree(
-            project, user, location_set_name)
+            project, user, location_set_name, with_codes=with_codes)
 
     class Meta:
         fields = ('project', 'location_set_name',)
+
+
+#
+# LocationCodeItemSerializer
+#
+class LocationCodeItemSerializer(serializers.Serializer):
+    segment = serializers.CharField(max_length=250)
+    path = serializers.CharField(max_length=1000)
+    href = serializers.HyperlinkedIdentityField(
+        view_name='location-code-detail', lookup_field='public_id')
+
+
+#
+# LocationCodeImportSerializer
+#
+class LocationCodeImportSerializer(SerializerMixin, serializers.Serializer):
+    project = serializers.CharField(max_length=30)
+    location_set_name = serializers.CharField(max_length=250)
+    codes = serializers.ListField(
+        child=serializers.CharField(max_length=1000, allow_blank=True),
+        allow_empty=False)
+
+    def validate_project(self, value):
+        try:
+            project = Project.objects.get(public_id=value)
+        except Project.DoesNotExist:
+            msg = _("A project with the {} '{}' does not exist.").format(
+                "public_id", value)
+            raise serializers.ValidationError(msg)
+        else:
+            return project
+
+    def validate(self, data):
+        project = data.get('project')
+        location_set_name = data.get('location_set_name')
+
+        try:
+            data['location_set_name'] = LocationSetName.objects.get(
+                public_id=location_set_name)
+        except LocationSetName.DoesNotExist:
+            msg = _("Location set name '{}' could not be found.").format(
+                location_set_name)
+            raise serializers.ValidationError({'location_set_name': msg})
+
+        if data['location_set_name'].project_id != project.pk:
+            msg = _("The location set '{}' is not in the '{}' project."
+                    ).format(data['location_set_name'], project)
+            raise serializers.ValidationError({'location_set_name': msg})
+
+        if not project.has_authority(self.get_user_object()):
+            msg = _("The user must have authority on the '{}' project."
+                    ).format(project)
+            raise serializers.ValidationError({'project': msg})
+
+        return data
+
+    def create(self, validated_data):
+        user = self.get_user_object()
+        location_set_name = validated_data.get('location_set_name')
+        codes = validated_data.get('codes')
+        return LocationCode.objects.bulk_create_codes(
+            location_set_name, codes, user)
+
+    class Meta:
+        fields = ('project', 'location_set_name', 'codes',)
@@ -4,8 +4,10 @@
 #
 
 import random
+from datetime import timedelta
 
 from django.contrib.auth import get_user_model
+from django.utils import timezone
 
 from rest_framework.reverse import reverse
 from rest_framework import status
@@ -1212,6 +1214,32 @@ class TestLocationCodeAPI(BaseTest):
             })
 
 
+    def test_GET_location_code_delta(self):
+        """
+        Test that the location code delta feed returns the changed and
+        deleted location codes.
+        """
+        #self.skipTest("Temporarily skipped")
+        code_0 = self._create_location_code(self.location_format, 'A01')
+        code_1 = self._create_location_code(self.location_format, 'A02')
+        LocationCode.objects.update(
+            updated=timezone.now() - timedelta(days=1))
+        since = (timezone.now() - timedelta(hours=1)).isoformat()
+        code_1.segment = 'A03'
+        code_1.save()
+        public_id = code_0.public_id
+        code_0.delete()
+        uri = reverse('location-code-delta')
+        data = {'updated_since': since, 'project': self.project.public_id}
+        response = self.client.get(uri, data=data, format='json',
+                                   **self._HEADERS)
+        msg = "Response: {} should be {}, content: {}".format(
+            response.status_code, status.HTTP_200_OK, response.data)
+        self.assertEqual(response.status_code, status.HTTP_200_OK, msg)
+        found = [item['segment'] for item in response.data['results']]
+        self.assertEqual(found, ['A03'], msg)
+        self.assertEqual(response.data['deleted'], [public_id], msg)
+
 class TestLocationSetNameCloneAPI(BaseTest):
 
     def __init__(self, name):
@@ -1310,6 +1338,31 @@ class TestLocationSetNameCloneAPI(BaseTest):
                ).format(response.data, len(response.data))
         self.assertEqual(len(response.data), 3, msg)
 
+    def test_POST_location_clone_with_codes(self):
+        """
+        Test the location_clone endpoint copies the location codes.
+        """
+        #self.skipTest("Temporarily skipped")
+        location_code = self._create_location_code(self.location_format, "A01")
+        project = self._create_project(self.in_type, name="Test Project_1")
+        uri = reverse('location-clone')
+        data = {}
+        data['location_set_name'] = self.location_set_name.public_id
+        data['project'] = project.public_id
+        data['with_codes'] = True
+        response = self.client.post(uri, data=data, format='json',
+                                    **self._HEADERS)
+        msg = "Response: {} should be {}, content: {}".format(
+            response.status_code, status.HTTP_201_CREATED, response.data)
+        self.assertEqual(
+            response.status_code, status.HTTP_201_CREATED, msg)
+        paths = [item['path'] for item in response.data if 'path' in item]
+        self.assertEqual(paths, ['#', '#:A01'], msg)
+        codes = LocationCode.objects.filter(
+            location_format__location_set_name__project=project)
+        msg = "Found {} location codes, should be 2.".format(codes.count())
+        self.assertEqual(codes.count(), 2, msg)
+
     def test_POST_location_clone_with_invalid_permissions(self):
         """
         Test the location_clone endpoint fails with invalid permissions.
@@ -1618,3 +1671,66 @@ class TestLocationSetNameCloneAPI(BaseTest):
         self._test_errors(response, tests={
             'location_set_name': "Location set name 'junk' could not be found."
             })
+
+
+class TestLocationCodeImportAPI(BaseTest):
+
+    def __init__(self, name):
+        super(TestLocationCodeImportAPI, self).__init__(name)
+
+    def setUp(self):
+        super(TestLocationCodeImportAPI, self).setUp()
+        # Create an InventoryType and Project.
+        self.in_type = self._create_inventory_type()
+        self.project = self._create_project(self.in_type, members=[self.user])
+        self.location_set_name = self._create_location_set_name(self.project)
+        self.location_format_0 = self._create_location_format(
+            self.location_set_name, 'A\d\d')
+        self.location_format_1 = self._create_location_format(
+            self.location_set_name, 'B\d\d', segment_order=1)
+
+    def test_POST_location_code_import(self):
+        """
+        Test that the location_code_import endpoint creates the codes and
+        reports the invalid rows.
+        """
+        #self.skipTest("Temporarily skipped")
+        uri = reverse('location-code-import')
+        data = {}
+        data['project'] = self.project.public_id
+        data['location_set_name'] = self.location_set_name.public_id
+        data['codes'] = ['A01:B01', 'A01:B02', 'A02', 'X01', 'A03:B01:B02']
+        response = self.client.post(uri, data=data, format='json',
+                                    **self._HEADERS)
+        msg = "Response: {} should be {}, content: {}".format(
+            response.status_code, status.HTTP_201_CREATED, response.data)
+        self.assertEqual(
+            response.status_code, status.HTTP_201_CREATED, msg)
+        paths = [code['path'] for code in response.data['codes']]
+        self.assertEqual(paths, ['#:A01:B01', '#:A01:B02', '#:A02'], msg)
+        self.assertEqual(sorted(response.data['errors']),
+                         ['A03:B01:B02', 'X01'], msg)
+        count = LocationCode.objects.filter(
+            location_format__location_set_name=self.location_set_name
+            ).count()
+        msg = "Found {} location codes, should be 5.".format(count)
+        self.assertEqual(count, 5, msg)
+
+    def test_POST_location_code_import_invalid_project(self):
+        """
+        Test that the location set name must be in the project.
+        """
+        #self.skipTest("Temporarily skipped")
+        project = self._create_project(self.in_type, name="Test Project_1")
+        uri = reverse('location-code-import')
+        data = {}
+        data['project'] = project.public_id
+        data['location_set_name'] = self.location_set_name.public_id
+        data['codes'] = ['A01:B01']
+        response = self.client.post(uri, data=data, format='json',
+                                    **self._HEADERS)
+        msg = "Response: {} should be {}, content: {}".format(
+            response.status_code, status.HTTP_400_BAD_REQUEST, response.data)
+        self.assertEqual(
+            response.status_code, status.HTTP_400_BAD_REQUEST, msg)
+        self.assertTrue('location_set_name' in response.data, msg)
@@ -7,7 +7,8 @@ from django.conf.urls import include, url
 
 from .views import (location_set_name_list, location_set_name_detail,
                     location_format_list, location_format_detail,
-                    location_code_list, location_code_detail, location_clone)
+                    location_code_list, location_code_detail, location_clone,
+                    location_code_import, location_code_delta)
 
 
 urlpatterns = [
@@ -24,4 +25,8 @@ urlpatterns = [
     url(r'location-codes/(?P<public_id>\w+)/$', location_code_detail,
         name='location-code-detail'),
     url(r'location-clone/$', location_clone, name='location-clone'),
+    url(r'location-code-import/$', location_code_import,
+        name='location-code-import'),
+    url(r'location-code-delta/$', location_code_delta,
+        name='location-code-delta'),
     ]
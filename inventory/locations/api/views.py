@@ -9,7 +9,8 @@ from django.contrib.auth import get_user_model
 
 from rest_framework import status
 from rest_framework.generics import (
-    ListCreateAPIView, RetrieveUpdateDestroyAPIView, GenericAPIView)
+    ListAPIView, ListCreateAPIView, RetrieveUpdateDestroyAPIView,
+    GenericAPIView)
 from rest_framework.mixins import DestroyModelMixin, CreateModelMixin
 from rest_framework.permissions import IsAuthenticated
 from rest_framework import serializers
@@ -19,17 +20,20 @@ from rest_condition import ConditionalPermission, C, And, Or, Not
 
 from inventory.common.api.permissions import (
     IsAdminSuperUser, IsAdministrator, IsProjectOwner, IsProjectManager,
-    IsProjectDefaultUser, IsUserActive, IsReadOnly)
+    IsProjectDefaultUser, IsAnyProjectUser, IsUserActive, IsReadOnly,
+    get_project_ids)
 from inventory.common.api.pagination import SmallResultsSetPagination
 from inventory.common.api.view_mixins import (
-    TrapDjangoValidationErrorCreateMixin, TrapDjangoValidationErrorUpdateMixin)
+    TrapDjangoValidationErrorCreateMixin, TrapDjangoValidationErrorUpdateMixin,
+    ConditionalGetMixin, DeltaFeedMixin)
 
 from ..models import LocationSetName, LocationFormat, LocationCode
 
 from .serializers import (
     LocationSetNameSerializer, LocationFormatSerializer,
     LocationCodeSerializer, LocationCloneSerializer,
-    LocationSetNameItemSerializer, LocationFormatItemSerializer)
+    LocationSetNameItemSerializer, LocationFormatItemSerializer,
+    LocationCodeImportSerializer, LocationCodeItemSerializer)
 
 log = logging.getLogger('api.locations.views')
 UserModel = get_user_model()
@@ -45,7 +49,7 @@ class LocationSetNameAuthorizationMixin(object):
             self.request.user.role == UserModel.ADMINISTRATOR):
             result = LocationSetName.objects.all()
         else:
-            projects = self.request.user.projects.all()
+            projects = get_project_ids(self.request)
             result = LocationSetName.objects.select_related(
                 'project').filter(project__in=projects)
 
@@ -54,6 +58,7 @@ class LocationSetNameAuthorizationMixin(object):
 
 class LocationSetNameList(LocationSetNameAuthorizationMixin,
                           TrapDjangoValidationErrorCreateMixin,
+                          ConditionalGetMixin,
                           ListCreateAPIView):
     """
     LocationSetName list endpoint.
@@ -78,6 +83,7 @@ location_set_name_list = LocationSetNameList.as_view()
 
 class LocationSetNameDetail(LocationSetNameAuthorizationMixin,
                             TrapDjangoValidationErrorUpdateMixin,
+                            ConditionalGetMixin,
                             RetrieveUpdateDestroyAPIView):
     """
     LocationSetName detail endpoint.
@@ -109,7 +115,7 @@ class LocationFormatAuthorizationMixin(object):
             self.request.user.role == UserModel.ADMINISTRATOR):
             result = LocationFormat.objects.all()
         else:
-            projects = self.request.user.projects.all()
+            projects = get_project_ids(self.request)
             lsn = LocationSetName.objects.select_related(
                 'project').filter(project__in=projects)
             result = LocationFormat.objects.select_related(
@@ -120,6 +126,7 @@ class LocationFormatAuthorizationMixin(object):
 
 class LocationFormatList(LocationFormatAuthorizationMixin,
                          TrapDjangoValidationErrorCreateMixin,
+                         ConditionalGetMixin,
                          ListCreateAPIView):
     """
     LocationFormat list endpoint.
@@ -144,6 +151,7 @@ location_format_list = LocationFormatList.as_view()
 
 class LocationFormatDetail(LocationFormatAuthorizationMixin,
                            TrapDjangoValidationErrorUpdateMixin,
+                           ConditionalGetMixin,
                            RetrieveUpdateDestroyAPIView):
     """
     LocationFormat detail endpoint.
@@ -175,7 +183,7 @@ class LocationCodeAuthorizationMixin(object):
             self.request.user.role == UserModel.ADMINISTRATOR):
             result = LocationCode.objects.all()
         else:
-            projects = self.request.user.projects.all()
+            projects = get_project_ids(self.request)
             lsn = LocationSetName.objects.select_related(
                 'project').filter(project__in=projects)
             lf = LocationFormat.objects.select_related(
@@ -188,6 +196,7 @@ class LocationCodeAuthorizationMixin(object):
 
 class LocationCodeList(LocationCodeAuthorizationMixin,
                        TrapDjangoValidationErrorCreateMixin,
+                       ConditionalGetMixin,
                        ListCreateAPIView):
     """
     LocationCode list endpoint.
@@ -212,6 +221,7 @@ location_code_list = LocationCodeList.as_view()
 
 class LocationCodeDetail(LocationCodeAuthorizationMixin,
                          TrapDjangoValidationErrorUpdateMixin,
+                         ConditionalGetMixin,
                          RetrieveUpdateDestroyAPIView):
     """
     LocationCode detail endpoint.
@@ -233,6 +243,27 @@ class LocationCodeDetail(LocationCodeAuthorizationMixin,
 location_code_detail = LocationCodeDetail.as_view()
 
 
+class LocationCodeDelta(LocationCodeAuthorizationMixin,
+                        DeltaFeedMixin,
+                        ListAPIView):
+    """
+    LocationCode delta feed endpoint, the location codes changed since a
+    sync token.
+    """
+    serializer_class = LocationCodeSerializer
+    permission_classes = (
+        And(IsUserActive, IsAuthenticated,
+            Or(IsAdminSuperUser,
+               IsAdministrator,
+               IsAnyProjectUser
+               ),
+            ),
+        )
+    project_field = 'location_format__location_set_name__project'
+
+location_code_delta = LocationCodeDelta.as_view()
+
+
 #
 # LocationClone
 #
@@ -290,6 +321,10 @@ class LocationClone(TrapDjangoValidationErrorCreateMixin,
             if isinstance(instance, LocationSetName):
                 serializer = LocationSetNameItemSerializer(
                     instance, many=False, context={'request': request})
+            elif isinstance(instance, LocationCode):
+                serializer = LocationCodeItemSerializer(
+                    instance, many=False, context={'request': request})
+                result.append(serializer.data)
             else:
                 serializer = LocationFormatItemSerializer(
                     instance, many=False, context={'request': request})
@@ -324,3 +359,43 @@ class LocationClone(TrapDjangoValidationErrorCreateMixin,
             with_root=with_root)
 
 location_clone = LocationClone.as_view()
+
+
+#
+# LocationCodeImport
+#
+class LocationCodeImport(TrapDjangoValidationErrorCreateMixin,
+                         CreateModelMixin,
+                         GenericAPIView):
+    """
+    Creates many location codes from a list of full paths, ex. `A:01:3`.
+    Each row that could not be created is returned with its errors.
+    """
+    serializer_class = LocationCodeImportSerializer
+    permission_classes = (
+        And(IsUserActive,
+            Or(IsAdminSuperUser,
+               IsAdministrator,
+               IsProjectOwner,
+               IsProjectManager
+               ),
+            ),
+        )
+
+    def post(self, request, *args, **kwargs):
+        return self.create(request, *args, **kwargs)
+
+    def create(self, request, *args, **kwargs):
+        input_serializer = self.get_serializer(data=request.data)
+        input_serializer.is_valid(raise_exception=True)
+        # Create the location codes.
+        codes, errors = input_serializer.create(
+            input_serializer.validated_data)
+        serializer = LocationCodeItemSerializer(
+            codes, many=True, context={'request': request})
+        result = {'codes': serializer.data, 'errors': errors}
+        headers = self.get_success_headers(result)
+        return Response(result, status=status.HTTP_201_CREATED,
+                        headers=headers)
+
+location_code_import = LocationCodeImport.as_view()
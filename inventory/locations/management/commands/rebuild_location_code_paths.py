@@ -0,0 +1,42 @@
+# -*- coding: utf-8 -*-
+#
+# inventory/locations/management/commands/rebuild_location_code_paths.py
+#
+"""
+Rebuild the path, id_path, and level of the location codes. Run it once after
+upgrading a database that predates the id_path column.
+"""
+__docformat__ = "restructuredtext en"
+
+import logging
+
+from django.core.management.base import BaseCommand, CommandError
+
+from inventory.locations.models import LocationCode
+from inventory.projects.models import Project
+
+log = logging.getLogger('commands.locations.rebuild-location-code-paths')
+
+
+class Command(BaseCommand):
+    """
+    Management command for rebuilding the location code paths.
+    """
+    help = "Rebuild the location code paths of all or one project."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '-p', '--project', type=str, default='', dest='project',
+            help="The public id of the project to rebuild, defaults to all.")
+
+    def handle(self, *args, **options):
+        project = None
+
+        if options.get('project'):
+            try:
+                project = Project.objects.get(public_id=options['project'])
+            except Project.DoesNotExist as e:
+                raise CommandError(str(e))
+
+        count = LocationCode.objects.rebuild_paths(project)
+        self.stdout.write("Rebuilt {} location code paths.".format(count))
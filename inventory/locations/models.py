@@ -10,11 +10,15 @@ LocationSetName, LocationFormat, and LocationCode models.
 __docformat__ = "restructuredtext en"
 
 import logging
+from datetime import datetime
+from dateutil.tz import tzutc
 
 from django.conf import settings
 from django.core.exceptions import ValidationError
-from django.db import models
-from django.db.models.signals import pre_save, post_save
+from django.db import models, transaction
+from django.db.models import F, Max, Value
+from django.db.models.functions import Concat, Substr
+from django.db.models.signals import pre_save, post_save, post_delete
 from django.dispatch import receiver
 from django.utils.encoding import python_2_unicode_compatible
 from django.utils.safestring import mark_safe
@@ -23,7 +27,9 @@ from django.utils.translation import ugettext, ugettext_lazy as _
 from inventory.common import generate_public_key
 from inventory.common.model_mixins import (
     UserModelMixin, TimeModelMixin, ValidateOnSaveMixin,)
-from inventory.projects.models import Project
+from inventory.common.signals import (
+    child_paths_updated, bulk_delete, in_bulk_delete)
+from inventory.projects.models import Project, Tombstone
 
 from .validation import FormatValidator
 
@@ -35,12 +41,16 @@ log = logging.getLogger('inventory.locations.models')
 #
 class LocationSetNameManager(models.Manager):
 
-    def clone_set_name_tree(self, project, user, loc_set):
+    def clone_set_name_tree(self, project, user, loc_set, with_codes=False):
         """
         Gets and/or creates designated location set name with a new project,
         from the location set name provided, then creates all location formats
         as necessary. Returns a list of objects or an empty list if the new
         location set name already existed.
+
+        If `with_codes` is `True` the formats and the entire location code
+        tree are also copied using bulk inserts inside a single transaction,
+        the cloned codes are appended to the returned list.
         """
         node_list = []
 
@@ -52,24 +62,31 @@ class LocationSetNameManager(models.Manager):
             kwargs['separator'] = loc_set.separator
             kwargs['creator'] = user
             kwargs['updater'] = user
-            obj, created = self.get_or_create(
-                project=project, name=loc_set.name, defaults=kwargs)
-
-            if created:
-                node_list.append(obj)
-                kwargs = {}
-                kwargs['creator'] = user
-                kwargs['updater'] = user
-
-                for fmt_obj in loc_set.location_formats.all():
-                    kwargs['segment_order'] = fmt_obj.segment_order
-                    kwargs['description'] = fmt_obj.description
-                    node, created = LocationFormat.objects.get_or_create(
-                        location_set_name=obj,
-                        char_definition=fmt_obj.char_definition,
-                        defaults=kwargs)
-                    node_list.append(node)
-            else:
+
+            with transaction.atomic():
+                obj, created = self.get_or_create(
+                    project=project, name=loc_set.name, defaults=kwargs)
+
+                if created and with_codes:
+                    node_list.append(obj)
+                    node_list.extend(self._bulk_clone_tree(
+                        user, loc_set, obj))
+                elif created:
+                    node_list.append(obj)
+                    kwargs = {}
+                    kwargs['creator'] = user
+                    kwargs['updater'] = user
+
+                    for fmt_obj in loc_set.location_formats.all():
+                        kwargs['segment_order'] = fmt_obj.segment_order
+                        kwargs['description'] = fmt_obj.description
+                        node, junk = LocationFormat.objects.get_or_create(
+                            location_set_name=obj,
+                            char_definition=fmt_obj.char_definition,
+                            defaults=kwargs)
+                        node_list.append(node)
+
+            if not created:
                 msg = _("The '{}' record already exists, cannot clone."
                         ).format(obj)
                 log.error(msg)
@@ -83,40 +100,155 @@ class LocationSetNameManager(models.Manager):
 
         return node_list
 
+    def _bulk_clone_tree(self, user, loc_set, new_set):
+        """
+        Copies all the formats and codes of `loc_set` into `new_set`. The root
+        format and code were already created by the `set_root_objects`
+        signal, the rest are bulk inserted level by level with their parents
+        remapped to the new codes.
+        """
+        ROOT_NAME = LocationCode.ROOT_NAME
+        now = datetime.now(tzutc())
+        formats = list(loc_set.location_formats.all())
+        new_fmts = []
+
+        for fmt in formats:
+            if fmt.char_definition != ROOT_NAME:
+                node = LocationFormat(
+                    public_id=generate_public_key(), location_set_name=new_set,
+                    char_definition=fmt.char_definition,
+                    segment_length=fmt.segment_length,
+                    segment_order=fmt.segment_order,
+                    description=fmt.description, creator=user, updater=user,
+                    created=now, updated=now)
+                node.clean_fields(exclude=('location_set_name', 'creator',
+                                           'updater',))
+                new_fmts.append(node)
+
+        LocationFormat.objects.bulk_create(new_fmts)
+        new_fmts = list(new_set.location_formats.all())
+        fmt_map = {fmt.char_definition: fmt for fmt in new_fmts}
+        fmt_map = {fmt.pk: fmt_map[fmt.char_definition] for fmt in formats}
+        root_code = LocationCode.objects.get_root_code(new_set)
+        new_codes = [root_code]
+        code_map = {}
+        levels = {}
+
+        for code in LocationCode.objects.filter(
+            location_format__location_set_name=loc_set).order_by('path'):
+            if code.parent_id is None:
+                code_map[code.pk] = root_code
+            else:
+                levels.setdefault(code.level, []).append(code)
+
+        for level in sorted(levels):
+            objs = []
+
+            for code in levels[level]:
+                obj = LocationCode(
+                    public_id=generate_public_key(),
+                    location_format=fmt_map[code.location_format_id],
+                    parent=code_map[code.parent_id], segment=code.segment,
+                    path=code.path, level=code.level, creator=user,
+                    updater=user, created=now, updated=now)
+                obj.id_path = obj._get_id_path()
+                obj.clean_fields(exclude=('location_format', 'parent',
+                                          'creator', 'updater',))
+                objs.append(obj)
+
+            LocationCode.objects.bulk_create(objs)
+
+            if any(obj.pk is None for obj in objs):
+                paths = {obj.path: obj for obj in LocationCode.objects.filter(
+                    location_format__location_set_name=new_set,
+                    level=level)}
+                objs = [paths[code.path] for code in levels[level]]
+
+            code_map.update({code.pk: obj for code, obj
+                             in zip(levels[level], objs)})
+            new_codes.extend(objs)
+
+        return new_fmts + new_codes
+
     def delete_set_name_tree(self, project, loc_set, user):
         """
         Deletes the set name tree starting with any location code objects,
         continuing with location format objects, then deleting the location
         set name object itself. Since this is a full removal of an entire tree
         it will invalidate any items that used any location code objects.
+
+        The deleted paths are computed from a single query on the codes, the
+        codes are then deleted with one statement per level starting with the
+        deepest level so no cascading is needed.
         """
         deleted_nodes = []
 
-        for fmt in loc_set.location_formats.all():
-            child_nodes = []
+        with transaction.atomic():
+            formats = list(loc_set.location_formats.all())
+            codes = list(LocationCode.objects.filter(
+                location_format__location_set_name=loc_set).values_list(
+                'pk', 'parent_id', 'path', 'level', 'location_format_id',
+                'public_id'))
+            nodes = {}
+            children = {}
+
+            for pk, parent_id, path, level, fmt_id, public_id in codes:
+                nodes[pk] = (parent_id, path, fmt_id)
+                children.setdefault(parent_id, set()).add(pk)
+
+            for fmt in formats:
+                fmt_codes = [pk for pk, (parent_id, path, fmt_id)
+                             in nodes.items() if fmt_id == fmt.pk]
+                child_nodes = set()
+
+                for pk in fmt_codes:
+                    child_nodes.update(self._get_leaf_paths(
+                        pk, nodes, children))
+
+                for pk in fmt_codes:
+                    self._prune_branch(pk, nodes, children)
 
-            for code in fmt.location_codes.all():
-                child_nodes += self._recurse_children(code)
+                deleted_nodes.append([fmt.char_definition,
+                                      sorted(child_nodes)])
 
-            fmt_obj = [fmt.char_definition, child_nodes]
-            fmt.delete()
-            deleted_nodes.append(fmt_obj)
+            with bulk_delete(LocationCode, [code[0] for code in codes]):
+                for level in sorted(set([code[3] for code in codes]),
+                                    reverse=True):
+                    LocationCode.objects.filter(
+                        location_format__location_set_name=loc_set,
+                        level=level).delete()
+
+            Tombstone.objects.add_many(LocationCode, loc_set.project_id,
+                                       [code[5] for code in codes])
+
+            loc_set.location_formats.all().delete()
+            deleted_nodes.insert(0, loc_set.name)
+            loc_set.delete()
 
-        deleted_nodes.insert(0, loc_set.name)
-        loc_set.delete()
         return deleted_nodes
 
-    def _recurse_children(self, child):
-        deleted_nodes = []
+    def _get_leaf_paths(self, pk, nodes, children):
+        paths = []
 
-        for c in child.children.all():
-            if c.children.count():
-                deleted_nodes += self._recurse_children(c)
+        for child in children.get(pk, ()):
+            if children.get(child):
+                paths += self._get_leaf_paths(child, nodes, children)
             else:
-                deleted_nodes.append(c.path)
-                c.delete()
+                paths.append(nodes[child][1])
 
-        return deleted_nodes
+        return paths
+
+    def _prune_branch(self, pk, nodes, children):
+        """
+        Removes the code `pk` and all its descendants from `nodes` and
+        `children`, mirroring a cascading delete.
+        """
+        if pk in nodes:
+            for child in list(children.pop(pk, ())):
+                self._prune_branch(child, nodes, children)
+
+            parent_id = nodes.pop(pk)[0]
+            children.get(parent_id, set()).discard(pk)
 
     def get_location_set(self, project, set_name, with_set_name=True,
                          with_root=False):
@@ -330,38 +462,255 @@ class LocationCodeManager(models.Manager):
         return loc_fmt.location_codes.get(segment=self.model.ROOT_NAME)
 
     def get_parents(self, project, code):
-        sn_project = code.location_format.location_set_name.project
+        """
+        Get all the parents to this location code object. The parents are
+        found with a single query using the `id_path` ancestry index.
+        """
+        self._check_parents_project(project, code)
+        ids = code.ancestor_ids
+        nodes = self.select_related(
+            'location_format__location_set_name').in_bulk(ids)
+        return self._order_parents(ids, nodes)
+
+    def _check_parents_project(self, project, code):
+        set_name = code.location_format.location_set_name
 
-        if sn_project != project:
+        if set_name.project_id != project.pk:
             msg = _("Trying to access a location code with an invalid "
                     "project, updater: {}, updated: {}, project: {}, invalid "
                     "project: {}").format(code.updater, code.updated,
-                                          sn_project, project)
+                                          set_name.project, project)
             log.error(ugettext(msg))
             raise ValueError(msg)
 
-        parents = self._recurse_parents(code)
-        parents.reverse()
-        return parents
+    def _order_parents(self, ids, nodes):
+        return [nodes[pk] for pk in ids if pk in nodes]
+
+    def update_child_paths(self, code, old_path, old_id_path, old_level,
+                           old_set_name):
+        """
+        Rewrites the `path`, `id_path`, and `level` of all the descendants
+        of `code` after its segment or parent has changed. The old values are
+        the ones stored before the change. The descendants are validated
+        against the new parents then updated with a single statement.
+        """
+        set_name = code.location_format.location_set_name
+        old_prefix = "{}{}{}".format(old_id_path, code.pk,
+                                     code.ID_PATH_SEPARATOR)
+        children = self.filter(id_path__startswith=old_prefix)
+
+        if not children.exists():
+            return 0
+
+        if set_name.pk != old_set_name:
+            raise ValidationError({
+                'location_set_name': _("All segments must be derived from "
+                                       "the same location set name.")})
+
+        parents = self.get_parents(set_name.project, code)
+        segments = [parent.segment for parent in parents]
+        segments.append(code.segment)
+
+        if children.filter(segment__in=segments).exists():
+            raise ValidationError({
+                'parent': _("You cannot have a segment as a child to itself.")
+                })
+
+        delta = code.level - old_level
+        length = children.aggregate(level=Max('level'))['level'] + delta + 1
+        max_num_segments = set_name.location_formats.count()
+
+        if length > max_num_segments:
+            raise ValidationError({
+                'segment': _("There are more segments than defined formats, "
+                             "found: {}, allowed: {}").format(
+                    length, max_num_segments)
+                })
+
+        return children.update(
+            path=Concat(Value(code.path), Substr('path', len(old_path) + 1),
+                        output_field=models.CharField()),
+            id_path=Concat(Value(code.descendant_id_path),
+                           Substr('id_path', len(old_prefix) + 1),
+                           output_field=models.CharField()),
+            level=F('level') + delta,
+            updated=datetime.now(tzutc()))
+
+    def rebuild_paths(self, project=None):
+        """
+        Rebuilds the `path`, `id_path`, and `level` of all the location
+        codes, or only the codes of the `project`, from their parent foreign
+        keys. Databases that predate the `id_path` column need this once, see
+        the `rebuild_location_code_paths` command. Returns the number of
+        codes updated.
+        """
+        codes = self.all()
+
+        if project is not None:
+            codes = codes.filter(
+                location_format__location_set_name__project=project)
+
+        nodes = {row[0]: row for row in codes.values_list(
+            'pk', 'parent_id', 'segment', 'path', 'id_path', 'level',
+            'location_format__location_set_name__separator')}
+        sep = self.model.ID_PATH_SEPARATOR
+        count = 0
+
+        with transaction.atomic():
+            for pk, parent_id, segment, path, id_path, level, separator in (
+                    nodes.values()):
+                ids = []
+                segments = [segment]
+
+                while parent_id is not None:
+                    ids.insert(0, "{}{}".format(parent_id, sep))
+                    segments.insert(0, nodes[parent_id][2])
+                    parent_id = nodes[parent_id][1]
+
+                new_id_path = ''.join(ids)
+                new_path = separator.join(segments)
+
+                if (new_path, new_id_path, len(ids)) != (path, id_path, level):
+                    self.filter(pk=pk).update(
+                        path=new_path, id_path=new_id_path, level=len(ids),
+                        updated=datetime.now(tzutc()))
+                    count += 1
+
+        return count
 
-    def _recurse_parents(self, code):
-        parents = []
+    def bulk_create_codes(self, set_name, rows, user):
+        """
+        Creates the location codes for many full paths at once, ex.
+        `A:01:3`. The paths do not include the root segment. Each level of
+        the paths is resolved with set based queries, only the segments that
+        do not already exist are created. Returns a tuple of the leaf codes
+        for all the valid rows and a dict of the invalid rows mapped to a
+        list of their errors.
+        """
+        ROOT_NAME = self.model.ROOT_NAME
+        separator = set_name.separator
+        formats = list(set_name.location_formats.exclude(
+            char_definition=ROOT_NAME))
+        max_num_segments = len(formats) + 1 # Formats plus the root.
+        errors = {}
+        valid = {}
+
+        for row in rows:
+            segments = row.split(separator) if row else []
+
+            if not segments or not all(segments):
+                errors.setdefault(row, []).append(
+                    _("A location code path cannot be empty or have empty "
+                      "segments."))
+            elif len(segments) + 1 > max_num_segments:
+                errors.setdefault(row, []).append(
+                    _("There are more segments than defined formats, "
+                      "found: {}, allowed: {}").format(
+                        len(segments) + 1, max_num_segments))
+            elif (ROOT_NAME in segments or
+                  len(set(segments)) != len(segments)):
+                errors.setdefault(row, []).append(
+                    _("You cannot have a segment as a child to itself."))
+            else:
+                valid[row] = segments
+
+        # Validate all the segments of each level against its format.
+        for idx, fmt in enumerate(formats):
+            values = set([segments[idx] for segments in valid.values()
+                          if len(segments) > idx])
+            invalid = FormatValidator(
+                separator, fmt=fmt.char_definition).validate_segments(values)
+
+            if invalid:
+                for row, segments in list(valid.items()):
+                    if len(segments) > idx and segments[idx] in invalid:
+                        errors.setdefault(row, []).append(
+                            invalid[segments[idx]])
+                        del valid[row]
+
+        path_map = {}
+
+        for segments in valid.values():
+            for idx in range(len(segments)):
+                path = separator.join([ROOT_NAME] + segments[:idx + 1])
+                parent_path = separator.join([ROOT_NAME] + segments[:idx])
+                path_map.setdefault(path, (parent_path, segments[idx], idx))
+
+        codes = []
+
+        with transaction.atomic():
+            objects = {obj.path: obj for obj in self.filter(
+                location_format__location_set_name=set_name,
+                path__in=list(path_map) + [ROOT_NAME])}
+
+            if ROOT_NAME not in objects:
+                msg = _("Root code does not exist for set name '{}'."
+                        ).format(set_name)
+                log.error(msg)
+                raise self.model.DoesNotExist(msg)
+
+            missing = {}
+
+            for path, (parent_path, segment, idx) in path_map.items():
+                if path not in objects:
+                    missing.setdefault(idx, []).append(path)
 
-        if code.parent:
-            parents.append(code.parent)
-            more = self._recurse_parents(code.parent)
-            parents.extend(more)
+            for idx in sorted(missing):
+                new_objs = []
 
-        return parents
+                for path in missing[idx]:
+                    parent_path, segment, junk = path_map[path]
+                    new_objs.append(self._build_code(
+                        user, formats[idx], objects[parent_path], segment,
+                        path, idx + 1))
+
+                self.bulk_create(new_objs)
+
+                if any(obj.pk is None for obj in new_objs):
+                    new_objs = self.filter(
+                        location_format__location_set_name=set_name,
+                        path__in=missing[idx])
+
+                objects.update({obj.path: obj for obj in new_objs})
+
+            codes[:] = [objects[separator.join([ROOT_NAME] + valid[row])]
+                        for row in rows if row in valid]
+
+        return codes, errors
+
+    def _build_code(self, user, location_format, parent, segment, path,
+                    level):
+        """
+        Returns an unsaved location code with all the fields that
+        `LocationCode.clean` and `LocationCode.save` would normally set.
+        """
+        now = datetime.now(tzutc())
+        obj = self.model(
+            public_id=generate_public_key(), location_format=location_format,
+            parent=parent, segment=segment, path=path, level=level,
+            creator=user, updater=user, created=now, updated=now)
+        obj.id_path = obj._get_id_path()
+        obj.clean_fields(exclude=('location_format', 'parent', 'creator',
+                                  'updater',))
+        return obj
 
     def get_all_root_trees(self, project, segment):
         result = []
-        records = self.select_related('parent').filter(
+        records = self.select_related(
+            'location_format__location_set_name__project').filter(
             segment=segment,
             location_format__location_set_name__project=project)
 
         if len(records) > 0:
-            result[:] = [self.get_parents(project, record)
+            ids = set()
+
+            for record in records:
+                self._check_parents_project(project, record)
+                ids.update(record.ancestor_ids)
+
+            nodes = self.select_related(
+                'location_format__location_set_name').in_bulk(ids)
+            result[:] = [self._order_parents(record.ancestor_ids, nodes)
                          for record in records]
 
         return result
@@ -371,6 +720,7 @@ class LocationCodeManager(models.Manager):
 class LocationCode(TimeModelMixin, UserModelMixin, ValidateOnSaveMixin,
                    models.Model):
     ROOT_NAME = '#'
+    ID_PATH_SEPARATOR = '/'
 
     public_id = models.CharField(
         verbose_name=_("Public Location Code ID"), max_length=30,
@@ -394,6 +744,11 @@ class LocationCode(TimeModelMixin, UserModelMixin, ValidateOnSaveMixin,
     level = models.SmallIntegerField(
         verbose_name=_("Level"), editable=False,
         help_text=_("The location in the hierarchy of this segment."))
+    id_path = models.CharField(
+        verbose_name=_("Ancestor IDs"), max_length=1000, editable=False,
+        blank=True, db_index=True,
+        help_text=_("The primary keys of all the parents of this segment "
+                    "starting from the root."))
 
     objects = LocationCodeManager()
 
@@ -403,15 +758,16 @@ class LocationCode(TimeModelMixin, UserModelMixin, ValidateOnSaveMixin,
             self.public_id = generate_public_key()
 
         # Test max length, is not None, and format validity of segment.
-        separator = self.location_format.location_set_name.separator
+        set_name = self.location_format.location_set_name
+        separator = set_name.separator
 
         self.segment = FormatValidator(
             separator, fmt=self.location_format.char_definition
             ).validate_segment(self.segment)
 
         # Test that a segment is not a parent to itself.
-        parents = LocationCode.objects.get_parents(
-            self.location_format.location_set_name.project, self)
+        self.id_path = self._get_id_path()
+        parents = LocationCode.objects.get_parents(set_name.project, self)
 
         if self.segment in [parent.segment for parent in parents]:
             raise ValidationError({
@@ -419,18 +775,17 @@ class LocationCode(TimeModelMixin, UserModelMixin, ValidateOnSaveMixin,
                 })
 
         # Test that all segments have the same location set name.
-        set_name = self.location_format.location_set_name.name
+        set_names = [parent.location_format.location_set_name.name
+                     for parent in parents]
 
-        if not all([set_name == parent.location_format.location_set_name.name
-                    for parent in parents]):
+        if not all([set_name.name == name for name in set_names]):
             raise ValidationError({
                 'location_set_name': _("All segments must be derived from the "
                                        "same location set name.")})
 
         # Test that the number of segments defined are equal to or less than
         # the number of formats for this location set name.
-        max_num_segments = (self.location_format.location_set_name.
-                            location_formats.count())
+        max_num_segments = set_name.location_formats.count()
         length = len(parents) + 1 # Parents plus self.
 
         if length > max_num_segments:
@@ -441,15 +796,39 @@ class LocationCode(TimeModelMixin, UserModelMixin, ValidateOnSaveMixin,
                 })
 
         # Set the path and level.
-        self.path = self._get_category_path(separator=separator)
+        self.path = self._get_category_path(separator=separator,
+                                            parents=parents)
         self.level = self.path.count(separator)
 
     def save(self, *args, **kwargs):
-        super(LocationCode, self).save(*args, **kwargs)
-
-        # Fix all the children if any.
-        for child in self.children.all():
-            child.save()
+        with transaction.atomic():
+            old = None
+
+            if self.pk is not None:
+                old = LocationCode.objects.filter(pk=self.pk).values(
+                    'path', 'id_path', 'level',
+                    'location_format__location_set_name').first()
+
+                if old and old['level'] and not old['id_path']:
+                    # The tree predates the `id_path` column, rebuild it
+                    # before the children are moved with it.
+                    LocationCode.objects.rebuild_paths(
+                        self.location_format.location_set_name.project)
+                    old = LocationCode.objects.filter(pk=self.pk).values(
+                        'path', 'id_path', 'level',
+                        'location_format__location_set_name').first()
+
+            super(LocationCode, self).save(*args, **kwargs)
+
+            # Fix all the children if any.
+            if old and (old['path'] != self.path or
+                        old['id_path'] != self.id_path or
+                        old['location_format__location_set_name'] !=
+                        self.location_format.location_set_name_id):
+                LocationCode.objects.update_child_paths(
+                    self, old['path'], old['id_path'], old['level'],
+                    old['location_format__location_set_name'])
+                child_paths_updated.send(sender=LocationCode, instance=self)
 
     def __str__(self):
         return self.segment
@@ -457,18 +836,59 @@ class LocationCode(TimeModelMixin, UserModelMixin, ValidateOnSaveMixin,
     class Meta:
         unique_together = ('location_format', 'parent', 'segment',)
         ordering = ('path',)
+        # Supports the keyset pagination on the ordering and the delta feed.
+        indexes = (models.Index(fields=['path', 'id']),
+                   models.Index(fields=['updated', 'id']),)
         verbose_name = _("Location Code")
         verbose_name_plural = _("Location Codes")
 
     def get_separator(self):
         return self.location_format.location_set_name.separator
 
-    def _get_category_path(self, current=True, separator=None):
-        parents = LocationCode.objects.get_parents(
-            self.location_format.location_set_name.project, self)
-        if current: parents.append(self)
+    def _get_id_path(self):
+        id_path = ''
+
+        if self.parent:
+            if self.parent.parent_id and not self.parent.id_path:
+                # The parent has not been rebuilt since the `id_path` column
+                # was added, follow the foreign keys instead.
+                node = self.parent
+
+                while node is not None:
+                    id_path = "{}{}{}".format(
+                        node.pk, self.ID_PATH_SEPARATOR, id_path)
+                    node = node.parent
+            else:
+                id_path = self.parent.descendant_id_path
+
+        return id_path
+
+    def _get_category_path(self, current=True, separator=None, parents=None):
+        if parents is None:
+            parents = LocationCode.objects.get_parents(
+                self.location_format.location_set_name.project, self)
+
+        segments = [parent.segment for parent in parents]
+        if current: segments.append(self.segment)
         separator = separator if separator else self.get_separator()
-        return separator.join([parent.segment for parent in parents])
+        return separator.join(segments)
+
+    @property
+    def descendant_id_path(self):
+        """
+        Returns the `id_path` prefix shared by all the descendants of this
+        segment.
+        """
+        return "{}{}{}".format(self.id_path, self.pk, self.ID_PATH_SEPARATOR)
+
+    @property
+    def ancestor_ids(self):
+        """
+        Returns a list of the primary keys of all the parents of this
+        segment starting with the root segment.
+        """
+        return [int(pk) for pk in self.id_path.split(self.ID_PATH_SEPARATOR)
+                if pk]
 
     def parents_producer(self):
         return self._get_category_path(current=False)
@@ -489,13 +909,32 @@ def create_parent(sender, **kwargs):
 
     if (instance and instance.parent is None and
         instance.segment != LocationCode.ROOT_NAME):
-        # Find the ROOT format
-        lf = instance.location_format.location_set_name.location_formats.get(
-            char_definition=LocationCode.ROOT_NAME)
-        # Set the parent to the ROOT code.
+        # Set the parent to the ROOT code of the ROOT format.
         instance.parent = LocationCode.objects.get(
-            location_format=lf, parent=None, segment=LocationCode.ROOT_NAME)
-        # Set the path and level for the first record after the root record.
+            location_format__location_set_name_id=(
+                instance.location_format.location_set_name_id),
+            location_format__char_definition=LocationCode.ROOT_NAME,
+            parent=None, segment=LocationCode.ROOT_NAME)
+        # Set the id path, path, and level for the first record after the
+        # root record.
         separator = instance.get_separator()
-        instance.path = instance._get_category_path(separator=separator)
+        instance.id_path = instance._get_id_path()
+        instance.path = separator.join((instance.parent.path,
+                                        instance.segment))
         instance.level = instance.path.count(separator)
+
+
+@receiver(post_delete, sender=LocationCode)
+def add_location_code_tombstone(sender, **kwargs):
+    """
+    Record the deleted location code for the delta feed. The format is
+    still in the database when it is deleted with the code. The bulk
+    delete paths record theirs with one insert.
+    """
+    instance = kwargs.get('instance')
+
+    if instance and not in_bulk_delete(sender):
+        project_id = LocationFormat.objects.filter(
+            pk=instance.location_format_id).values_list(
+            'location_set_name__project_id', flat=True).first()
+        Tombstone.objects.add(instance, project_id)
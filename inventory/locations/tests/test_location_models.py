@@ -3,10 +3,14 @@
 # inventory/maintenance/tests/test_location_models.py
 #
 
+import io
+
 from django.contrib.auth import get_user_model
 from django.core.exceptions import ValidationError
+from django.core.management import call_command
 
 from inventory.common.tests.base_tests import BaseTest
+from inventory.projects.models import Tombstone
 
 from ..models import LocationSetName, LocationFormat, LocationCode
 
@@ -148,6 +152,46 @@ class TestLocationSetNameModel(BaseLocation):
             tree = LocationSetName.objects.clone_set_name_tree(
                 project, self.user, loc_set_name)
 
+    def test_clone_set_name_tree_with_codes(self):
+        #self.skipTest("Temporarily skipped")
+        # Setup test
+        name = "Test Location Set Name Number 2"
+        desc = "Test description."
+        loc_set_name, fmt_root, fmt_0, fmt_1, fmt_2 = self.setup_set_name_tree(
+            self.project, name, desc, LocationSetName.YES)
+        code_root = LocationCode.objects.get_root_code(loc_set_name)
+        code_0 = self._create_location_code(fmt_0, "T01", parent=code_root)
+        code_1 = self._create_location_code(fmt_1, "X01", parent=code_0)
+        code_1a = self._create_location_code(fmt_1, "X02", parent=code_0)
+        code_2 = self._create_location_code(fmt_2, "B01C01R01", parent=code_1)
+        # Make a full copy with a new project.
+        project = self._create_project(
+            self.inventory_type, name="Test Project 2", members=[self.user])
+        tree = LocationSetName.objects.clone_set_name_tree(
+                project, self.user, loc_set_name, with_codes=True)
+        msg = "tree: '{}', total in tree: '{}'.".format(tree, len(tree))
+        self.assertEqual(len(tree), 10, msg)
+        codes = LocationCode.objects.filter(
+            location_format__location_set_name__project=project)
+        old_paths = sorted(LocationCode.objects.filter(
+            location_format__location_set_name=loc_set_name).values_list(
+            'path', flat=True))
+        msg = "codes: {}, old paths: {}".format(codes, old_paths)
+        self.assertEqual(sorted([code.path for code in codes]), old_paths,
+                         msg)
+
+        # The cloned codes must look the same as if created one by one.
+        for code in codes:
+            parents = LocationCode.objects.get_parents(project, code)
+            msg = "code: {}, parents: {}, level: {}".format(
+                code, parents, code.level)
+            self.assertEqual(code._get_category_path(parents=parents),
+                             code.path, msg)
+            self.assertEqual(code.location_format.location_set_name.project,
+                             project, msg)
+            self.assertEqual(len(parents), code.level, msg)
+            self.assertTrue(code.public_id, msg)
+
     def test_delete_set_name_tree(self):
         #self.skipTest("Temporarily skipped")
         # Create a location default and tree.
@@ -175,10 +219,18 @@ class TestLocationSetNameModel(BaseLocation):
         msg = "Location Codes: {}, {}, {}, {}, count: {}".format(
             code_root, code_0, code_1, code_2, count)
         self.assertEqual(count, 6, msg)
+        public_ids = sorted(LocationCode.objects.values_list(
+            'public_id', flat=True))
         # Test delete_set_name_tree
         nodes = LocationSetName.objects.delete_set_name_tree(
             self.project, loc_set_name, self.user)
         #print nodes
+        expected = [name,
+                    ['#', ['#:T01:X01:B01C01R01', '#:T01:X02:B01C01R01']],
+                    ['T\\d\\d', []], ['X\\d\\d', []],
+                    ['B\\d\\dC\\d\\dR\\d\\d', []]]
+        msg = "nodes: {}, expected: {}".format(nodes, expected)
+        self.assertEqual(nodes, expected, msg)
         # Test for correct number of objects.
         msg = "Location Set Name: {}".format(loc_set_name)
         self.assertEqual(LocationSetName.objects.count(), 0, msg)
@@ -188,6 +240,11 @@ class TestLocationSetNameModel(BaseLocation):
         msg = "Location Codes: {}, {}, {}, {}".format(
             code_root, code_0, code_1, code_2)
         self.assertEqual(LocationCode.objects.count(), 0, msg)
+        # Test that each deleted code has one tombstone.
+        found = sorted(Tombstone.objects.filter(
+            project=self.project).values_list('public_id', flat=True))
+        msg = "found: {}, expected: {}".format(found, public_ids)
+        self.assertEqual(found, public_ids, msg)
 
     def test_get_location_set(self):
         """
@@ -516,9 +573,17 @@ class TestLocationCodeModel(BaseLocation):
             self.LOCATION_SET_NAME)
         self.assertEqual(code_2.segment, segment, msg)
         # Test get_parent
-        parents = LocationCode.objects.get_parents(self.project, code_2)
-        msg = "parents: {}".format(parents)
+        with self.assertNumQueries(1):
+            parents = LocationCode.objects.get_parents(self.project, code_2)
+            set_names = [parent.location_format.location_set_name.name
+                         for parent in parents]
+
+        msg = "parents: {}, set names: {}".format(parents, set_names)
         self.assertEqual(len(parents), 3, msg)
+        self.assertEqual([parent.segment for parent in parents],
+                         [LocationCode.ROOT_NAME, 'T01', 'C01'], msg)
+        self.assertEqual(code_2.ancestor_ids,
+                         [parent.pk for parent in parents], msg)
 
     def test_get_parents_with_invalid_project(self):
         """
@@ -596,6 +661,47 @@ class TestLocationCodeModel(BaseLocation):
         msg = "Root trees: {}".format(trees)
         self.assertEqual(len(trees), 2, msg)
 
+    def test_bulk_create_codes(self):
+        #self.skipTest("Temporarily skipped")
+        # Create 2nd location format object.
+        kwargs = {}
+        kwargs['segment_order'] = 1
+        kwargs['description'] = "Test character definition."
+        loc_fmt_1 = self._create_location_format(
+            self.loc_set_name, 'C\\d\\d', **kwargs)
+        # Create an existing location code.
+        code_0 = self._create_location_code(self.loc_fmt, "T01")
+        rows = ['T01:C01', 'T01:C02', 'T02', 'T02:C01', 'T03:C01:B01',
+                'T04:T04', 'S01', '']
+        codes, errors = LocationCode.objects.bulk_create_codes(
+            self.loc_set_name, rows, self.user)
+        paths = [code.path for code in codes]
+        expected = ['#:T01:C01', '#:T01:C02', '#:T02', '#:T02:C01']
+        msg = "paths: {}, errors: {}".format(paths, errors)
+        self.assertEqual(paths, expected, msg)
+        self.assertEqual(sorted(errors), ['', 'S01', 'T03:C01:B01',
+                                          'T04:T04'], msg)
+        self.assertTrue("more segments than defined formats"
+                        in errors['T03:C01:B01'][0], msg)
+        self.assertTrue("child to itself" in errors['T04:T04'][0], msg)
+        self.assertTrue("does not conform to" in errors['S01'][0], msg)
+        # The codes must look the same as if they were created one by one.
+        code = LocationCode.objects.get(path='#:T01:C01')
+        msg = "code: {}, id_path: {}, level: {}".format(
+            code, code.id_path, code.level)
+        self.assertEqual(code.parent, code_0, msg)
+        self.assertEqual(code.location_format, loc_fmt_1, msg)
+        self.assertEqual(code.level, 2, msg)
+        self.assertEqual(code.id_path, code_0.descendant_id_path, msg)
+        self.assertTrue(code.public_id, msg)
+        # Running the same rows again does not create any new codes.
+        count = LocationCode.objects.count()
+        codes, errors = LocationCode.objects.bulk_create_codes(
+            self.loc_set_name, rows[:4], self.user)
+        msg = "count: {}, codes: {}".format(count, codes)
+        self.assertEqual(LocationCode.objects.count(), count, msg)
+        self.assertEqual(len(codes), 4, msg)
+
     def test_invalid_segment(self):
         """
         Test that the segment validates properly.
@@ -765,6 +871,86 @@ class TestLocationCodeModel(BaseLocation):
         self.assertEqual(code_3.path, path, msg)
         self.assertEqual(code_3.level, 3, msg)
 
+    def _create_code_tree(self):
+        kwargs = {}
+        kwargs['description'] = "Test character definition level 1."
+        kwargs['segment_order'] = 1
+        loc_fmt_1 = self._create_location_format(
+            self.loc_set_name, 'A\\d\\d', **kwargs)
+        kwargs['description'] = "Test character definition level 2."
+        kwargs['segment_order'] = 2
+        loc_fmt_2 = self._create_location_format(
+            self.loc_set_name, 'B\\d\\d', **kwargs)
+        code_0 = self._create_location_code(self.loc_fmt, "T01")
+        code_1 = self._create_location_code(loc_fmt_1, "A01", parent=code_0)
+        code_2 = self._create_location_code(loc_fmt_2, "B01", parent=code_1)
+        return loc_fmt_1, loc_fmt_2, code_0, code_1, code_2
+
+    def test_save_without_id_path(self):
+        """
+        Test that saving a location code in a tree that predates the
+        `id_path` column keeps its ancestry and fixes its children.
+        """
+        #self.skipTest("Temporarily skipped")
+        loc_fmt_1, loc_fmt_2, code_0, code_1, code_2 = (
+            self._create_code_tree())
+        codes = LocationCode.objects.filter(
+            location_format__location_set_name=self.loc_set_name)
+        codes.update(id_path='')
+        code = LocationCode.objects.get(pk=code_1.pk)
+        code.segment = "A02"
+        code.save()
+        code = LocationCode.objects.get(pk=code.pk)
+        child = LocationCode.objects.get(pk=code_2.pk)
+        sep = code.get_separator()
+        path = '{0}{1}T01{1}A02'.format(LocationCode.ROOT_NAME, sep)
+        msg = "Found path: {}, should be: {}".format(code.path, path)
+        self.assertEqual(code.path, path, msg)
+        self.assertEqual(code.level, 2, msg)
+        self.assertEqual(code.ancestor_ids, [code_0.parent_id, code_0.pk],
+                         msg)
+        path = '{0}{1}B01'.format(path, sep)
+        msg = "Found path: {}, should be: {}".format(child.path, path)
+        self.assertEqual(child.path, path, msg)
+        self.assertEqual(child.ancestor_ids, code.ancestor_ids + [code.pk],
+                         msg)
+        # Test that a new child of an old parent gets the full ancestry.
+        codes.update(id_path='')
+        parent = LocationCode.objects.get(pk=code.pk)
+        new = self._create_location_code(loc_fmt_2, "B02", parent=parent)
+        msg = "new: {}, ancestors: {}".format(new.path, new.ancestor_ids)
+        self.assertEqual(new.ancestor_ids, code.ancestor_ids + [code.pk], msg)
+        self.assertEqual(new.level, 3, msg)
+
+    def test_rebuild_location_code_paths(self):
+        """
+        Test that the rebuild_location_code_paths command fills in the
+        `id_path` of existing location codes.
+        """
+        #self.skipTest("Temporarily skipped")
+        loc_fmt_1, loc_fmt_2, code_0, code_1, code_2 = (
+            self._create_code_tree())
+        codes = LocationCode.objects.filter(
+            location_format__location_set_name=self.loc_set_name)
+        expected = {obj.pk: (obj.path, obj.id_path, obj.level)
+                    for obj in codes}
+        codes.update(id_path='')
+        out = io.StringIO()
+        call_command('rebuild_location_code_paths',
+                     project=self.project.public_id, stdout=out)
+        found = {obj.pk: (obj.path, obj.id_path, obj.level)
+                 for obj in codes}
+        msg = "expected: {}, found: {}, out: {}".format(
+            expected, found, out.getvalue())
+        self.assertEqual(found, expected, msg)
+        self.assertIn("Rebuilt 3 location code paths.", out.getvalue(), msg)
+        parents = LocationCode.objects.get_parents(
+            self.project, LocationCode.objects.get(pk=code_2.pk))
+        msg = "parents: {}".format(parents)
+        self.assertEqual(parents, [code_0.parent, code_0, code_1], msg)
+        # Test that a second run has nothing to do.
+        self.assertEqual(LocationCode.objects.rebuild_paths(), 0)
+
     def test_parents_producer(self):
         """
         Test that the parents_producer() method produces the parents for
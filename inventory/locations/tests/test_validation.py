@@ -118,3 +118,25 @@ class TestValidation(TestCase):
                 value = FormatValidator(fmt=fmt, delimiter=delim
                                         ).validate_segment(segment)
                 self.assertFalse(value, msg)
+
+    def test_validate_segments(self):
+        #self.skipTest("Temporarily skipped")
+        validator = FormatValidator(fmt=r'T\d\d', delimiter=':')
+        errors = validator.validate_segments(['T01', 'T02', 'T0', None])
+        msg = "errors: {}".format(errors)
+        self.assertEqual(sorted(errors, key=str), [None, 'T0'], msg)
+        self.assertTrue("does not conform to" in errors['T0'], msg)
+        errors = validator.validate_segments(['T01', 'T99'])
+        msg = "errors: {}".format(errors)
+        self.assertEqual(errors, {}, msg)
+
+    def test_segment_regex_cache(self):
+        #self.skipTest("Temporarily skipped")
+        rx_0 = FormatValidator(
+            fmt=r'B\d\dC\d\d', delimiter=':')._get_segment_regex()
+        rx_1 = FormatValidator(
+            fmt=r'B\d\dC\d\d', delimiter=':')._get_segment_regex()
+        cache = FormatValidator._SEGMENT_REGEX_CACHE
+        msg = "rx_0: {}, rx_1: {}, cache: {}".format(rx_0, rx_1, cache)
+        self.assertIs(rx_0, rx_1, msg)
+        self.assertIs(cache.get((':', r'B\d\dC\d\d')), rx_0, msg)
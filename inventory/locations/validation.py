@@ -23,6 +23,11 @@ class FormatValidator(object):
         r'\a': r'a-zA-Z',
         r'\p': r'!"#$%&\'\(\)*+,./:;<=>?@\[\]^_`{|}~-'
         }
+    # Compiled segment regexes keyed by (delimiter, format), shared by all
+    # instances in the process.
+    _SEGMENT_REGEX_CACHE = {}
+    _SEGMENT_REGEX_CACHE_SIZE = 1000
+    _SEGMENT_ERROR_MSG = _("Invalid segment '{}', does not conform to '{}'.")
 
     def __init__(self, delimiter, fmt=None):
         """
@@ -79,18 +84,50 @@ class FormatValidator(object):
         rx_obj = None
 
         if value is not None:
-            operators = self._split_char_definition(self._format)
-            regex = ''.join([r'([{}])'.format(self.__FMT_MAP.get(op, op))
-                         for op in operators])
-            rx_obj = re.match(regex, value)
+            rx_obj = self._get_segment_regex().match(value)
 
         if not rx_obj:
             raise ValidationError(
-                {'segment': _("Invalid segment '{}', does not conform "
-                              "to '{}'.").format(value, self._format)})
+                {'segment': self._SEGMENT_ERROR_MSG.format(
+                    value, self._format)})
 
         return value
 
+    def validate_segments(self, values):
+        """
+        Validates many segments against the same format. Returns a dict of
+        the segments that do not conform mapped to their error message, an
+        empty dict means all the segments are valid.
+        """
+        rx = self._get_segment_regex()
+        errors = {}
+
+        for value in values:
+            if value is None or not rx.match(value):
+                errors[value] = self._SEGMENT_ERROR_MSG.format(
+                    value, self._format)
+
+        return errors
+
+    def _get_segment_regex(self):
+        key = (self._delimiter, self._format)
+        rx = self._SEGMENT_REGEX_CACHE.get(key)
+
+        if rx is None:
+            operators = self._split_char_definition(self._format)
+            regex = ''.join([r'([{}])'.format(self.__FMT_MAP.get(op, op))
+                             for op in operators])
+            rx = re.compile(regex)
+
+            cache = self._SEGMENT_REGEX_CACHE
+
+            if len(cache) >= self._SEGMENT_REGEX_CACHE_SIZE:
+                cache.clear()
+
+            cache[key] = rx
+
+        return rx
+
     def _split_char_definition(self, fmt):
         a = self.__FMT_MAP.get(r'\a', '')
         p = self._remove_delimiter(self.__FMT_MAP.get(r'\p', ''))
@@ -18,7 +18,7 @@ from rest_condition import C, And, Or, Not
 from inventory.common.api.permissions import (
     IsAdminSuperUser, IsAdministrator, IsDefaultUser, IsAnyUser,
     IsProjectOwner, IsProjectManager, IsProjectDefaultUser, IsAnyProjectUser,
-    IsReadOnly, IsUserActive, CanDelete)
+    IsReadOnly, IsUserActive, CanDelete, get_project_ids)
 from inventory.common.api.pagination import SmallResultsSetPagination
 from inventory.common.api.view_mixins import (
     TrapDjangoValidationErrorCreateMixin, TrapDjangoValidationErrorUpdateMixin)
@@ -86,7 +86,8 @@ class ProjectAuthorizationMixin(object):
             self.request.user.role == UserModel.ADMINISTRATOR):
             result = Project.objects.all()
         else:
-            result = self.request.user.projects.all()
+            result = Project.objects.filter(
+                pk__in=get_project_ids(self.request))
 
         return result
 
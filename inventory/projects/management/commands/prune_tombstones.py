@@ -0,0 +1,44 @@
+# -*- coding: utf-8 -*-
+#
+# inventory/projects/management/commands/prune_tombstones.py
+#
+"""
+Prune the tombstones the delta feeds no longer need.
+"""
+__docformat__ = "restructuredtext en"
+
+import logging
+
+from django.core.management.base import BaseCommand, CommandError
+
+from inventory.projects.models import Tombstone
+
+log = logging.getLogger('commands.projects.prune-tombstones')
+
+
+class Command(BaseCommand):
+    """
+    Management command for pruning the tombstones.
+    """
+    help = ("Delete the tombstones older than the delta feed retention, "
+            "the clients that last synced before then get a 410 and must "
+            "get all the records again.")
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '-d', '--days', type=int, default=Tombstone.objects.RETENTION_DAYS,
+            dest='days', help="Keep the tombstones of this many days, "
+            "defaults to and cannot be less than {}.".format(
+                Tombstone.objects.RETENTION_DAYS))
+
+    def handle(self, *args, **options):
+        days = options.get('days')
+
+        if days < Tombstone.objects.RETENTION_DAYS:
+            raise CommandError(
+                "The days cannot be less than {}, the delta feeds answer "
+                "sync tokens that old.".format(
+                    Tombstone.objects.RETENTION_DAYS))
+
+        count = Tombstone.objects.prune(days)
+        self.stdout.write("Pruned {} tombstones.".format(count))
@@ -5,22 +5,25 @@
 from __future__ import unicode_literals
 
 """
-Project model.
+Project, Membership, and Tombstone models.
 """
 __docformat__ = "restructuredtext en"
 
 import logging
+from datetime import datetime, timedelta
+from dateutil.tz import tzutc
 
 from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
 from django.core.exceptions import ValidationError
-from django.db import models
-from django.db.models.signals import post_save
+from django.db import models, transaction
+from django.db.models.signals import post_save, post_delete, pre_delete
 from django.dispatch import receiver
 from django.utils.encoding import python_2_unicode_compatible
 from django.utils.translation import ugettext, ugettext_lazy as _
 
-from inventory.common import generate_public_key
+from inventory.common import generate_public_key, sync_relation
 from inventory.common.model_mixins import (
     UserModelMixin, TimeModelMixin, StatusModelMixin, StatusModelManagerMixin,
     ValidateOnSaveMixin)
@@ -125,8 +128,19 @@ class Project(TimeModelMixin, UserModelMixin, StatusModelMixin,
             self.active = True
 
     def save(self, *args, **kwargs):
+        old = None
+
+        if self.pk is not None:
+            old = Project.objects.filter(pk=self.pk).values_list(
+                'active', 'public').first()
+
         super(Project, self).save(*args, **kwargs)
 
+        # The cached project sets depend on the project's status.
+        if old is not None and old != (self.active, self.public):
+            Membership.objects.invalidate_projects(self.members.values_list(
+                'pk', flat=True))
+
     def __str__(self):
         return self.name
 
@@ -164,20 +178,10 @@ class Project(TimeModelMixin, UserModelMixin, StatusModelMixin,
         This method adds and removes members to the project.
         """
         if isinstance(members, (list, tuple, models.QuerySet)):
-            UserModel = get_user_model()
-            wanted_pks = [inst.pk for inst in members]
-            old_pks = [inst.pk for inst in self.members.all()]
-            # Remove unwanted members.
-            rem_pks = list(set(old_pks) - set(wanted_pks))
-            rem_users = UserModel.objects.filter(pk__in=rem_pks)
-            Membership.objects.filter(
-                project=self, user__in=rem_users).delete()
-            # Add new members.
-            add_pks = list(set(wanted_pks) - set(old_pks))
-
-            for user in [obj for obj in members if obj.pk in add_pks]:
-                obj = Membership(project=self, user=user)
-                obj.save()
+            # The bulk writes do not invalidate the cached project roles.
+            added, removed = sync_relation(
+                Membership, 'project', self.pk, 'user', members)
+            Membership.objects.invalidate_projects(added | removed)
 
     def has_authority(self, user):
         """
@@ -225,7 +229,36 @@ def add_creator_to_membership(sender, **kwargs):
 # Membership
 #
 class MembershipManager(models.Manager):
-    pass
+    PROJECTS_CACHE_KEY = 'user-projects-{}'
+    PROJECTS_CACHE_TIMEOUT = 60 * 60 * 24
+
+    def get_project_roles(self, user):
+        """
+        Returns a dict of the user's project ids mapped to the user's role
+        in the project. The dict is cached until one of the user's
+        memberships or one of the user's projects changes.
+        """
+        key = self.PROJECTS_CACHE_KEY.format(user.pk)
+        roles = cache.get(key)
+
+        if roles is None:
+            roles = dict(self.filter(user=user).values_list(
+                'project_id', 'role'))
+            cache.set(key, roles, self.PROJECTS_CACHE_TIMEOUT)
+
+        return roles
+
+    def invalidate_projects(self, user_pks):
+        """
+        Removes the cached project roles of the users now and again when the
+        current transaction commits, so roles read from uncommitted data are
+        never reused.
+        """
+        keys = [self.PROJECTS_CACHE_KEY.format(pk) for pk in user_pks]
+
+        if keys:
+            cache.delete_many(keys)
+            transaction.on_commit(lambda: cache.delete_many(keys))
 
 
 @python_2_unicode_compatible
@@ -263,6 +296,13 @@ class Membership(ValidateOnSaveMixin, models.Model):
     def save(self, *args, **kwargs):
         super(Membership, self).save(*args, **kwargs)
 
+    def delete(self, *args, **kwargs):
+        # Not a post_delete receiver, it would stop the bulk deletes of the
+        # memberships from deleting without fetching the rows.
+        result = super(Membership, self).delete(*args, **kwargs)
+        Membership.objects.invalidate_projects([self.user_id])
+        return result
+
     def __str__(self):
         return "{} ({})".format(self.user.get_full_name_reversed(),
                                 self.project.name)
@@ -270,3 +310,135 @@ class Membership(ValidateOnSaveMixin, models.Model):
     class Meta:
         verbose_name = _("Membership")
         verbose_name_plural = _("Memberships")
+
+
+@receiver(post_save, sender=Membership)
+def invalidate_membership_projects(sender, **kwargs):
+    """
+    Invalidate the cached project roles of the membership's user.
+    """
+    instance = kwargs.get('instance')
+
+    if instance:
+        Membership.objects.invalidate_projects([instance.user_id])
+
+
+@receiver(pre_delete, sender=Project)
+def invalidate_project_members(sender, **kwargs):
+    """
+    Invalidate the cached project roles of the members of a deleted
+    project, their memberships are deleted with it.
+    """
+    instance = kwargs.get('instance')
+
+    if instance:
+        Membership.objects.invalidate_projects(
+            instance.memberships.values_list('user_id', flat=True))
+
+
+#
+# Tombstone
+#
+class TombstoneManager(models.Manager):
+    # The delta feeds answer a sync token no older than this, the older
+    # tombstones can be pruned.
+    RETENTION_DAYS = 90
+
+    def add(self, instance, project_id):
+        """
+        Records the deletion of `instance` from the project, called from the
+        post_delete signals of the models with a delta feed.
+        """
+        if project_id is not None and instance.public_id:
+            self.create(project_id=project_id,
+                        model=instance._meta.label_lower,
+                        public_id=instance.public_id)
+
+    def add_many(self, model, project_id, public_ids):
+        """
+        Records the deletion of the `model` records in `public_ids` from the
+        project with one insert, called from the bulk delete paths.
+        """
+        now = datetime.now(tzutc())
+        label = model._meta.label_lower
+        self.bulk_create([self.model(
+            project_id=project_id, model=label, public_id=public_id,
+            deleted=now) for public_id in public_ids if public_id])
+
+    def get_deleted(self, model, since, project_ids=None):
+        """
+        Returns a queryset of the tombstones of `model` deleted at or after
+        `since`, optionally limited to the projects in `project_ids`.
+        """
+        queryset = self.filter(model=model._meta.label_lower,
+                               deleted__gte=since)
+
+        if project_ids is not None:
+            queryset = queryset.filter(project_id__in=project_ids)
+
+        return queryset
+
+    def get_horizon(self, days=None):
+        """
+        Returns the time the tombstones are kept from, `days` defaults to
+        `RETENTION_DAYS`. A delta feed cannot answer a sync token older
+        than this.
+        """
+        days = self.RETENTION_DAYS if days is None else days
+        return datetime.now(tzutc()) - timedelta(days=days)
+
+    def prune(self, days=None):
+        """
+        Deletes the tombstones older than the horizon of `days`. Returns the
+        number of tombstones deleted.
+        """
+        return self.filter(deleted__lt=self.get_horizon(days)).delete()[0]
+
+
+@python_2_unicode_compatible
+class Tombstone(models.Model):
+    """
+    A deleted record, kept so the delta feeds can tell the clients which
+    records to remove from their copies.
+    """
+    project = models.ForeignKey(
+        Project, on_delete=models.CASCADE, verbose_name=_("Project"),
+        related_name='tombstones', help_text=_("The project."))
+    model = models.CharField(
+        verbose_name=_("Model"), max_length=100,
+        help_text=_("The label of the model, ex. invoices.item."))
+    public_id = models.CharField(
+        verbose_name=_("Public ID"), max_length=30,
+        help_text=_("The public ID of the deleted record."))
+    deleted = models.DateTimeField(
+        verbose_name=_("Date Deleted"),
+        help_text=_("The date and time of deletion."))
+
+    objects = TombstoneManager()
+
+    def save(self, *args, **kwargs):
+        if self.deleted is None:
+            self.deleted = datetime.now(tzutc())
+
+        super(Tombstone, self).save(*args, **kwargs)
+
+    def __str__(self):
+        return "{} {} ({})".format(self.model, self.public_id, self.deleted)
+
+    class Meta:
+        ordering = ('deleted', 'id',)
+        indexes = (models.Index(fields=['model', 'deleted']),)
+        verbose_name = _("Tombstone")
+        verbose_name_plural = _("Tombstones")
+
+
+@receiver(post_delete, sender=Project)
+def delete_project_tombstones(sender, **kwargs):
+    """
+    Remove the tombstones added while the project's records were deleted
+    with it.
+    """
+    instance = kwargs.get('instance')
+
+    if instance:
+        Tombstone.objects.filter(project_id=instance.pk).delete()
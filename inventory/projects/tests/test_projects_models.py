@@ -3,12 +3,21 @@
 # inventory/projects/tests/test_projects_models.py
 #
 
+import io
+from datetime import datetime, timedelta
+from dateutil.tz import tzutc
+
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
 from django.core.exceptions import ValidationError
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import override_settings
 
+from inventory.categories.models import Category
 from inventory.common.tests.base_tests import BaseTest
 
-from ..models import InventoryType, Project, Membership
+from ..models import InventoryType, Project, Membership, Tombstone
 
 UserModel = get_user_model()
 
@@ -213,3 +222,150 @@ class TestMembership(BaseTest):
         msg = "__str__ result: {}, object result: {}".format(
             result, obj_result)
         self.assertEqual(result, obj_result, msg)
+
+    @override_settings(CACHES={'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+    def test_get_project_roles(self):
+        """
+        Test that the project roles are cached and that they are invalidated
+        when the user's memberships change.
+        """
+        #self.skipTest("Temporarily skipped")
+        cache.clear()
+        user = self._create_user(username='Test_User_00', is_superuser=False)
+        roles = Membership.objects.get_project_roles(self.user)
+        expected = {self.project.pk: Membership.PROJECT_OWNER}
+        msg = "roles: {}, expected: {}".format(roles, expected)
+        self.assertEqual(roles, expected, msg)
+
+        with self.assertNumQueries(0):
+            roles = Membership.objects.get_project_roles(self.user)
+
+        self.assertEqual(roles, expected, msg)
+        # Test that a role change invalidates the cache.
+        self.project.set_role(self.user, Membership.PROJECT_MANAGER)
+        roles = Membership.objects.get_project_roles(self.user)
+        expected = {self.project.pk: Membership.PROJECT_MANAGER}
+        msg = "roles: {}, expected: {}".format(roles, expected)
+        self.assertEqual(roles, expected, msg)
+        # Test that the bulk member changes invalidate the cache.
+        roles = Membership.objects.get_project_roles(user)
+        msg = "roles: {}".format(roles)
+        self.assertEqual(roles, {}, msg)
+        self.project.process_members([self.user, user])
+        roles = Membership.objects.get_project_roles(user)
+        expected = {self.project.pk: Membership.PROJECT_USER}
+        msg = "roles: {}, expected: {}".format(roles, expected)
+        self.assertEqual(roles, expected, msg)
+        user.process_projects([])
+        roles = Membership.objects.get_project_roles(user)
+        msg = "roles: {}".format(roles)
+        self.assertEqual(roles, {}, msg)
+        # Test that deleting a membership invalidates the cache.
+        Membership.objects.get_project_roles(self.user)
+        Membership.objects.get(user=self.user, project=self.project).delete()
+        roles = Membership.objects.get_project_roles(self.user)
+        msg = "roles: {}".format(roles)
+        self.assertEqual(roles, {}, msg)
+
+    @override_settings(CACHES={'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+    def test_get_project_roles_project_changes(self):
+        """
+        Test that the project roles are invalidated when a project's status
+        changes or the project is deleted.
+        """
+        #self.skipTest("Temporarily skipped")
+        cache.clear()
+        key = Membership.objects.PROJECTS_CACHE_KEY.format(self.user.pk)
+        Membership.objects.get_project_roles(self.user)
+        # Test that saving without a status change keeps the cache.
+        self.project.name = "Test Project Renamed"
+        self.project.save()
+        msg = "cached: {}".format(cache.get(key))
+        self.assertIsNotNone(cache.get(key), msg)
+        self.project.active = False
+        self.project.save()
+        msg = "cached: {}".format(cache.get(key))
+        self.assertIsNone(cache.get(key), msg)
+        Membership.objects.get_project_roles(self.user)
+        self.project.delete()
+        msg = "cached: {}".format(cache.get(key))
+        self.assertIsNone(cache.get(key), msg)
+        roles = Membership.objects.get_project_roles(self.user)
+        msg = "roles: {}".format(roles)
+        self.assertEqual(roles, {}, msg)
+
+
+class TestTombstone(BaseTest):
+
+    def __init__(self, name):
+        super(TestTombstone, self).__init__(name)
+
+    def setUp(self):
+        super(TestTombstone, self).setUp()
+        self.inventory_type = self._create_inventory_type()
+        self.project = self._create_project(self.inventory_type)
+
+    def test_get_deleted(self):
+        """
+        Test that deleting a category adds a tombstone and that the
+        tombstones are filtered on the model, time, and projects.
+        """
+        #self.skipTest("Temporarily skipped")
+        since = datetime.now(tzutc())
+        category = self._create_category(self.project, "Test Category")
+        child = self._create_category(self.project, "Test Child",
+                                      parent=category)
+        public_ids = set([category.public_id, child.public_id])
+        category.delete()
+        found = set(Tombstone.objects.get_deleted(
+            Category, since).values_list('public_id', flat=True))
+        msg = "found: {}, expected: {}".format(found, public_ids)
+        self.assertEqual(found, public_ids, msg)
+        found = Tombstone.objects.get_deleted(Category, since, [])
+        msg = "found: {}".format(found)
+        self.assertFalse(found.exists(), msg)
+        found = Tombstone.objects.get_deleted(
+            Category, datetime.now(tzutc()))
+        msg = "found: {}".format(found)
+        self.assertFalse(found.exists(), msg)
+
+    def test_project_delete(self):
+        """
+        Test that the tombstones added while deleting a project are removed
+        with it.
+        """
+        #self.skipTest("Temporarily skipped")
+        self._create_category(self.project, "Test Category")
+        self.project.delete()
+        count = Tombstone.objects.count()
+        msg = "count: {}".format(count)
+        self.assertEqual(count, 0, msg)
+
+    def test_prune(self):
+        """
+        Test that the tombstones older than the retention are pruned by the
+        prune_tombstones command.
+        """
+        #self.skipTest("Temporarily skipped")
+        for name in ("Test Category 0", "Test Category 1"):
+            self._create_category(self.project, name).delete()
+
+        days = Tombstone.objects.RETENTION_DAYS
+        old = Tombstone.objects.order_by('pk').first()
+        Tombstone.objects.filter(pk=old.pk).update(
+            deleted=datetime.now(tzutc()) - timedelta(days=days + 1))
+        out = io.StringIO()
+        call_command('prune_tombstones', stdout=out)
+        found = list(Tombstone.objects.values_list('pk', flat=True))
+        msg = "found: {}, old: {}, out: {}".format(found, old.pk,
+                                                   out.getvalue())
+        self.assertEqual(len(found), 1, msg)
+        self.assertNotIn(old.pk, found, msg)
+        self.assertIn("Pruned 1 tombstones.", out.getvalue(), msg)
+        # Test that the feeds' retention cannot be shortened.
+        with self.assertRaises(CommandError):
+            call_command('prune_tombstones', days=days - 1, stdout=out)
+
+        self.assertEqual(Tombstone.objects.count(), 1, msg)
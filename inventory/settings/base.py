@@ -97,6 +97,7 @@ ANONYMOUS_USER_ID = -1
 MIDDLEWARE = [
     # UpdateCacheMiddleware must be first on the list
     'django.middleware.cache.UpdateCacheMiddleware',
+    'inventory.common.middleware.AuthorizationCacheMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -146,6 +147,7 @@ INSTALLED_APPS = [
     'compressor',
     'dcolumn.dcolumns',
     'rest_framework',
+    'rest_framework.authtoken',
     'django_filters',
     #'guardian',
 
@@ -209,6 +211,7 @@ AUTHENTICATION_BACKENDS = [
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
         'rest_framework.authentication.SessionAuthentication',
+        'inventory.common.api.authentication.CachedTokenAuthentication',
         'rest_framework.authentication.BasicAuthentication',
         ),
     'DEFAULT_FILTER_BACKENDS': (
@@ -79,12 +79,16 @@ def api_root(request, format=None):
         'category-list', request=request, format=format)
     categories['category_clone'] = reverse(
         'category-clone', request=request, format=format)
+    categories['category_delta'] = reverse(
+        'category-delta', request=request, format=format)
     # Invoices
     invoices = items.setdefault('invoices', OrderedDict())
     invoices['conditions'] = reverse(
         'condition-list', request=request, format=format)
     invoices['items'] = reverse(
         'item-list', request=request, format=format)
+    invoices['item_delta'] = reverse(
+        'item-delta', request=request, format=format)
     invoices['invoices'] = reverse(
         'invoice-list', request=request, format=format)
     invoices['invoice_items'] = reverse(
@@ -99,6 +103,8 @@ def api_root(request, format=None):
         'location-code-list', request=request, format=format)
     locations['location_clone'] = reverse(
         'location-clone', request=request, format=format)
+    locations['location_code_delta'] = reverse(
+        'location-code-delta', request=request, format=format)
     # Projects
     projects = items.setdefault('projects', OrderedDict())
     projects['inventory_type_list'] = reverse(